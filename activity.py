@@ -0,0 +1,99 @@
+from sqlalchemy import case, delete, event, func, insert, select
+from db import Session, User, AttendanceLog, UserActivity
+from summaries import SummaryTable
+
+# USER_ACTIVITY keeps first visit, last visit and visit count per user so
+# churn and retention read one indexed row per user instead of scanning
+# the whole attendance history. Every user gets a row at registration.
+
+_table = UserActivity.__table__
+
+
+def _first_last_count(new):
+    # The earlier first visit, the later last visit, the summed count
+    return {
+        "visit_count": _table.c.visit_count + new("visit_count"),
+        "first_visit": case(
+            (
+                (_table.c.first_visit.is_(None))
+                | (_table.c.first_visit > new("first_visit")),
+                new("first_visit"),
+            ),
+            else_=_table.c.first_visit,
+        ),
+        "last_visit": case(
+            (
+                (_table.c.last_visit.is_(None))
+                | (_table.c.last_visit < new("last_visit")),
+                new("last_visit"),
+            ),
+            else_=_table.c.last_visit,
+        ),
+    }
+
+
+def _visits(connection, visits):
+    # visits: (user_id, check_in_time) pairs
+    per_user = {}
+    for user_id, check_in in visits:
+        if user_id is None or check_in is None:
+            continue
+        summary = per_user.setdefault(
+            (user_id,),
+            {"first_visit": check_in, "last_visit": check_in, "visit_count": 0},
+        )
+        summary["first_visit"] = min(summary["first_visit"], check_in)
+        summary["last_visit"] = max(summary["last_visit"], check_in)
+        summary["visit_count"] += 1
+    return per_user
+
+
+def register_users(connection, user_ids):
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        connection.execute(
+            insert(_table), [{"user_id": u, "visit_count": 0} for u in user_ids]
+        )
+
+
+# A user registered on the form gets a row before any visit of theirs in
+# the same flush is counted
+@event.listens_for(Session, "after_flush")
+def _register_new_users(session, flush_context):
+    register_users(
+        session.connection(),
+        [obj.user_id for obj in session.new if isinstance(obj, User)],
+    )
+
+
+# Check-ins from the forms and the write queue are counted as they flush;
+# bulk_import calls record_visits for each batch it inserts
+_activity = SummaryTable(
+    _table, AttendanceLog, ("user_id", "check_in_time"), _visits, fold=_first_last_count
+)
+record_visits = _activity.record
+
+
+def rebuild_activity(connection):
+    connection.execute(delete(_table))
+    connection.execute(
+        insert(_table).from_select(
+            ["user_id", "first_visit", "last_visit", "visit_count"],
+            select(
+                User.user_id,
+                func.min(AttendanceLog.check_in_time),
+                func.max(AttendanceLog.check_in_time),
+                func.count(AttendanceLog.log_id),
+            )
+            .outerjoin(AttendanceLog, AttendanceLog.user_id == User.user_id)
+            .group_by(User.user_id),
+        )
+    )
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    with get_engine().begin() as connection:
+        rebuild_activity(connection)
+    print("USER_ACTIVITY rebuilt from ATTENDANCE_LOG")
@@ -0,0 +1,442 @@
+"""Columnar in-process snapshot that answers the Reports & Analytics queries.
+
+    REPORT_BACKEND=columnar streamlit run main.py
+    python -m analytics           # load the snapshot and time every report
+
+The fact and dimension tables are held as NumPy arrays, one per column.
+A refresh appends only rows past each table's primary-key high-water mark
+(archived Parquet months are loaded once at start-up), and every report is
+a vectorised filter and group-by over those arrays. The small dimension
+tables are re-read in full, so updates and deletes show on the next
+refresh. A fact table whose CACHE_VERSION changed (equipment usage entered
+on a form, python -m bulk_import, python -m archive) is reloaded in full.
+run(), fetch_page() and most_active_users() take the same arguments and
+return the same rows as queries.run(), pagination.fetch_page() and
+archive.most_active_users(), so main.py switches between the two on
+REPORT_BACKEND alone. Point ANALYTICS_DATABASE_URL at a replica to keep
+the refresh reads off the primary as well. CSV export and the user progress
+report, which reads the already compact PROGRESS_* tables, still come from
+the database.
+"""
+
+import os
+import threading
+import time
+from itertools import chain
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, select
+from sqlalchemy.types import DateTime, Integer, Numeric
+from db import (
+    Base,
+    CacheVersion,
+    DATABASE_URL,
+    Session,
+    create_db_engine,
+    session_scope,
+)
+from cache import query_cache
+import archive
+import pagination
+import queries
+
+REPORT_BACKEND = os.getenv("REPORT_BACKEND", "sql")  # sql | columnar
+ANALYTICS_DATABASE_URL = os.getenv("ANALYTICS_DATABASE_URL") or DATABASE_URL
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "60"))
+
+# Table -> (increasing key, columns kept). Rows past the highest key loaded
+# are appended on each refresh; tables without a key (the dimensions, which
+# are updated in place) are re-read in full.
+SNAPSHOT = {
+    "USER": (None, ["user_id", "membership_id", "user_name"]),
+    "MEMBERSHIP": (None, ["membership_id", "membership_type"]),
+    "TRAINER": (None, ["trainer_id", "trainer_name"]),
+    "WORKOUT_EQUIPMENT": (None, ["equipment_id", "equipment_name"]),
+    "ATTENDANCE_LOG": ("log_id", ["log_id", "user_id", "check_in_time"]),
+    "PAYMENT": ("payment_id", ["payment_id", "amount", "payment_date"]),
+    "WORKOUT_SESSION": ("workout_id", ["workout_id", "workout_time"]),
+    "WORKOUT_EQUIPMENT_ASSOCIATION": (
+        "workout_id",
+        ["equipment_id", "workout_id", "usage_duration"],
+    ),
+    "FEEDBACK": ("feedback_id", ["feedback_id", "trainer_id", "rating"]),
+    "PERSONAL_TRAINING_PLAN": ("plan_id", ["plan_id", "trainer_id"]),
+}
+
+
+def _to_columns(table, frame):
+    # DataFrame from SQL or Parquet -> {column: ndarray} with fixed dtypes
+    columns = {}
+    for name in frame.columns:
+        kind = table.c[name].type
+        values = frame[name]
+        if isinstance(kind, DateTime):
+            columns[name] = pd.to_datetime(values).to_numpy("datetime64[us]")
+        elif isinstance(kind, Numeric):
+            columns[name] = pd.to_numeric(values).to_numpy(np.float64)
+        elif isinstance(kind, Integer) and not values.isna().any():
+            columns[name] = values.to_numpy(np.int64)
+        elif isinstance(kind, Integer):
+            columns[name] = values.to_numpy(np.float64, na_value=np.nan)
+        else:
+            columns[name] = values.to_numpy(object)
+    return columns
+
+
+def _concat(parts, columns):
+    # Appends column dicts, skipping missing and empty ones
+    parts = [part for part in parts if part is not None]
+    filled = [part for part in parts if len(part[columns[0]])]
+    if len(filled) <= 1:
+        return filled[0] if filled else parts[-1]
+    return {name: np.concatenate([part[name] for part in filled]) for name in columns}
+
+
+class ColumnarSnapshot:
+    def __init__(self, engine=None):
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._archived = {}
+        self.tables = {}
+        self.watermarks = {}
+        self.refreshed_at = None
+        self.versions = {}  # CACHE_VERSION rows as of the last refresh
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = create_db_engine(ANALYTICS_DATABASE_URL)
+        return self._engine
+
+    def current(self):
+        # The first caller loads the snapshot; later callers keep reading the
+        # previous arrays while one of them refreshes
+        if self.stale():
+            if self._lock.acquire(blocking=not self.tables):
+                try:
+                    if self.stale():
+                        self.refresh()
+                finally:
+                    self._lock.release()
+        return self.tables
+
+    def stale(self):
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= ANALYTICS_REFRESH_SECONDS
+        )
+
+    def mark_stale(self):
+        self.refreshed_at = None
+
+    def refresh(self):
+        tables = dict(self.tables)
+        with self.engine.connect() as connection:
+            versions = dict(
+                connection.execute(
+                    select(CacheVersion.table_name, CacheVersion.version)
+                ).all()
+            )
+            for name, (key, columns) in SNAPSHOT.items():
+                if versions.get(name) != self.versions.get(name):
+                    # Rows changed in place or were archived: start over
+                    self.watermarks.pop(name, None)
+                    self._archived.pop(name, None)
+                    tables.pop(name, None)
+                tables[name] = self._refresh_table(
+                    connection, name, key, columns, tables.get(name)
+                )
+        self.tables = tables
+        self.versions = versions
+        self.refreshed_at = time.monotonic()
+
+    def _refresh_table(self, connection, name, key, columns, previous):
+        table = Base.metadata.tables[name]
+        if name not in self._archived:
+            self._archived[name] = self._load_archive(table, columns)
+        statement = select(*(table.c[column] for column in columns))
+        if key is None:
+            rows = pd.read_sql(statement, connection)
+            return _concat([self._archived[name], _to_columns(table, rows)], columns)
+        last = self.watermarks.get(name)
+        if last is not None:
+            statement = statement.where(table.c[key] > last)
+        rows = pd.read_sql(statement.order_by(table.c[key]), connection)
+        if not rows.empty:
+            self.watermarks[name] = int(rows[key].iloc[-1])
+        if previous is None:
+            previous = self._archived[name]
+        return _concat([previous, _to_columns(table, rows)], columns)
+
+    def _load_archive(self, table, columns):
+        months = archive.archived_months(table.name)
+        if not months:
+            return None
+        _, pq = archive._parquet()
+        frame = pd.concat(
+            pq.read_table(
+                archive.archive_path(table.name, month), columns=columns
+            ).to_pandas()
+            for month in months
+        )
+        return _to_columns(table, frame)
+
+    def stats(self):
+        age = None
+        if self.refreshed_at is not None:
+            age = time.monotonic() - self.refreshed_at
+        return {
+            "rows": sum(len(next(iter(t.values()))) for t in self.tables.values()),
+            "bytes": sum(a.nbytes for t in self.tables.values() for a in t.values()),
+            "age_seconds": age,
+        }
+
+
+snapshot = ColumnarSnapshot()
+
+_SNAPSHOT_TABLES = set(SNAPSHOT)
+
+
+# A form or write-queue write makes the next report read refresh first.
+# Usage can be added to any earlier workout, so it also bumps CACHE_VERSION
+# for every process's snapshot to reload the table.
+@event.listens_for(Session, "after_flush")
+def _mark_snapshot_stale(session, flush_context):
+    written = {
+        getattr(obj, "__tablename__", None)
+        for obj in chain(session.new, session.dirty, session.deleted)
+    }
+    if "WORKOUT_EQUIPMENT_ASSOCIATION" in written:
+        query_cache.publish(session.connection(), "WORKOUT_EQUIPMENT_ASSOCIATION")
+    if written & _SNAPSHOT_TABLES:
+        snapshot.mark_stale()
+
+
+def _positions(keys, wanted):
+    # Row of each wanted key in a primary-key column, -1 where it is missing
+    return pd.Index(keys).get_indexer(wanted)
+
+
+def _between(values, start, end):
+    return (values >= np.datetime64(start)) & (values < np.datetime64(end))
+
+
+def _datetimes(values):
+    # datetime64 array -> datetime objects (None for NaT), as SQL returns them
+    return values.astype("datetime64[us]").tolist()
+
+
+def _last_visits(tables):
+    # Latest check-in of every USER row, NaT for users who never visited
+    visits = tables["ATTENDANCE_LOG"]
+    latest = (
+        pd.Series(visits["check_in_time"])
+        .groupby(visits["user_id"])
+        .max()
+        .reindex(tables["USER"]["user_id"])
+    )
+    return latest.to_numpy("datetime64[us]")
+
+
+def membership_distribution(tables, params):
+    users, memberships = tables["USER"], tables["MEMBERSHIP"]
+    rows = _positions(memberships["membership_id"], users["membership_id"])
+    types = pd.Series(memberships["membership_type"][rows[rows >= 0]])
+    counts = types.value_counts(sort=False, dropna=False)
+    return [(kind, int(total)) for kind, total in counts.items()]
+
+
+def attendance_trends(tables, params):
+    check_in = tables["ATTENDANCE_LOG"]["check_in_time"]
+    in_range = _between(check_in, params["start_date"], params["end_date"])
+    days, visits = np.unique(
+        check_in[in_range].astype("datetime64[D]"), return_counts=True
+    )
+    return list(zip(days.tolist(), visits.tolist()))
+
+
+def trainer_performance(tables, params):
+    trainers, plans, feedback = (
+        tables["TRAINER"],
+        tables["PERSONAL_TRAINING_PLAN"],
+        tables["FEEDBACK"],
+    )
+    trainer_ids = trainers["trainer_id"]
+    slots = len(trainer_ids) + 1  # slot 0 collects unknown trainers
+    plan_rows = _positions(trainer_ids, plans["trainer_id"]) + 1
+    plan_counts = np.bincount(plan_rows, minlength=slots)[1:]
+    rated = ~np.isnan(feedback["rating"])
+    rating_rows = _positions(trainer_ids, feedback["trainer_id"][rated]) + 1
+    rating_counts = np.bincount(rating_rows, minlength=slots)[1:]
+    rating_sums = np.bincount(
+        rating_rows, weights=feedback["rating"][rated], minlength=slots
+    )[1:]
+    averages = np.divide(
+        rating_sums,
+        rating_counts,
+        out=np.zeros(len(trainer_ids)),
+        where=rating_counts > 0,
+    )
+    order = np.argsort(-averages, kind="stable")
+    return list(
+        zip(
+            trainers["trainer_name"][order].tolist(),
+            plan_counts[order].tolist(),
+            averages[order].tolist(),
+        )
+    )
+
+
+def equipment_usage(tables, params):
+    usage, workouts, equipment = (
+        tables["WORKOUT_EQUIPMENT_ASSOCIATION"],
+        tables["WORKOUT_SESSION"],
+        tables["WORKOUT_EQUIPMENT"],
+    )
+    workout_rows = _positions(workouts["workout_id"], usage["workout_id"])
+    in_range = workout_rows >= 0
+    in_range[in_range] = _between(
+        workouts["workout_time"][workout_rows[in_range]],
+        params["start_date"],
+        params["end_date"],
+    )
+    equipment_rows = _positions(
+        equipment["equipment_id"], usage["equipment_id"][in_range]
+    )
+    known = equipment_rows >= 0
+    totals = (
+        pd.DataFrame(
+            {
+                "name": equipment["equipment_name"][equipment_rows[known]],
+                "duration": usage["usage_duration"][in_range][known],
+            }
+        )
+        .groupby("name", dropna=False)["duration"]
+        .agg(["size", "sum"])
+        .sort_values("size", ascending=False, kind="stable")
+    )
+    return [
+        (name, int(count), float(duration) / count)
+        for name, count, duration in totals.itertuples()
+    ]
+
+
+def revenue_trends(tables, params):
+    payments = tables["PAYMENT"]
+    in_range = _between(
+        payments["payment_date"], params["start_date"], params["end_date"]
+    )
+    days, day_rows = np.unique(
+        payments["payment_date"][in_range].astype("datetime64[D]"),
+        return_inverse=True,
+    )
+    amounts = np.nan_to_num(payments["amount"][in_range])
+    totals = np.bincount(day_rows, weights=amounts, minlength=len(days))
+    return list(zip(days.tolist(), totals.tolist()))
+
+
+def _churn_rows(tables, params, cursor=None, limit=None):
+    # Same (last_visit, user_id) order as the SQL, never-visited users first
+    users = tables["USER"]
+    last_visit = _last_visits(tables)
+    never = np.isnat(last_visit)
+    keep = never | (last_visit < np.datetime64(params["cutoff"]))
+    if cursor and cursor["after_time"] is None:
+        keep &= ~never | (users["user_id"] > cursor["after_id"])
+    elif cursor:
+        after_time = np.datetime64(cursor["after_time"])
+        keep &= (last_visit > after_time) | (
+            (last_visit == after_time) & (users["user_id"] > cursor["after_id"])
+        )
+    rows = np.flatnonzero(keep)
+    rows = rows[np.lexsort((users["user_id"][rows], last_visit[rows], ~never[rows]))][
+        :limit
+    ]
+    return list(
+        zip(
+            users["user_id"][rows].tolist(),
+            users["user_name"][rows].tolist(),
+            _datetimes(last_visit[rows]),
+        )
+    )
+
+
+def user_churn(tables, params):
+    return _churn_rows(tables, params)
+
+
+def retention_cohorts(tables, params):
+    last_visit = _last_visits(tables)
+    active = [
+        int((last_visit >= np.datetime64(params[f"since_{days}"])).sum())
+        for days in (30, 60, 90)
+    ]
+    return [(*active, len(last_visit) - active[-1])]
+
+
+def _most_active(tables, params):
+    visits, users = tables["ATTENDANCE_LOG"], tables["USER"]
+    in_range = _between(
+        visits["check_in_time"], params["start_date"], params["end_date"]
+    )
+    user_rows = _positions(users["user_id"], visits["user_id"][in_range])
+    names = pd.Series(users["user_name"][user_rows[user_rows >= 0]])
+    top = names.value_counts().head(params.get("limit", 10))
+    return [(name, int(total)) for name, total in top.items()]
+
+
+REPORTS = {
+    queries.MEMBERSHIP_DISTRIBUTION: membership_distribution,
+    queries.ATTENDANCE_TRENDS: attendance_trends,
+    queries.TRAINER_PERFORMANCE: trainer_performance,
+    queries.EQUIPMENT_USAGE: equipment_usage,
+    queries.REVENUE_TRENDS: revenue_trends,
+    queries.USER_CHURN: user_churn,
+    queries.RETENTION_COHORTS: retention_cohorts,
+    queries.MOST_ACTIVE_USERS: _most_active,
+}
+
+PAGES = {"churn": _churn_rows}
+
+
+# User progress reads the PROGRESS_* tables, one row per user or period
+# already, so it stays in SQL on this backend too
+def run(session, statement, params=None):
+    # Same rows as queries.run(session, statement, params)
+    if statement not in REPORTS:
+        return queries.run(session, statement, params)
+    return REPORTS[statement](snapshot.current(), params or {})
+
+
+def fetch_page(session, report, cursor=None, page_size=pagination.PAGE_SIZE):
+    # Same page and cursor as pagination.fetch_page()
+    if report not in PAGES:
+        return pagination.fetch_page(session, report, cursor, page_size)
+    spec = pagination.REPORTS[report]
+    rows = PAGES[report](snapshot.current(), spec["params"](), cursor, page_size + 1)
+    next_cursor = spec["key"](rows[page_size - 1]) if len(rows) > page_size else None
+    return [row[spec["display"]] for row in rows[:page_size]], next_cursor
+
+
+def most_active_users(session, start_date, end_date, limit=10):
+    # Archived months are part of the snapshot already
+    return _most_active(
+        snapshot.current(),
+        {"start_date": start_date, "end_date": end_date, "limit": limit},
+    )
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    snapshot.current()
+    stats = snapshot.stats()
+    print(
+        f"Loaded {stats['rows']} rows ({stats['bytes'] / 2**20:.1f} MiB) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    with session_scope() as session:
+        for name, (statement, params, _) in queries.dashboard_queries().items():
+            started = time.perf_counter()
+            rows = run(session, statement, params)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"{name:<26}{elapsed_ms:>10.2f} ms{len(rows):>8} rows")
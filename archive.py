@@ -0,0 +1,246 @@
+"""Archive closed months of the append-only tables to Parquet files.
+
+    python -m archive --keep 12
+    python -m archive --keep 24 --table PAYMENT
+
+Every month older than --keep whole months is written to
+archive/<TABLE>/<YYYY-MM>.parquet (zstd), the file is checked against the
+rows it replaces, and only then are the rows removed: by dropping the
+month's partition when the table is partitioned (see partitioning.py),
+otherwise by ranged DELETEs. Rollups are refreshed first, so the DAILY_*
+tables, TRAINER_STATS, USER_ACTIVITY, PROGRESS_*, OCCUPANCY_BUCKET and
+EQUIPMENT_WEAR keep the archived history (a --rebuild of them only sees
+live rows). Reports over raw rows read archived months back through
+read_archive().
+"""
+
+import argparse
+import os
+import sys
+from datetime import date, datetime
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.types import Boolean, Date, DateTime, Integer, Numeric, Time
+from db import Base, get_engine, session_scope
+from cache import query_cache
+from partitioning import PARTITIONED, drop_partition
+from rollup import refresh_rollups
+import queries
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "12"))
+ARCHIVE_CHUNK_SIZE = 10000
+
+# Progress charts cover the last 6 months, and python -m progress rebuilds
+# them from live USER_STATUS rows only
+MIN_KEEP_MONTHS = 7
+
+# Rows archived and removed together with their parent row
+CHILDREN = {"WORKOUT_SESSION": ("WORKOUT_EQUIPMENT_ASSOCIATION", "workout_id")}
+
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Archived months need pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def archive_path(table, month):
+    return os.path.join(ARCHIVE_DIR, table, f"{month:%Y-%m}.parquet")
+
+
+def archived_months(table):
+    directory = os.path.join(ARCHIVE_DIR, table)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        datetime.strptime(name[:7], "%Y-%m").date()
+        for name in os.listdir(directory)
+        if name.endswith(".parquet")
+    )
+
+
+def _arrow_schema(table):
+    # Fixed from the model so every chunk and month has the same types
+    pa, _ = _parquet()
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Numeric):
+            kind = pa.decimal128(column.type.precision, column.type.scale)
+        elif isinstance(column.type, Boolean):
+            kind = pa.bool_()
+        elif isinstance(column.type, Integer):
+            kind = pa.int64()
+        elif isinstance(column.type, DateTime):
+            kind = pa.timestamp("us")
+        elif isinstance(column.type, Date):
+            kind = pa.date32()
+        elif isinstance(column.type, Time):
+            kind = pa.time64("us")
+        else:
+            kind = pa.string()
+        fields.append(pa.field(column.name, kind))
+    return pa.schema(fields)
+
+
+def _write_month(connection, table, month, statement):
+    # Streams the rows into <month file>.tmp, keeping rows archived for that
+    # month by earlier runs, and returns how many rows were written
+    pa, pq = _parquet()
+    schema = _arrow_schema(table)
+    path = archive_path(table.name, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    result = connection.execution_options(
+        stream_results=True, yield_per=ARCHIVE_CHUNK_SIZE
+    ).execute(statement)
+    keys = [column.name for column in table.primary_key]
+    seen = set()
+    written = 0
+    with pq.ParquetWriter(path + ".tmp", schema, compression="zstd") as writer:
+        for chunk in result.mappings().partitions():
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            seen.update(tuple(row[name] for name in keys) for row in chunk)
+            written += len(chunk)
+        if os.path.exists(path):
+            # A run whose delete failed may have written these already
+            earlier = pq.read_table(path, schema=schema).to_pylist()
+            kept = [
+                row for row in earlier if tuple(row[name] for name in keys) not in seen
+            ]
+            writer.write_table(pa.Table.from_pylist(kept, schema=schema))
+    return written
+
+
+def archive_month(engine, table_name, month):
+    key, column = PARTITIONED[table_name]
+    table = Base.metadata.tables[table_name]
+    start, end = month, queries.add_months(month, 1)
+    in_month = (table.c[column] >= start) & (table.c[column] < end)
+    with engine.connect() as connection:
+        max_key = connection.execute(
+            select(table.c[key]).where(in_month).order_by(table.c[key].desc())
+        ).scalar()
+        if max_key is None:
+            return 0
+        # Rows arriving for this month later are left for the next run
+        in_month &= table.c[key] <= max_key
+        ids = select(table.c[key]).where(in_month)
+        child = None
+        if table_name in CHILDREN:
+            child_name, child_key = CHILDREN[table_name]
+            child = Base.metadata.tables[child_name]
+            _write_month(
+                connection,
+                child,
+                month,
+                select(child).where(child.c[child_key].in_(ids)),
+            )
+        rows = _write_month(
+            connection,
+            table,
+            month,
+            select(table).where(in_month).order_by(table.c[key]),
+        )
+
+    with engine.begin() as connection:
+        remaining = connection.execute(ids.order_by(table.c[key])).scalars().all()
+        if len(remaining) != rows:
+            raise RuntimeError(
+                f"{table_name} {month:%Y-%m}: {len(remaining)} rows in the "
+                f"database but {rows} archived, nothing removed"
+            )
+        # Publish the files just before the rows go; if the commit still
+        # fails, the next run rewrites the month without duplicates
+        for archived in [table] if child is None else [child, table]:
+            path = archive_path(archived.name, month)
+            os.replace(path + ".tmp", path)
+        if child is not None:
+            connection.execute(child.delete().where(child.c[child_key].in_(ids)))
+        month_rows = connection.execute(
+            select(func.count())
+            .select_from(table)
+            .where(table.c[column] >= start, table.c[column] < end)
+        ).scalar()
+        if month_rows != rows or not drop_partition(connection, table_name, month):
+            for low in range(0, rows, ARCHIVE_CHUNK_SIZE):
+                batch = remaining[low : low + ARCHIVE_CHUNK_SIZE]
+                connection.execute(table.delete().where(table.c[key].in_(batch)))
+        written = [table_name] if child is None else [table_name, child.name]
+        query_cache.publish(connection, *written)
+    query_cache.invalidate(*written)
+    return rows
+
+
+def closed_months(engine, table_name, keep, today=None):
+    # Months with live rows that are at least `keep` whole months old
+    _, column = PARTITIONED[table_name]
+    table = Base.metadata.tables[table_name]
+    cutoff = queries.add_months(today or date.today(), -keep)
+    with engine.connect() as connection:
+        oldest = connection.execute(select(func.min(table.c[column]))).scalar()
+    month = oldest.date().replace(day=1) if oldest else cutoff
+    while month < cutoff:
+        yield month
+        month = queries.add_months(month, 1)
+
+
+def read_archive(table_name, start, end, columns=None):
+    # Archived rows with start <= time < end as one DataFrame, or None when
+    # no archived month overlaps the range
+    _, column = PARTITIONED[table_name]
+    months = [
+        month
+        for month in archived_months(table_name)
+        if month < end.date() and queries.add_months(month, 1) > start.date()
+    ]
+    if not months:
+        return None
+    _, pq = _parquet()
+    bounds = [(column, ">=", start), (column, "<", end)]
+    return pd.concat(
+        pq.read_table(
+            archive_path(table_name, month), columns=columns, filters=bounds
+        ).to_pandas()
+        for month in months
+    )
+
+
+def most_active_users(session, start_date, end_date, limit=10):
+    # MOST_ACTIVE_USERS, adding archived check-ins when the range reaches them
+    archived = read_archive("ATTENDANCE_LOG", start_date, end_date, ["user_id"])
+    params = {"start_date": start_date, "end_date": end_date}
+    if archived is None:
+        return queries.run(session, queries.MOST_ACTIVE_USERS, params)
+    visits = (
+        archived["user_id"]
+        .value_counts()
+        .add(
+            pd.Series(dict(queries.run(session, queries.VISITS_BY_USER, params))),
+            fill_value=0,
+        )
+    )
+    names = pd.Series(dict(queries.run(session, queries.USER_NAMES)))
+    totals = visits.groupby(names.reindex(visits.index)).sum()
+    totals = totals.astype(int).sort_values(ascending=False).head(limit)
+    return list(totals.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keep", type=int, default=ARCHIVE_KEEP_MONTHS)
+    parser.add_argument("--table", choices=list(PARTITIONED), action="append")
+    args = parser.parse_args()
+    if args.keep < MIN_KEEP_MONTHS:
+        sys.exit(f"--keep must be at least {MIN_KEEP_MONTHS} months")
+
+    engine = get_engine()
+    with session_scope(engine) as session:
+        refresh_rollups(session)
+    for table_name in args.table or PARTITIONED:
+        for month in list(closed_months(engine, table_name, args.keep)):
+            rows = archive_month(engine, table_name, month)
+            if rows:
+                print(f"{table_name} {month:%Y-%m}: archived {rows} rows")
@@ -0,0 +1,329 @@
+"""Concurrent front-desk terminals and dashboard viewers against a seeded database.
+
+    python -m benchmarks.load_test --workers 16 --duration 60
+    python -m benchmarks.load_test --mix attendance=6,payment=2,dashboard=1 --rate 200
+    python -m benchmarks.load_test --json run.json --baseline release.json
+
+Each worker repeatedly picks an operation by weight from --mix and runs it
+the way the app does. Attendance, payment and workout entries build their
+rows with frontdesk.py, check the user against the lookup cache, and wait
+for the group-commit write queue to confirm. A dashboard view refreshes the
+rollups and runs every Reports & Analytics report through the replica
+router. --rate caps total operations per second (0 = as fast as possible).
+
+Without --url a temporary SQLite database is seeded by datagen.py; --url
+uses an existing database as it is, or re-creates and seeds it with
+--reseed (scratch databases only). Prints throughput, latency percentiles,
+lock timeouts and deadlocks per operation, plus InnoDB lock counters on
+MySQL. With --baseline (a previous --json file) it exits 1 when p95
+latency or throughput regress by more than --tolerance, or errors appear.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from db import Base, create_db_engine, session_scope
+from activity import rebuild_activity
+from cache import query_cache
+from frontdesk import PAYMENT_METHODS, attendance_entry, payment_entry, workout_entry
+from instrumentation import percentile
+from lookup_cache import lookups
+from maintenance import rebuild_wear
+from occupancy import rebuild_occupancy
+from progress import rebuild_progress
+from rollup import refresh_rollups
+from routing import create_router
+from write_queue import WriteQueue
+import datagen
+import reports
+
+DEFAULT_MIX = "attendance=6,payment=2,workout=2,dashboard=1"
+WRITE_ACK_TIMEOUT = 10  # seconds, as in main.py
+
+# MySQL error codes
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+
+
+def _outcome(error):
+    if isinstance(error, DBAPIError):
+        code = getattr(error.orig, "errno", None)
+        if code is None and error.orig.args:
+            code = error.orig.args[0]
+        if code == DEADLOCK:
+            return "deadlocks"
+        if code == LOCK_WAIT_TIMEOUT or "database is locked" in str(error.orig):
+            return "lock_timeouts"
+    return "errors"
+
+
+def lock_counters(engine):
+    # Server-wide InnoDB row lock waits and deadlocks (MySQL only)
+    if engine.dialect.name != "mysql":
+        return {}
+    with engine.connect() as connection:
+        status = dict(
+            connection.execute(
+                text(
+                    "SHOW GLOBAL STATUS WHERE Variable_name IN "
+                    "('Innodb_row_lock_waits', 'Innodb_row_lock_time')"
+                )
+            ).all()
+        )
+        deadlocks = connection.execute(
+            text(
+                "SELECT COUNT FROM information_schema.INNODB_METRICS "
+                "WHERE NAME = 'lock_deadlocks'"
+            )
+        ).scalar()
+    return {
+        "row_lock_waits": int(status.get("Innodb_row_lock_waits", 0)),
+        "row_lock_time_ms": int(status.get("Innodb_row_lock_time", 0)),
+        "deadlocks": int(deadlocks or 0),
+    }
+
+
+class LoadTest:
+    def __init__(self, engine, mix, workers, rate=0, seed=42):
+        self.engine = engine
+        self.router = create_router(engine)
+        self.write_queue = WriteQueue(engine)
+        self.operations, self.weights = zip(*mix.items())
+        self.workers = workers
+        self.rate = rate
+        self.seed = seed
+        self.user_ids = list(lookups["USER"].labels(engine))
+        self.latencies = {operation: [] for operation in self.operations}
+        self.outcomes = Counter()  # (operation, outcome) -> count
+        self._lock = threading.Lock()
+
+    def _write(self, rng, build):
+        user_id = rng.choice(self.user_ids)
+        if not lookups["USER"].exists(self.engine, user_id):
+            raise LookupError(f"Unknown user: {user_id}")
+        self.write_queue.submit(build(user_id)).result(timeout=WRITE_ACK_TIMEOUT)
+
+    def attendance(self, rng):
+        check_in = datetime.now()
+        check_out = check_in + timedelta(minutes=rng.randint(30, 120))
+        self._write(
+            rng,
+            lambda user_id: attendance_entry(
+                user_id, check_in.time(), check_out.time()
+            ),
+        )
+
+    def payment(self, rng):
+        amount = rng.choice([29.99, 49.99, 99.99])
+        method = rng.choice(PAYMENT_METHODS)
+        self._write(rng, lambda user_id: payment_entry(user_id, amount, method))
+
+    def workout(self, rng):
+        duration = rng.randint(20, 90)
+        calories = round(duration * rng.uniform(5, 12), 2)
+        self._write(rng, lambda user_id: workout_entry(user_id, duration, calories))
+
+    def dashboard(self, rng):
+        # One full rerun of Reports & Analytics with every section open
+        if reports.REPORT_BACKEND == "sql":
+            with session_scope(self.engine) as session:
+                refresh_rollups(session)
+        today = date.today()
+        month = reports.recent_months(1)[0]
+        with self.router.read_session() as session:
+            reports.membership_distribution(session)
+            reports.attendance_trends(session, today - timedelta(days=14), today)
+            reports.current_occupancy(session)
+            reports.daily_occupancy(session, today)
+            reports.weekly_occupancy(session)
+            reports.trainer_performance(session)
+            reports.equipment_usage(session, month)
+            reports.maintenance_due(session)
+            reports.revenue_trends(session, month)
+            reports.fetch_page(session, "churn")
+            reports.retention_cohorts(session)
+            reports.fetch_page(session, "progress")
+            reports.most_active_users(session, today - timedelta(days=30), today)
+
+    def _worker(self, index, deadline):
+        rng = random.Random(self.seed + index)
+        interval = self.workers / self.rate if self.rate else 0
+        next_at = time.monotonic()
+        while time.monotonic() < deadline:
+            if interval:
+                next_at += interval
+                time.sleep(max(0, next_at - time.monotonic()))
+            operation = rng.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                getattr(self, operation)(rng)
+                outcome = "ok"
+            except Exception as error:
+                outcome = _outcome(error)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.outcomes[operation, outcome] += 1
+                if outcome == "ok":
+                    self.latencies[operation].append(elapsed)
+
+    def run(self, duration):
+        counters_before = lock_counters(self.engine)
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=self._worker, args=(index, deadline))
+            for index in range(self.workers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.write_queue.close()
+        counters_after = lock_counters(self.engine)
+
+        operations = {}
+        for operation in self.operations:
+            latencies = self.latencies[operation]
+            operations[operation] = {
+                "ok": len(latencies),
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                **{
+                    outcome: self.outcomes[operation, outcome]
+                    for outcome in ("lock_timeouts", "deadlocks", "errors")
+                },
+            }
+        return {
+            "workers": self.workers,
+            "rate": self.rate,
+            "seconds": elapsed,
+            "operations": operations,
+            "server_locks": {
+                name: counters_after[name] - counters_before[name]
+                for name in counters_after
+            },
+            "write_queue": self.write_queue.metrics(),
+        }
+
+
+def regressions(results, baseline, tolerance):
+    problems = []
+    for operation, row in results["operations"].items():
+        base = baseline["operations"].get(operation)
+        if base is None:
+            continue
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(
+                f"{operation}: p95 {row['p95_ms']:.1f} ms vs {base['p95_ms']:.1f} ms"
+            )
+        if row["throughput"] < base["throughput"] * (1 - tolerance):
+            problems.append(
+                f"{operation}: {row['throughput']:.1f} ops/s vs "
+                f"{base['throughput']:.1f} ops/s"
+            )
+        for outcome in ("lock_timeouts", "deadlocks", "errors"):
+            if row[outcome] > base[outcome]:
+                problems.append(
+                    f"{operation}: {row[outcome]} {outcome} vs {base[outcome]}"
+                )
+    return problems
+
+
+def seed(engine, args):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    datagen.generate(engine, users=args.users, days=args.days, seed=args.seed)
+    with session_scope(engine) as session:
+        refresh_rollups(session)
+    with engine.begin() as connection:
+        rebuild_activity(connection)
+        rebuild_progress(connection)
+        rebuild_occupancy(connection)
+        rebuild_wear(connection)
+
+
+def print_results(results):
+    print(
+        f"\n{results['workers']} workers, {results['seconds']:.1f}s"
+        + (f", capped at {results['rate']} ops/s" if results["rate"] else "")
+    )
+    print(
+        f"{'operation':<12}{'ok':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'lock t/o':>10}{'deadlk':>8}{'errors':>8}"
+    )
+    for operation, row in results["operations"].items():
+        print(
+            f"{operation:<12}{row['ok']:>8}{row['throughput']:>9.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+            f"{row['lock_timeouts']:>10}{row['deadlocks']:>8}{row['errors']:>8}"
+        )
+    if results["server_locks"]:
+        print(
+            "InnoDB: {row_lock_waits} row lock waits ({row_lock_time_ms} ms), "
+            "{deadlocks} deadlocks".format(**results["server_locks"])
+        )
+    print(
+        "Write queue: {committed} committed in {batches} batches, "
+        "commit p95 {commit_p95_ms:.1f} ms".format(**results["write_queue"])
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--rate", type=float, default=0, help="total ops/s cap")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,...")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="database to load (default: temporary SQLite)")
+    parser.add_argument("--reseed", action="store_true", help="re-create --url")
+    parser.add_argument("--no-cache", action="store_true", help="bypass query cache")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    mix = {}
+    for item in args.mix.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in ("attendance", "payment", "workout", "dashboard"):
+            sys.exit(f"Unknown operation in --mix: {operation}")
+        mix[operation] = float(weight or 1)
+    if args.no_cache:
+        query_cache.ttl = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.url or f"sqlite:///{os.path.join(directory, 'load.db')}"
+        engine = create_db_engine(url)
+        if args.reseed or not args.url:
+            seed(engine, args)
+        results = LoadTest(engine, mix, args.workers, args.rate, args.seed).run(
+            args.duration
+        )
+        engine.dispose()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            problems = regressions(results, json.load(baseline_file), args.tolerance)
+        for problem in problems:
+            print("REGRESSION", problem)
+        if problems:
+            sys.exit(1)
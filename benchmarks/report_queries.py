@@ -0,0 +1,134 @@
+"""Latency of every dashboard query at several data scales.
+
+    python -m benchmarks.report_queries --scales 1000,10000,50000 --repeat 20
+
+For each scale (number of users) a fresh SQLite file is filled by
+datagen.py, the rollups and summary tables are built, and each Reports &
+Analytics query is run --repeat times. Reports p50/p95 latency, rows
+returned and rows scanned (MySQL Handler_read* counters; SQLite virtual
+machine steps as a proxy). With --url the database is dropped and
+re-created at every scale, so only point it at a scratch database.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+from sqlalchemy import text
+from db import Base, create_db_engine, session_scope
+from rollup import refresh_rollups
+from activity import rebuild_activity
+from instrumentation import percentile
+from maintenance import rebuild_wear
+from occupancy import rebuild_occupancy
+from progress import rebuild_progress
+import datagen
+import queries
+
+
+def _handler_reads(conn):
+    rows = conn.execute(text("SHOW SESSION STATUS LIKE 'Handler_read%'"))
+    return sum(int(value) for _, value in rows)
+
+
+def rows_scanned(conn, statement, params):
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        before = _handler_reads(conn)
+        conn.execute(statement, params).fetchall()
+        return _handler_reads(conn) - before
+    if dialect == "sqlite":
+        steps = [0]
+
+        def count_steps():
+            steps[0] += 1
+            return 0
+
+        raw = conn.connection.driver_connection
+        raw.set_progress_handler(count_steps, 100)
+        try:
+            conn.execute(statement, params).fetchall()
+        finally:
+            raw.set_progress_handler(None, 0)
+        return steps[0] * 100
+    return None
+
+
+def run_queries(engine, selected_month, repeat):
+    results = []
+    with engine.connect() as conn:
+        for name, (statement, params, _) in queries.dashboard_queries(
+            selected_month
+        ).items():
+            rows = conn.execute(statement, params).fetchall()  # warm-up
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(statement, params).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append(
+                {
+                    "query": name,
+                    "p50_ms": percentile(timings, 50),
+                    "p95_ms": percentile(timings, 95),
+                    "rows": len(rows),
+                    "scanned": rows_scanned(conn, statement, params),
+                }
+            )
+    return results
+
+
+def benchmark_scale(url, users, args):
+    engine = create_db_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    started = time.perf_counter()
+    counts = datagen.generate(
+        engine,
+        users=users,
+        days=args.days,
+        visits_per_user=args.visits_per_user,
+        seed=args.seed,
+        end_date=args.end_date,
+    )
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    with session_scope(engine) as session:
+        refresh_rollups(session)
+    with engine.begin() as conn:
+        rebuild_activity(conn)
+        rebuild_progress(conn)
+        rebuild_occupancy(conn)
+        rebuild_wear(conn)
+    rollup_seconds = time.perf_counter() - started
+
+    print(
+        f"\n== {users} users, {counts['ATTENDANCE_LOG']} visits "
+        f"(load {load_seconds:.1f}s, rollup refresh {rollup_seconds:.1f}s)"
+    )
+    print(f"{'query':<26}{'p50 ms':>10}{'p95 ms':>10}{'rows':>8}{'scanned':>12}")
+    selected_month = args.end_date.strftime("%Y-%m")
+    for result in run_queries(engine, selected_month, args.repeat):
+        print(
+            f"{result['query']:<26}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+            f"{result['rows']:>8}{result['scanned'] or '-':>12}"
+        )
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1000,10000", help="users per run")
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--visits-per-user", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--url", help="scratch database instead of SQLite files")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for users in (int(scale) for scale in args.scales.split(",")):
+            url = args.url or f"sqlite:///{os.path.join(directory, f'{users}.db')}"
+            benchmark_scale(url, users, args)
@@ -0,0 +1,86 @@
+"""Cold import and first-render latency of the app.
+
+    python -m benchmarks.startup --baseline <git-ref> --runs 5
+
+Each measurement runs in a fresh interpreter, so module caches and pooled
+connections never carry over. With --baseline the same measurements are
+taken on a checkout of that ref for comparison. Point DATABASE_URL at the
+database both trees should use (run `python -m db init` on it first).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import db
+print(time.perf_counter() - start)
+"""
+
+RENDER_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file("main.py", default_timeout=120)
+app.run()
+if app.exception:
+    raise SystemExit(app.exception[0].value)
+print(time.perf_counter() - start)
+"""
+
+
+def _time_snippet(tree, snippet):
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=tree,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONPATH=tree),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{tree}: {result.stderr.strip().splitlines()[-1]}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(tree, runs):
+    cold_import = [_time_snippet(tree, IMPORT_SNIPPET) for _ in range(runs)]
+    first_render = [_time_snippet(tree, RENDER_SNIPPET) for _ in range(runs)]
+    return {
+        "cold import": statistics.median(cold_import) * 1000,
+        "first render": statistics.median(first_render) * 1000,
+    }
+
+
+def checkout(ref, directory):
+    archive = subprocess.run(
+        ["git", "archive", ref], cwd=ROOT, capture_output=True, check=True
+    )
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+    return directory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", help="git ref to compare against")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"current": measure(ROOT, args.runs)}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as directory:
+            tree = checkout(args.baseline, directory)
+            results[args.baseline] = measure(tree, args.runs)
+
+    print(f"{'tree':<16}{'cold import (ms)':>18}{'first render (ms)':>20}")
+    for tree, timings in results.items():
+        print(
+            f"{tree:<16}{timings['cold import']:>18.1f}"
+            f"{timings['first render']:>20.1f}"
+        )
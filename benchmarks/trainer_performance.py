@@ -0,0 +1,122 @@
+"""Trainer Performance report: plans x feedback fan-out vs. pre-aggregation.
+
+    python -m benchmarks.trainer_performance --trainers 50 --feedback 500
+
+Builds a throwaway SQLite database with many plans and hundreds of
+feedback rows per trainer, then times the original LEFT JOIN query, a
+per-trainer pre-aggregated subquery version, and the TRAINER_STATS read
+the dashboard now uses.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import insert, text
+from db import (
+    Base,
+    create_db_engine,
+    session_scope,
+    Trainer,
+    User,
+    PersonalTrainingPlan,
+    Feedback,
+)
+from rollup import refresh_trainer_stats
+import queries
+
+# The report as it was: every plan row is joined to every feedback row
+FAN_OUT = text(
+    "SELECT T.trainer_name, COUNT(P.plan_id) AS total_plans, "
+    "COALESCE(AVG(F.rating), 0) AS avg_rating "
+    "FROM TRAINER T "
+    "LEFT JOIN PERSONAL_TRAINING_PLAN P ON T.trainer_id = P.trainer_id "
+    "LEFT JOIN FEEDBACK F ON T.trainer_id = F.trainer_id "
+    "GROUP BY T.trainer_name ORDER BY avg_rating DESC"
+)
+
+PRE_AGGREGATED = text(
+    "SELECT T.trainer_name, COALESCE(P.total_plans, 0) AS total_plans, "
+    "COALESCE(F.avg_rating, 0) AS avg_rating "
+    "FROM TRAINER T "
+    "LEFT JOIN (SELECT trainer_id, COUNT(*) AS total_plans "
+    "FROM PERSONAL_TRAINING_PLAN GROUP BY trainer_id) P "
+    "ON T.trainer_id = P.trainer_id "
+    "LEFT JOIN (SELECT trainer_id, AVG(rating) AS avg_rating "
+    "FROM FEEDBACK GROUP BY trainer_id) F "
+    "ON T.trainer_id = F.trainer_id "
+    "ORDER BY avg_rating DESC"
+)
+
+
+def seed(engine, trainers, plans, feedback, seed_value=7):
+    rng = random.Random(seed_value)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"user_name": f"user {i}"} for i in range(100)])
+        conn.execute(
+            insert(Trainer),
+            [{"trainer_name": f"trainer {i}"} for i in range(trainers)],
+        )
+        conn.execute(
+            insert(PersonalTrainingPlan),
+            [
+                {"trainer_id": t, "user_id": rng.randint(1, 100), "duration": 30}
+                for t in range(1, trainers + 1)
+                for _ in range(plans)
+            ],
+        )
+        conn.execute(
+            insert(Feedback),
+            [
+                {
+                    "trainer_id": t,
+                    "user_id": rng.randint(1, 100),
+                    "rating": rng.randint(1, 5),
+                    "feedback_time": datetime.now(),
+                }
+                for t in range(1, trainers + 1)
+                for _ in range(feedback)
+            ],
+        )
+
+
+def timed(engine, statement, repeat):
+    timings = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = conn.execute(statement).fetchall()
+            timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trainers", type=int, default=50)
+    parser.add_argument("--plans", type=int, default=40, help="plans per trainer")
+    parser.add_argument("--feedback", type=int, default=500, help="per trainer")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        seed(engine, args.trainers, args.plans, args.feedback)
+        with session_scope(engine) as session:
+            refresh_trainer_stats(session)
+
+        print(
+            f"{args.trainers} trainers, {args.plans} plans and "
+            f"{args.feedback} feedback rows each"
+        )
+        for label, statement in (
+            ("fan-out join", FAN_OUT),
+            ("pre-aggregated", PRE_AGGREGATED),
+            ("TRAINER_STATS", queries.TRAINER_PERFORMANCE),
+        ):
+            elapsed, rows = timed(engine, statement, args.repeat)
+            plans = max(row[1] for row in rows)
+            print(f"{label:<16}{elapsed:>10.1f} ms   max plans counted: {plans}")
+        engine.dispose()
@@ -0,0 +1,204 @@
+"""Membership renewal billing: bill every membership that has run out.
+
+    python -m billing
+    python -m billing --as-of 2025-03-31 --dry-run --output due.csv
+
+A membership runs valid_period days from the user's latest payment. Every
+user whose membership ran out by --as-of (and not more than
+BILLING_GRACE_DAYS before it; longer lapses are left for the front desk)
+gets a renewal PAYMENT of the membership price less its discount_amount,
+dated when the old period ended so periods stay back to back. Due users
+are worked out for all members at once with pandas from three bulk reads,
+not per-user queries. Each billed period is recorded in BILLING under
+(user_id, period_start) in the same transaction as its payment. A user
+billed inside the grace window is not billed again until it has passed,
+so re-running the job for the same cycle bills nobody twice, even for
+memberships shorter than the window, and a concurrent run skips the
+periods the other one already recorded. VIP's personal_trainer_discount
+is off trainer sessions, not the membership fee, so renewals only take
+off the membership's own discount_amount.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.dialects import mysql, sqlite
+from db import Billing, Membership, Payment, User, get_engine
+from cache import query_cache
+
+# Billing Settings
+BILLING_GRACE_DAYS = int(os.getenv("BILLING_GRACE_DAYS", "7"))
+BILLING_PAYMENT_METHOD = os.getenv("BILLING_PAYMENT_METHOD", "Credit Card")
+BILLING_BATCH_SIZE = int(os.getenv("BILLING_BATCH_SIZE", "5000"))
+
+
+def _frame(connection, statement, columns):
+    return pd.DataFrame(connection.execute(statement).all(), columns=columns)
+
+
+def due_renewals(connection, as_of=None):
+    # One row per membership that ran out in the grace window before as_of:
+    # user_id, membership_id, period_start (old expiry) and amount
+    as_of = as_of or datetime.now()
+    memberships = _frame(
+        connection,
+        select(
+            Membership.membership_id,
+            Membership.price,
+            Membership.valid_period,
+            Membership.discount_amount,
+        ),
+        ["membership_id", "price", "valid_period", "discount_amount"],
+    ).dropna(subset=["price", "valid_period"])
+    if memberships.empty:
+        return pd.DataFrame(
+            columns=["user_id", "membership_id", "period_start", "amount"]
+        )
+    longest = int(memberships["valid_period"].max())
+    since = as_of - timedelta(days=longest + BILLING_GRACE_DAYS)
+
+    # Only payments recent enough to still cover a membership, through the
+    # payment_date index
+    latest = _frame(
+        connection,
+        select(Payment.user_id, func.max(Payment.payment_date))
+        .where(Payment.payment_date >= since)
+        .group_by(Payment.user_id),
+        ["user_id", "last_payment"],
+    )
+    users = _frame(
+        connection,
+        select(User.user_id, User.membership_id).where(User.membership_id.is_not(None)),
+        ["user_id", "membership_id"],
+    )
+    # Users already billed in the grace window; a renewal shorter than the
+    # window would otherwise be due again from the payment it just created
+    window_start = as_of - timedelta(days=BILLING_GRACE_DAYS)
+    billed = _frame(
+        connection,
+        select(Billing.user_id).where(Billing.period_start > window_start).distinct(),
+        ["user_id"],
+    )
+
+    due = users.merge(latest, on="user_id").merge(memberships, on="membership_id")
+    due["period_start"] = pd.to_datetime(due["last_payment"]) + pd.to_timedelta(
+        due["valid_period"].astype(int), unit="D"
+    )
+    due = due[
+        (due["period_start"] <= as_of)
+        & (due["period_start"] > window_start)
+        & ~due["user_id"].isin(billed["user_id"])
+    ]
+    due = due.assign(
+        amount=(
+            due["price"].astype(float) - due["discount_amount"].fillna(0).astype(float)
+        )
+        .clip(lower=0)
+        .round(2)
+    )
+    return due[["user_id", "membership_id", "period_start", "amount"]].reset_index(
+        drop=True
+    )
+
+
+def _insert_new(connection, model):
+    # INSERT that skips rows whose primary key is already there
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect in ("mysql", "mariadb"):
+        return mysql.insert(model).prefix_with("IGNORE")
+    return insert(model)
+
+
+def run_billing(engine=None, as_of=None, dry_run=False):
+    engine = engine if engine is not None else get_engine()
+    as_of = as_of or datetime.now()
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        due = due_renewals(connection, as_of)
+        records = [
+            {
+                "user_id": int(row.user_id),
+                "membership_id": int(row.membership_id),
+                "period_start": row.period_start.to_pydatetime(),
+                "amount": float(row.amount),
+            }
+            for row in due.itertuples(index=False)
+        ]
+        billed = 0
+        if not dry_run:
+            # Whole seconds, so it compares equal after a DATETIME round trip
+            billed_at = datetime.now().replace(microsecond=0)
+            for offset in range(0, len(records), BILLING_BATCH_SIZE):
+                batch = records[offset : offset + BILLING_BATCH_SIZE]
+                # BILLING first: its primary key stops a concurrent run
+                # from charging the same period, and only the periods this
+                # run recorded get a payment
+                connection.execute(
+                    _insert_new(connection, Billing),
+                    [dict(r, billed_at=billed_at) for r in batch],
+                )
+                recorded = set(
+                    connection.execute(
+                        select(Billing.user_id, Billing.period_start).where(
+                            tuple_(Billing.user_id, Billing.period_start).in_(
+                                [(r["user_id"], r["period_start"]) for r in batch]
+                            ),
+                            Billing.billed_at == billed_at,
+                        )
+                    ).all()
+                )
+                batch = [
+                    r for r in batch if (r["user_id"], r["period_start"]) in recorded
+                ]
+                billed += len(batch)
+                if not batch:
+                    continue
+                connection.execute(
+                    insert(Payment),
+                    [
+                        {
+                            "user_id": r["user_id"],
+                            "amount": r["amount"],
+                            "payment_date": r["period_start"],
+                            "payment_method": BILLING_PAYMENT_METHOD,
+                        }
+                        for r in batch
+                    ],
+                )
+            if billed:
+                query_cache.publish(connection, "PAYMENT", "BILLING")
+    if billed:
+        query_cache.invalidate("PAYMENT", "BILLING")
+    seconds = time.perf_counter() - start
+    return due, {
+        "billed": billed,
+        "due": len(records),
+        "amount": round(float(due["amount"].sum()), 2),
+        "seconds": seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        help="bill memberships that ran out by this time (default: now)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="write nothing")
+    parser.add_argument("--output", help="write the due renewals to this CSV")
+    args = parser.parse_args()
+
+    due, stats = run_billing(as_of=args.as_of, dry_run=args.dry_run)
+    if args.output:
+        due.to_csv(args.output, index=False)
+    print(
+        "{due} renewals due, {billed} billed, ${amount:,.2f} in {seconds:.2f}s".format(
+            **stats
+        )
+    )
@@ -0,0 +1,229 @@
+"""Bulk CSV/Parquet import for attendance, workouts, equipment usage and payments.
+
+    python -m bulk_import attendance turnstile.csv --batch-size 2000
+    python -m bulk_import payment payments.parquet --commit-every 50000
+
+Files are read in chunks, foreign keys are checked against id sets loaded
+once up front, and valid rows are inserted with multi-row executemany
+batches. Rejected rows can be written out with --rejects.
+"""
+
+import argparse
+import os
+import time
+import pandas as pd
+from sqlalchemy import insert, select
+from db import (
+    get_engine,
+    User,
+    AttendanceLog,
+    WorkoutSession,
+    WorkoutEquipment,
+    WorkoutEquipmentAssociation,
+    Payment,
+)
+from cache import query_cache
+from activity import record_visits
+from maintenance import record_wear
+from occupancy import record_occupancy
+from rollup import record_equipment_usage
+
+IMPORTS = {
+    "attendance": {
+        "model": AttendanceLog,
+        "columns": ["user_id", "check_in_time", "check_out_time"],
+        "required": ["user_id", "check_in_time"],
+        "datetimes": ["check_in_time", "check_out_time"],
+        "foreign_keys": {"user_id": User.user_id},
+    },
+    "workout": {
+        "model": WorkoutSession,
+        "columns": ["user_id", "workout_time", "workout_duration", "calorie_burned"],
+        "required": ["user_id", "workout_time"],
+        "datetimes": ["workout_time"],
+        "foreign_keys": {"user_id": User.user_id},
+    },
+    "equipment": {
+        "model": WorkoutEquipmentAssociation,
+        "columns": ["equipment_id", "workout_id", "usage_duration"],
+        "required": ["equipment_id", "workout_id"],
+        "datetimes": [],
+        "foreign_keys": {
+            "equipment_id": WorkoutEquipment.equipment_id,
+            "workout_id": WorkoutSession.workout_id,
+        },
+        "unique": ["equipment_id", "workout_id"],
+    },
+    "payment": {
+        "model": Payment,
+        "columns": ["user_id", "amount", "payment_date", "payment_method"],
+        "required": ["user_id", "amount", "payment_date"],
+        "datetimes": ["payment_date"],
+        "foreign_keys": {"user_id": User.user_id},
+    },
+}
+
+
+def read_chunks(path, chunk_size, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif file_format in ("parquet", "pq"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet import requires pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise SystemExit(f"Unsupported file format: {file_format}")
+
+
+def load_id_sets(conn, spec):
+    return {
+        column: set(conn.execute(select(key)).scalars())
+        for column, key in spec["foreign_keys"].items()
+    }
+
+
+def existing_keys(conn, spec, chunk):
+    # Unique keys of the chunk that are already stored, looked up through the
+    # indexed last key column (workout_id for equipment usage)
+    table = spec["model"].__table__
+    columns = [table.c[c] for c in spec["unique"]]
+    values = chunk[spec["unique"][-1]].dropna().unique().tolist()
+    if not values:
+        return set()
+    rows = conn.execute(select(*columns).where(columns[-1].in_(values)))
+    return {tuple(row) for row in rows}
+
+
+def validate(chunk, spec, id_sets, seen_keys=None):
+    # Returns (valid rows, rejected rows) of the chunk. seen_keys carries the
+    # unique keys of earlier chunks so duplicates across the file are caught.
+    missing = [c for c in spec["columns"] if c not in chunk.columns]
+    if missing:
+        raise SystemExit(f"Missing columns: {', '.join(missing)}")
+    chunk = chunk[spec["columns"]].copy()
+    for column in spec["datetimes"]:
+        chunk[column] = pd.to_datetime(chunk[column], errors="coerce")
+    for column in spec["foreign_keys"]:
+        chunk[column] = pd.to_numeric(chunk[column], errors="coerce")
+
+    valid = chunk[spec["required"]].notna().all(axis=1)
+    for column, ids in id_sets.items():
+        valid &= chunk[column].isin(ids)
+    if "unique" in spec:
+        keys = pd.Series(list(zip(*(chunk[c] for c in spec["unique"]))), chunk.index)
+        valid &= ~keys.duplicated()
+        if seen_keys is not None:
+            valid &= ~keys.isin(seen_keys)
+            seen_keys.update(keys[valid])
+    return chunk[valid], chunk[~valid]
+
+
+def _records(frame):
+    # NaN/NaT -> None and numpy scalars -> Python values for the DBAPI
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict("records")
+
+
+def import_file(
+    kind,
+    path,
+    engine=None,
+    chunk_size=10000,
+    batch_size=1000,
+    commit_every=10000,
+    file_format=None,
+    rejects_path=None,
+):
+    spec = IMPORTS[kind]
+    engine = engine if engine is not None else get_engine()
+    statement = insert(spec["model"].__table__)
+    stats = {"read": 0, "inserted": 0, "rejected": 0}
+    start = time.perf_counter()
+
+    with engine.connect() as conn:
+        id_sets = load_id_sets(conn, spec)
+        conn.commit()
+        seen_keys = set()
+        uncommitted = 0
+        for chunk in read_chunks(path, chunk_size, file_format):
+            stats["read"] += len(chunk)
+            if "unique" in spec:
+                seen_keys |= existing_keys(conn, spec, chunk)
+            valid, rejected = validate(chunk, spec, id_sets, seen_keys)
+            stats["rejected"] += len(rejected)
+            if rejects_path and len(rejected):
+                rejected.to_csv(
+                    rejects_path,
+                    mode="a",
+                    index=False,
+                    header=not os.path.exists(rejects_path),
+                )
+            records = _records(valid)
+            for offset in range(0, len(records), batch_size):
+                batch = records[offset : offset + batch_size]
+                conn.execute(statement, batch)
+                if kind == "attendance":
+                    record_visits(
+                        conn, ((r["user_id"], r["check_in_time"]) for r in batch)
+                    )
+                    record_occupancy(
+                        conn, ((r["check_in_time"], r["check_out_time"]) for r in batch)
+                    )
+                elif kind == "equipment":
+                    usages = [
+                        (r["equipment_id"], r["workout_id"], r["usage_duration"])
+                        for r in batch
+                    ]
+                    record_wear(conn, usages)
+                    record_equipment_usage(conn, usages)
+                uncommitted += len(batch)
+                if uncommitted >= commit_every:
+                    conn.commit()
+                    stats["inserted"] += uncommitted
+                    uncommitted = 0
+        written = (
+            spec["model"].__tablename__,
+            "USER_ACTIVITY",
+            "OCCUPANCY_BUCKET",
+            "EQUIPMENT_WEAR",
+            "DAILY_EQUIPMENT_USAGE",
+        )
+        query_cache.publish(conn, *written)
+        conn.commit()
+        stats["inserted"] += uncommitted
+
+    query_cache.invalidate(*written)
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=sorted(IMPORTS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "parquet"])
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--commit-every", type=int, default=10000)
+    parser.add_argument("--rejects", help="append rejected rows to this CSV")
+    args = parser.parse_args()
+
+    stats = import_file(
+        args.kind,
+        args.path,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        commit_every=args.commit_every,
+        file_format=args.format,
+        rejects_path=args.rejects,
+    )
+    print(
+        f"{args.kind}: read {stats['read']} rows, inserted {stats['inserted']}, "
+        f"rejected {stats['rejected']} in {stats['seconds']:.2f}s "
+        f"({stats['rows_per_sec']:.0f} rows/sec)"
+    )
@@ -0,0 +1,206 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from sqlalchemy import event, insert, select, update
+from db import CacheVersion, Session
+
+# Cache Settings
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))  # seconds
+QUERY_CACHE_MAX_MB = float(os.getenv("QUERY_CACHE_MAX_MB", "64"))
+# How often CACHE_VERSION is checked for writes by other processes (0 = off)
+QUERY_CACHE_POLL_SECONDS = float(os.getenv("QUERY_CACHE_POLL_SECONDS", "5"))
+
+
+def _sizeof(rows):
+    # Rough footprint of a cached result: the list, its tuples and values
+    return sys.getsizeof(rows) + sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in rows
+    )
+
+
+class QueryCache:
+    # TTL + LRU cache of query results keyed on statement and bound
+    # parameters, bounded by the estimated memory of the cached rows.
+    def __init__(self, ttl=QUERY_CACHE_TTL, max_bytes=QUERY_CACHE_MAX_MB * 2**20):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, tables, rows)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.listeners = []  # called with (statement, rows, hit) per fetch
+        self._invalidated_at = {}  # table -> time.time() of its last invalidation
+        self._versions = None  # CACHE_VERSION rows as of the last poll
+        self._polled_at = 0.0
+
+    @staticmethod
+    def key(statement, params, replica=False):
+        # Statements are module-level constants, so the object itself is the
+        # key (str() would recompile a Core statement on every lookup).
+        # Replica reads are kept apart, so a reader sent to the primary after
+        # writing never gets rows a lagging replica returned.
+        return statement, tuple(sorted((params or {}).items())), replica
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key, rows, tables):
+        size = _sizeof(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, tables, rows)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def fetch(self, session, statement, params=None, tables=(), execution_options=None):
+        # Sessions on a read replica carry in info["replica_lag"] how many
+        # seconds behind the primary the replica may be; its rows are not
+        # cached while a table they depend on was invalidated within that
+        # time, as they may predate the write
+        lag = session.info.get("replica_lag")
+        key = self.key(statement, params, lag is not None)
+        self._poll(session)
+        rows = self.get(key)
+        hit = rows is not None
+        if not hit:
+            started = time.time()
+            result = session.execute(
+                statement, params or {}, execution_options=execution_options or {}
+            )
+            rows = [tuple(row) for row in result]
+            if lag is None or not self._invalidated_since(tables, started - lag):
+                self.put(key, rows, frozenset(tables))
+        for listener in self.listeners:
+            listener(statement, rows, hit)
+        return rows
+
+    def invalidate(self, *tables):
+        tables = set(tables)
+        now = time.time()
+        with self._lock:
+            for table in tables:
+                self._invalidated_at[table] = now
+            stale = [key for key, entry in self._entries.items() if entry[2] & tables]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def publish(self, connection, *tables):
+        # Bumps the tables' CACHE_VERSION rows in the caller's transaction, so
+        # every process drops its entries for them at its next poll; for batch
+        # jobs, whose invalidate() only reaches their own process
+        for table in tables:
+            bumped = connection.execute(
+                update(CacheVersion)
+                .where(CacheVersion.table_name == table)
+                .values(version=CacheVersion.version + 1)
+            ).rowcount
+            if not bumped:
+                connection.execute(
+                    insert(CacheVersion).values(table_name=table, version=1)
+                )
+
+    def _poll(self, session):
+        # One thread per interval reads CACHE_VERSION, outside the lock
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not QUERY_CACHE_POLL_SECONDS
+                or now - self._polled_at < QUERY_CACHE_POLL_SECONDS
+            ):
+                return
+            self._polled_at = now
+        versions = dict(
+            session.execute(select(CacheVersion.table_name, CacheVersion.version)).all()
+        )
+        with self._lock:
+            previous, self._versions = self._versions, versions
+        if previous is not None:
+            changed = [
+                table
+                for table, version in versions.items()
+                if previous.get(table) != version
+            ]
+            if changed:
+                self.invalidate(*changed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _invalidated_since(self, tables, since):
+        with self._lock:
+            return any(self._invalidated_at.get(table, 0) > since for table in tables)
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[1]
+
+
+query_cache = QueryCache()
+
+
+# Write-driven invalidation: remember which tables a session wrote and drop
+# the dependent cache entries once the transaction commits.
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    written = session.info.setdefault("written_tables", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        written.add(obj.__table__.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    statement = orm_execute_state.statement
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        written = orm_execute_state.session.info.setdefault("written_tables", set())
+        written.add(statement.table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_tables(session):
+    written = session.info.pop("written_tables", None)
+    if written:
+        query_cache.invalidate(*written)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session):
+    session.info.pop("written_tables", None)
@@ -0,0 +1,368 @@
+"""Deterministic synthetic data for every table in db.py.
+
+    python -m datagen --users 20000 --days 365 --visits-per-user 50 --seed 42
+
+The same seed, scale and --end-date always produce the same rows. Rows are
+generated with NumPy and loaded with batched Core inserts. Point
+DATABASE_URL (or --url) at a scratch SQLite file or local MySQL database.
+"""
+
+import argparse
+import time as timer
+from datetime import date, time, timedelta
+import numpy as np
+from sqlalchemy import insert
+from db import (
+    Base,
+    create_db_engine,
+    get_engine,
+    Membership,
+    User,
+    VIP,
+    Basic,
+    Trainer,
+    WorkoutSession,
+    WorkoutEquipment,
+    WorkoutEquipmentAssociation,
+    AttendanceLog,
+    UserStatus,
+    Payment,
+    SessionSchedule,
+    PersonalTrainingPlan,
+    Feedback,
+)
+
+# Same tiers as the SQL_File.zip dump
+MEMBERSHIPS = [
+    ("VIP", 100.00, 10.00),
+    ("VIP", 120.00, 15.00),
+    ("VIP", 110.00, 12.00),
+    ("VIP", 130.00, 18.00),
+    ("VIP", 140.00, 20.00),
+    ("BASIC", 50.00, 0.00),
+    ("BASIC", 55.00, 0.00),
+    ("BASIC", 60.00, 0.00),
+    ("BASIC", 65.00, 0.00),
+    ("BASIC", 70.00, 0.00),
+]
+EQUIPMENT = [
+    ("Treadmill", "Cardio"),
+    ("Dumbbells", "Strength"),
+    ("Elliptical", "Cardio"),
+    ("Rowing Machine", "Cardio"),
+    ("Bench Press", "Strength"),
+    ("Stationary Bike", "Cardio"),
+    ("Kettlebell", "Strength"),
+    ("Squat Rack", "Strength"),
+    ("Cable Machine", "Strength"),
+    ("Stair Climber", "Cardio"),
+    ("Leg Press", "Strength"),
+    ("Pull-up Bar", "Strength"),
+]
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "Cash", "Bank Transfer"]
+SPECIALIZATIONS = ["Strength", "Cardio", "Yoga", "CrossFit", "Pilates"]
+
+
+def _datetimes(start, day_offsets, minute_offsets):
+    # Vectorized start + days + minutes -> list of datetime
+    base = np.datetime64(start, "m")
+    values = (
+        base
+        + day_offsets.astype("timedelta64[D]")
+        + minute_offsets.astype("timedelta64[m]")
+    )
+    return values.astype("datetime64[us]").tolist()
+
+
+def _insert(conn, model, columns, batch_size):
+    names = list(columns)
+    values = [
+        column.tolist() if isinstance(column, np.ndarray) else column
+        for column in columns.values()
+    ]
+    rows = [dict(zip(names, row)) for row in zip(*values)]
+    for offset in range(0, len(rows), batch_size):
+        conn.execute(insert(model), rows[offset : offset + batch_size])
+    conn.commit()
+    return len(rows)
+
+
+def generate(
+    engine=None,
+    users=1000,
+    days=180,
+    visits_per_user=30,
+    trainers=20,
+    seed=42,
+    end_date=None,
+    batch_size=5000,
+):
+    engine = engine if engine is not None else get_engine()
+    rng = np.random.default_rng(seed)
+    end_date = end_date or date.today()
+    start = end_date - timedelta(days=days)
+    counts = {}
+
+    with engine.connect() as conn:
+        counts["MEMBERSHIP"] = _insert(
+            conn,
+            Membership,
+            {
+                "membership_type": [m[0] for m in MEMBERSHIPS],
+                "price": [m[1] for m in MEMBERSHIPS],
+                "valid_period": [30] * len(MEMBERSHIPS),
+                "discount_amount": [m[2] for m in MEMBERSHIPS],
+            },
+            batch_size,
+        )
+        vip_ids = [i + 1 for i, m in enumerate(MEMBERSHIPS) if m[0] == "VIP"]
+        basic_ids = [i + 1 for i, m in enumerate(MEMBERSHIPS) if m[0] == "BASIC"]
+        counts["VIP"] = _insert(
+            conn,
+            VIP,
+            {
+                "membership_id": vip_ids,
+                "spa_access": [True] * len(vip_ids),
+                "free_guest_passes": rng.integers(1, 5, len(vip_ids)),
+                "personal_trainer_discount": rng.integers(5, 21, len(vip_ids)),
+            },
+            batch_size,
+        )
+        counts["BASIC"] = _insert(
+            conn,
+            Basic,
+            {
+                "membership_id": basic_ids,
+                "max_session_per_month": rng.integers(4, 13, len(basic_ids)),
+                "gym_access_hours": rng.integers(8, 17, len(basic_ids)),
+            },
+            batch_size,
+        )
+
+        user_ids = np.arange(1, users + 1)
+        user_membership = rng.integers(1, len(MEMBERSHIPS) + 1, users)
+        counts["USER"] = _insert(
+            conn,
+            User,
+            {
+                "membership_id": user_membership,
+                "user_name": [f"Member {i}" for i in user_ids],
+                "user_email": [f"member{i}@example.com" for i in user_ids],
+                "user_phone_number": [f"555-{i:07d}" for i in user_ids],
+                "date_of_birth": _datetimes(
+                    date(1960, 1, 1), rng.integers(0, 40 * 365, users), np.zeros(users)
+                ),
+                "registeration_date": _datetimes(
+                    start - timedelta(days=365),
+                    rng.integers(0, 365, users),
+                    rng.integers(0, 24 * 60, users),
+                ),
+            },
+            batch_size,
+        )
+
+        counts["TRAINER"] = _insert(
+            conn,
+            Trainer,
+            {
+                "trainer_name": [f"Trainer {i}" for i in range(1, trainers + 1)],
+                "trainer_specialization": rng.choice(SPECIALIZATIONS, trainers),
+                "trainer_phone_number": [f"555-9{i:06d}" for i in range(trainers)],
+                "trainer_email": [f"trainer{i}@example.com" for i in range(trainers)],
+            },
+            batch_size,
+        )
+
+        counts["WORKOUT_EQUIPMENT"] = _insert(
+            conn,
+            WorkoutEquipment,
+            {
+                "equipment_name": [e[0] for e in EQUIPMENT],
+                "equipment_category": [e[1] for e in EQUIPMENT],
+                "last_maintenance_date": _datetimes(
+                    start,
+                    rng.integers(0, days, len(EQUIPMENT)),
+                    np.zeros(len(EQUIPMENT)),
+                ),
+            },
+            batch_size,
+        )
+
+        # Attendance, ordered by check-in so log_id follows time like live data
+        visits = users * visits_per_user
+        visit_days = rng.integers(0, days, visits)
+        visit_minutes = rng.integers(6 * 60, 21 * 60, visits)
+        order = np.lexsort((visit_minutes, visit_days))
+        visit_days, visit_minutes = visit_days[order], visit_minutes[order]
+        counts["ATTENDANCE_LOG"] = _insert(
+            conn,
+            AttendanceLog,
+            {
+                "user_id": rng.integers(1, users + 1, visits),
+                "check_in_time": _datetimes(start, visit_days, visit_minutes),
+                "check_out_time": _datetimes(
+                    start, visit_days, visit_minutes + rng.integers(30, 121, visits)
+                ),
+            },
+            batch_size,
+        )
+
+        workouts = max(1, visits // 2)
+        workout_days = np.sort(rng.integers(0, days, workouts))
+        counts["WORKOUT_SESSION"] = _insert(
+            conn,
+            WorkoutSession,
+            {
+                "user_id": rng.integers(1, users + 1, workouts),
+                "workout_time": _datetimes(
+                    start, workout_days, rng.integers(6 * 60, 21 * 60, workouts)
+                ),
+                "workout_duration": rng.integers(20, 91, workouts),
+                "calorie_burned": np.round(rng.uniform(100, 800, workouts), 2),
+            },
+            batch_size,
+        )
+
+        # 1-3 distinct pieces of equipment per workout
+        picks = np.argsort(rng.random((workouts, len(EQUIPMENT))), axis=1)[:, :3]
+        used = np.arange(3) < rng.integers(1, 4, workouts)[:, None]
+        workout_ids = np.broadcast_to(np.arange(1, workouts + 1)[:, None], picks.shape)
+        counts["WORKOUT_EQUIPMENT_ASSOCIATION"] = _insert(
+            conn,
+            WorkoutEquipmentAssociation,
+            {
+                "equipment_id": picks[used] + 1,
+                "workout_id": workout_ids[used],
+                "usage_duration": rng.integers(5, 46, int(used.sum())),
+            },
+            batch_size,
+        )
+
+        # Monthly measurements following a small random walk per user
+        measures = max(1, days // 30)
+        weights = rng.uniform(55, 110, users)[:, None] + np.cumsum(
+            rng.normal(0, 0.8, (users, measures)), axis=1
+        )
+        heights = np.repeat(rng.uniform(1.5, 2.0, users), measures)
+        weights = np.round(weights.ravel(), 2)
+        counts["USER_STATUS"] = _insert(
+            conn,
+            UserStatus,
+            {
+                "user_id": np.repeat(user_ids, measures),
+                "weight": weights,
+                "height": np.round(heights, 2),
+                "fat_percentage": np.round(rng.uniform(8, 35, users * measures), 2),
+                "time_measured": _datetimes(
+                    start,
+                    np.tile(np.arange(measures) * 30, users)
+                    + rng.integers(0, 30, users * measures),
+                    rng.integers(6 * 60, 21 * 60, users * measures),
+                ),
+                "BMI": np.round(weights / heights**2, 2),
+            },
+            batch_size,
+        )
+
+        # One payment per user per 30 days of history, at the tier price
+        cycles = max(1, days // 30)
+        prices = np.array([m[1] for m in MEMBERSHIPS])
+        payers = np.repeat(user_ids, cycles)
+        payment_days = (
+            np.arange(cycles)[None, :] * 30 + rng.integers(0, 30, (users, 1))
+        ).ravel()
+        order = np.argsort(payment_days, kind="stable")
+        payers, payment_days = payers[order], payment_days[order]
+        counts["PAYMENT"] = _insert(
+            conn,
+            Payment,
+            {
+                "user_id": payers,
+                "amount": prices[user_membership[payers - 1] - 1],
+                "payment_date": _datetimes(
+                    start, payment_days, rng.integers(8 * 60, 20 * 60, users * cycles)
+                ),
+                "payment_method": rng.choice(PAYMENT_METHODS, users * cycles),
+            },
+            batch_size,
+        )
+
+        # Two sessions per trainer per day, morning and afternoon
+        session_trainers = np.repeat(np.arange(1, trainers + 1), days * 2)
+        session_days = np.tile(np.repeat(np.arange(days), 2), trainers)
+        session_hours = np.tile([9, 15], trainers * days)
+        counts["SESSION_SCHEDULE"] = _insert(
+            conn,
+            SessionSchedule,
+            {
+                "trainer_id": session_trainers,
+                "user_id": rng.integers(1, users + 1, len(session_trainers)),
+                "session_date": [start + timedelta(days=int(d)) for d in session_days],
+                "start_time": [time(int(h)) for h in session_hours],
+                "end_time": [time(int(h) + 1) for h in session_hours],
+            },
+            batch_size,
+        )
+
+        plans = max(1, users // 2)
+        counts["PERSONAL_TRAINING_PLAN"] = _insert(
+            conn,
+            PersonalTrainingPlan,
+            {
+                "trainer_id": rng.integers(1, trainers + 1, plans),
+                "user_id": rng.choice(user_ids, plans, replace=False),
+                "plan_details": ["Generated plan"] * plans,
+                "plan_start_date": [
+                    start + timedelta(days=int(d)) for d in rng.integers(0, days, plans)
+                ],
+                "duration": rng.choice([30, 60, 90], plans),
+                "progress_status": rng.choice(["In Progress", "Completed"], plans),
+            },
+            batch_size,
+        )
+
+        counts["FEEDBACK"] = _insert(
+            conn,
+            Feedback,
+            {
+                "user_id": rng.integers(1, users + 1, users),
+                "trainer_id": rng.integers(1, trainers + 1, users),
+                "rating": rng.integers(1, 6, users),
+                "comments": ["Generated feedback"] * users,
+                "feedback_time": _datetimes(
+                    start, np.sort(rng.integers(0, days, users)), np.zeros(users)
+                ),
+            },
+            batch_size,
+        )
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target database (default: DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--visits-per-user", type=int, default=30)
+    parser.add_argument("--trainers", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    engine = create_db_engine(args.url) if args.url else get_engine()
+    Base.metadata.create_all(engine)
+    started = timer.perf_counter()
+    counts = generate(
+        engine,
+        users=args.users,
+        days=args.days,
+        visits_per_user=args.visits_per_user,
+        trainers=args.trainers,
+        seed=args.seed,
+        end_date=args.end_date,
+    )
+    elapsed = timer.perf_counter() - started
+    total = sum(counts.values())
+    for table, rows in counts.items():
+        print(f"{table:<32}{rows:>10}")
+    print(f"{total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/sec)")
@@ -0,0 +1,137 @@
+import re
+import sys
+from sqlalchemy.sql import text
+import queries
+
+# Access types that read a bounded slice of an index. "ALL" is a full table
+# scan and "index" is a full index scan, both of which are rejected.
+MYSQL_INDEXED_ACCESS = {"range", "ref", "eq_ref", "const", "system", "index_merge"}
+
+TABLE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN)\s+[`\"]?(\w+)[`\"]?(?:\s+(?:AS\s+)?[`\"]?(\w+)[`\"]?)?", re.I
+)
+SQL_KEYWORDS = {"ON", "WHERE", "JOIN", "LEFT", "INNER", "GROUP", "ORDER", "LIMIT"}
+
+
+def _aliases(sql):
+    # Plans name tables by their alias, so map alias -> table name
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+        aliases[table] = table
+    return aliases
+
+
+def _explain_prefix(dialect):
+    return "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+
+
+def explain_sql(connection, sql, parameters):
+    # Raw plan of a SELECT as the driver received it (a statement captured by
+    # instrumentation, with its own parameters): (columns, rows)
+    if not sql.lstrip().upper().startswith("SELECT"):
+        raise ValueError("Only SELECT statements can be explained")
+    result = connection.exec_driver_sql(
+        _explain_prefix(connection.dialect.name) + sql, parameters
+    )
+    return list(result.keys()), [tuple(row) for row in result]
+
+
+def explain(session, statement, params):
+    dialect = session.get_bind().dialect.name
+    # Render the Core statement for this dialect with :name placeholders;
+    # compiled.params carries literals such as the LIMIT value
+    compiled = statement.compile(
+        dialect=type(session.get_bind().dialect)(paramstyle="named")
+    )
+    result = session.execute(
+        text(_explain_prefix(dialect) + str(compiled)), {**compiled.params, **params}
+    )
+    aliases = _aliases(str(compiled))
+    plan = []
+    if dialect == "sqlite":
+        # detail looks like "SEARCH A USING INDEX ix (check_in_time>? ...)"
+        for row in result.mappings():
+            words = row["detail"].split()
+            if words[0] in ("SCAN", "SEARCH"):
+                table = aliases.get(words[1], words[1])
+                indexed = words[0] == "SEARCH"
+                plan.append((table, row["detail"], indexed))
+    else:
+        for row in result.mappings():
+            table = aliases.get(row["table"], row["table"])
+            access = row["type"]
+            detail = (
+                f"type={access} key={row['key']} rows={row['rows']} "
+                f"partitions={row['partitions']}"
+            )
+            plan.append((table, detail, access in MYSQL_INDEXED_ACCESS))
+    return plan
+
+
+def check_dashboard_queries(session, selected_month="2025-03"):
+    failures = []
+    for name, (statement, params, range_tables) in queries.dashboard_queries(
+        selected_month
+    ).items():
+        print(f"== {name}")
+        for table, detail, indexed in explain(session, statement, params):
+            required = table in range_tables
+            status = "ok" if indexed else ("FULL SCAN" if required else "scan")
+            print(f"   {table:<28} {status:<10} {detail}")
+            if required and not indexed:
+                failures.append((name, table))
+    return failures
+
+
+def check_booking_queries(session):
+    # The day loads and the locking re-check in scheduling.book_session; a
+    # scan of SESSION_SCHEDULE there holds the lock for the whole table
+    from datetime import date
+    from scheduling import trainer_schedule, user_schedule
+
+    day = date.today()
+    failures = []
+    for index in (trainer_schedule, user_schedule):
+        for name, statement, params in (
+            (
+                f"{index.name}_schedule_days",
+                index._load,
+                {"owner_id": 1, "first_day": day, "last_day": day},
+            ),
+            (
+                f"{index.name}_booking_clash",
+                index.clash,
+                {
+                    "owner_id": 1,
+                    "day": day,
+                    # explain() binds through text(), without the TIME type
+                    "start_time": "09:00:00",
+                    "end_time": "10:00:00",
+                },
+            ),
+        ):
+            print(f"== {name}")
+            for table, detail, indexed in explain(session, statement, params):
+                print(f"   {table:<28} {'ok' if indexed else 'FULL SCAN':<10} {detail}")
+                if table == "SESSION_SCHEDULE" and not indexed:
+                    failures.append((name, table))
+    return failures
+
+
+if __name__ == "__main__":
+    from db import session_scope
+
+    month = sys.argv[1] if len(sys.argv) > 1 else "2025-03"
+    with session_scope() as session:
+        failures = check_dashboard_queries(session, month)
+        failures += check_booking_queries(session)
+    if failures:
+        for name, table in failures:
+            print(f"{name}: {table} is not read through an index range")
+        sys.exit(1)
+    print(
+        "All dashboard and booking queries use index range access on their "
+        "fact tables."
+    )
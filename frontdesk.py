@@ -0,0 +1,29 @@
+from datetime import datetime
+from db import AttendanceLog, Payment, WorkoutSession
+
+# Rows the front-desk forms write, shared with benchmarks/load_test.py so the
+# load test exercises exactly what the forms submit
+
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "Cash", "Bank Transfer"]
+
+
+def attendance_entry(user_id, check_in, check_out):
+    # check_in / check_out are times of day, logged for today
+    today = datetime.today()
+    return AttendanceLog(
+        user_id=user_id,
+        check_in_time=datetime.combine(today, check_in),
+        check_out_time=datetime.combine(today, check_out),
+    )
+
+
+def payment_entry(user_id, amount, payment_method):
+    return Payment(user_id=user_id, amount=amount, payment_method=payment_method)
+
+
+def workout_entry(user_id, workout_duration, calories_burned):
+    return WorkoutSession(
+        user_id=user_id,
+        workout_duration=workout_duration,
+        calorie_burned=calories_burned,
+    )
@@ -0,0 +1,243 @@
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
+from cache import query_cache
+import pagination
+import queries
+
+# Instrumentation Settings
+QUERY_LOG_SIZE = int(os.getenv("QUERY_LOG_SIZE", "2000"))  # statements kept
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables /metrics
+METRICS_FILE = os.getenv("METRICS_FILE")  # Prometheus text file, rewritten
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))  # seconds
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Project modules that only pass statements along; the call site is the
+# first frame outside them
+_PLUMBING = {"instrumentation.py", "cache.py", "db.py", "queries.py"}
+
+
+def _report_names():
+    names = {
+        statement: name
+        for name, (statement, _, _) in queries.dashboard_queries().items()
+    }
+    for report, spec in pagination.REPORTS.items():
+        for statement in spec["pages"]:
+            names[statement] = f"{report}_page"
+        names[spec["export"]] = f"{report}_export"
+    names[queries.VISITS_BY_USER] = names[queries.USER_NAMES] = "most_active_users"
+    return names
+
+
+def _call_site():
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if (
+            path.startswith(_PROJECT_DIR)
+            and os.path.basename(path) not in _PLUMBING
+            and "site-packages" not in path
+        ):
+            return f"{os.path.relpath(path, _PROJECT_DIR)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+def percentile(values, percent):
+    # Interpolated between the closest ranks, as statistics.median is
+    values = list(values)
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+class QueryRecorder:
+    # Ring buffer of the most recent statements with their timing, row count,
+    # call site and the dashboard report they belong to (if any). Cumulative
+    # per-report totals survive the buffer wrapping, for Prometheus counters.
+    # Query cache hits run no statement and are counted per report apart.
+    def __init__(self, size=QUERY_LOG_SIZE):
+        self.records = deque(maxlen=size)
+        self.engines = []
+        self._reports = _report_names()
+        self._totals = {}  # report -> [count, seconds]
+        self._cache_hits = {}  # report -> count
+        self._last = threading.local()  # (statement, record) last run here
+        self._lock = threading.Lock()
+
+    def instrument(self, engine):
+        @event.listens_for(engine, "before_cursor_execute")
+        def _start(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("instrumentation_start", []).append(
+                time.perf_counter()
+            )
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _stop(conn, cursor, statement, parameters, context, executemany):
+            seconds = time.perf_counter() - conn.info["instrumentation_start"].pop()
+            compiled = getattr(context, "compiled", None)
+            source = getattr(compiled, "statement", None)
+            # rowcount is only meaningful for writes; rows of a SELECT are
+            # counted by fetched() once the query cache has read them
+            written = cursor.rowcount if cursor.description is None else -1
+            record = self.record(
+                statement,
+                parameters,
+                seconds,
+                written if written >= 0 else None,
+                self._reports.get(source),
+                executemany,
+            )
+            self._last.record = (source, record)
+
+        if self.fetched not in query_cache.listeners:
+            query_cache.listeners.append(self.fetched)
+        self.engines.append(engine)
+        return engine
+
+    def record(self, statement, parameters, seconds, rows, report, executemany):
+        record = {
+            "at": time.time(),
+            "statement": statement,
+            "parameters": parameters,
+            "ms": seconds * 1000,
+            "rows": rows,  # None for SELECTs read outside the query cache
+            "report": report or "",
+            "site": _call_site(),
+            "executemany": executemany,
+        }
+        self.records.append(record)
+        with self._lock:
+            totals = self._totals.setdefault(report or "other", [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+        return record
+
+    def fetched(self, statement, rows, hit):
+        if hit:
+            report = self._reports.get(statement, "other")
+            with self._lock:
+                self._cache_hits[report] = self._cache_hits.get(report, 0) + 1
+            return
+        source, record = getattr(self._last, "record", (None, None))
+        if source is statement:
+            record["rows"] = len(rows)
+            self._last.record = (None, None)
+
+    def slowest(self, n=10):
+        return sorted(self.records, key=lambda record: record["ms"], reverse=True)[:n]
+
+    def report_latency(self):
+        timings = {}
+        for record in list(self.records):
+            if record["report"]:
+                timings.setdefault(record["report"], []).append(record["ms"])
+        with self._lock:
+            hits = dict(self._cache_hits)
+        return [
+            {
+                "report": report,
+                "calls": len(ms),
+                "cache_hits": hits.get(report, 0),
+                "p50_ms": percentile(ms, 50),
+                "p95_ms": percentile(ms, 95),
+                "max_ms": max(ms),
+            }
+            for report, ms in sorted(timings.items())
+        ]
+
+    def prometheus(self):
+        lines = [
+            "# HELP gym_query_duration_seconds Database statement latency by report.",
+            "# TYPE gym_query_duration_seconds summary",
+        ]
+        for row in self.report_latency():
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+                lines.append(
+                    f'gym_query_duration_seconds{{report="{row["report"]}",'
+                    f'quantile="{quantile}"}} {row[key] / 1000:.6f}'
+                )
+        with self._lock:
+            totals = {report: list(values) for report, values in self._totals.items()}
+            hits = dict(self._cache_hits)
+        for report, (count, seconds) in sorted(totals.items()):
+            labels = f'{{report="{report}"}}'
+            lines.append(f"gym_query_duration_seconds_sum{labels} {seconds:.6f}")
+            lines.append(f"gym_query_duration_seconds_count{labels} {count}")
+        lines += [
+            "# HELP gym_query_cache_hits_total Report queries served from the cache.",
+            "# TYPE gym_query_cache_hits_total counter",
+        ]
+        for report, count in sorted(hits.items()):
+            lines.append(f'gym_query_cache_hits_total{{report="{report}"}} {count}')
+        lines += [
+            "# HELP gym_db_pool_connections Pooled connections by state.",
+            "# TYPE gym_db_pool_connections gauge",
+        ]
+        for index, engine in enumerate(self.engines):
+            for state, value in pool_status(engine).items():
+                lines.append(
+                    f'gym_db_pool_connections{{engine="{index}",state="{state}"}} '
+                    f"{value}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=METRICS_FILE):
+        with open(path + ".tmp", "w") as output:
+            output.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+
+    def start_export(self, port=METRICS_PORT, path=METRICS_FILE):
+        # Serves http://127.0.0.1:<port>/metrics and/or rewrites <path> every
+        # METRICS_FILE_INTERVAL seconds, from daemon threads
+        recorder = self
+        if port:
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = recorder.prometheus().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        if path:
+
+            def write_periodically():
+                while True:
+                    self.write_metrics(path)
+                    time.sleep(METRICS_FILE_INTERVAL)
+
+            threading.Thread(target=write_periodically, daemon=True).start()
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {}
+    for state, method in (
+        ("size", "size"),
+        ("checked_out", "checkedout"),
+        ("checked_in", "checkedin"),
+        ("overflow", "overflow"),
+    ):
+        if hasattr(pool, method):
+            status[state] = getattr(pool, method)()
+    return status
+
+
+recorder = QueryRecorder()
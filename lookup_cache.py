@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from sqlalchemy import event, select
+from db import Membership, Session, Trainer, User, WorkoutEquipment
+
+# Lookup Cache Settings
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "600"))  # seconds
+LOOKUP_CACHE_MAX_ROWS = int(os.getenv("LOOKUP_CACHE_MAX_ROWS", "20000"))  # per table
+
+
+class LookupCache:
+    # id -> display name for one reference table, loaded with a single query
+    # and reused until the TTL expires or a commit writes the table. Tables
+    # larger than max_rows keep only their newest rows; older ids are still
+    # accepted after a primary-key lookup.
+    def __init__(
+        self, key, label, ttl=LOOKUP_CACHE_TTL, max_rows=LOOKUP_CACHE_MAX_ROWS
+    ):
+        self.key = key
+        self.label = label
+        self.table = key.table.name
+        self.name = self.table.replace("_", " ").lower()
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.complete = False  # every row of the table is cached
+        self._labels = OrderedDict()
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def labels(self, engine):
+        with self._lock:
+            if self._expires_at < time.monotonic():
+                with engine.connect() as connection:
+                    rows = connection.execute(
+                        select(self.key, self.label)
+                        .order_by(self.key.desc())
+                        .limit(self.max_rows + 1)
+                    ).all()
+                self.complete = len(rows) <= self.max_rows
+                self._labels = OrderedDict(reversed(rows[: self.max_rows]))
+                self._expires_at = time.monotonic() + self.ttl
+            return self._labels
+
+    def exists(self, engine, id):
+        if id in self.labels(engine):
+            return True
+        # Older than the cached rows, or written by another process since
+        # the load: one indexed lookup instead of a rejected insert
+        with engine.connect() as connection:
+            found = (
+                connection.execute(select(self.key).where(self.key == id)).first()
+                is not None
+            )
+        if found and self.complete:
+            self.invalidate()
+        return found
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
+
+
+lookups = {
+    cache.table: cache
+    for cache in (
+        LookupCache(User.user_id, User.user_name),
+        LookupCache(Trainer.trainer_id, Trainer.trainer_name),
+        LookupCache(Membership.membership_id, Membership.membership_type),
+        LookupCache(WorkoutEquipment.equipment_id, WorkoutEquipment.equipment_name),
+    )
+}
+
+
+# Reload a table's names after a transaction that wrote it commits
+@event.listens_for(Session, "after_flush")
+def _collect_lookup_tables(session, flush_context):
+    written = session.info.setdefault("written_lookups", set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj.__table__.name in lookups:
+            written.add(obj.__table__.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_lookups(session):
+    for table in session.info.pop("written_lookups", ()):
+        lookups[table].invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_lookup_tables(session):
+    session.info.pop("written_lookups", None)
@@ -1,213 +1,452 @@
+import io
+import tempfile
+import time
+from contextlib import contextmanager
 import streamlit as st
 import pandas as pd
-from sqlalchemy.sql import text
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from sqlalchemy.exc import DBAPIError
 from db import (
-    session,
+    create_db_engine,
+    session_scope,
     User,
-    AttendanceLog,
     WorkoutSession,
-    Payment,
     Feedback,
     Membership,
     UserStatus,
     PersonalTrainingPlan,
     WorkoutEquipmentAssociation,
 )
+from rollup import refresh_rollups
+import activity  # keeps USER_ACTIVITY current on registration and check-in
+import occupancy  # keeps OCCUPANCY_BUCKET current on check-in
+import maintenance  # keeps EQUIPMENT_WEAR current on usage recording
+import progress  # fills in BMI and keeps the PROGRESS_* tables current
+import pagination
+from cache import query_cache
+from lookup_cache import lookups
+from write_queue import WriteQueue, WriteQueueFull
+from frontdesk import PAYMENT_METHODS, attendance_entry, payment_entry, workout_entry
+from analytics import REPORT_BACKEND
+from instrumentation import recorder, pool_status
+from explain_check import explain_sql
+from routing import READ_YOUR_WRITES_SECONDS, create_router
+from scheduling import (
+    SCHEDULE_SLOT_MINUTES,
+    ScheduleConflict,
+    book_session,
+    next_free_slot,
+    trainer_schedule,
+    user_schedule,
+)
 
-# Streamlit UI
-st.title("🏋️‍♂️ Gym Management System")
+import reports
 
-menu = st.sidebar.selectbox(
-    "Choose a Section",
-    [
-        "User Registration",
-        "Attendance Logging",
-        "Workout Session Entry",
-        "Equipment Usage Recording",
-        "Payment Processing",
-        "Personal Training Plan Assignment",
-        "Trainer Feedback Submission",
-        "User Health Metrics Update",
-        "Reports & Analytics",
-    ],
-)
+if REPORT_BACKEND == "columnar":
+    from analytics import snapshot
 
-# ============================
-# 📊 REPORTS & ANALYTICS SECTION
-# ============================
-if menu == "Reports & Analytics":
-    st.header("📊 Reports & Analytics")
 
-    # Membership Distribution Report
-    st.subheader("🏅 Membership Distribution")
-    membership_data = session.execute(
-        text(
-            "SELECT membership_type, COUNT(user_id) AS total_users FROM USER U JOIN MEMBERSHIP M ON U.membership_id = M.membership_id GROUP BY membership_type"
-        )
-    ).fetchall()
+# One pooled engine per server process, shared across reruns and browser tabs
+# Every statement is timed into the instrumentation ring buffer
+@st.cache_resource
+def get_engine():
+    engine = recorder.instrument(create_db_engine())
+    recorder.start_export()
+    return engine
 
-    if membership_data:
-        df_membership = pd.DataFrame(
-            membership_data, columns=["Membership Type", "Total Users"]
-        )
-        st.bar_chart(df_membership.set_index("Membership Type"))
-        st.table(df_membership)
-    else:
-        st.write("No membership data available.")
-
-    # Attendance Analysis Report
-    st.subheader("📅 Attendance Trends (March 1 - March 15, 2025)")
-    # Query to get attendance logs for March 1 - March 15, 2025
-    attendance_data = session.execute(
-        text(
-            "SELECT DATE(check_in_time) AS visit_date, COUNT(*) AS total_visits FROM ATTENDANCE_LOG WHERE check_in_time BETWEEN '2025-03-01' AND '2025-03-15' GROUP BY visit_date ORDER BY visit_date"
-        )
-    ).fetchall()
 
-    # Convert to Pandas DataFrame
-    df_attendance = pd.DataFrame(attendance_data, columns=["Date", "Total Visits"])
+engine = get_engine()
 
-    if attendance_data:
-        # Display Data Table
-        st.table(df_attendance)
 
-        # Line Chart for Attendance Trends
-        st.line_chart(df_attendance.set_index("Date"))
-    else:
-        st.write("No attendance data available.")
+# Report reads go to the read replicas in DB_REPLICA_URLS (the primary when
+# none is set or healthy); form writes always go to the primary
+@st.cache_resource
+def get_router():
+    router = create_router(engine)
+    for replica in router.replicas:
+        recorder.instrument(replica)
+    return router
+
+
+router = get_router()
+
+
+# Read-your-writes: after this browser session commits, its report reads
+# stay on the primary until the replicas have had time to catch up
+def wrote_to_primary():
+    st.session_state["primary_until"] = time.time() + READ_YOUR_WRITES_SECONDS
+
+
+def report_session():
+    return router.read_session(st.session_state.get("primary_until", 0))
+
+
+@contextmanager
+def write_session():
+    with session_scope(engine) as session:
+        yield session
+    wrote_to_primary()
+
+
+# Seconds a form waits for the background writer to confirm its commit
+WRITE_ACK_TIMEOUT = 10
+
+
+@st.cache_resource
+def get_write_queue():
+    return WriteQueue(engine)
+
+
+write_queue = get_write_queue()
+
+
+# Hands a row to the background writer and waits for its durable commit
+def queue_write(obj):
+    try:
+        write_queue.submit(obj).result(timeout=WRITE_ACK_TIMEOUT)
+    except WriteQueueFull as error:
+        st.warning(str(error))
+        return False
+    except TimeoutError:
+        st.warning("The database is busy; the entry is queued and will be saved.")
+        return False
+    except Exception as error:
+        st.error(f"Could not save the entry: {error.__class__.__name__}")
+        return False
+    wrote_to_primary()
+    return True
+
+
+# Searchable name picker over the lookup cache; an ID can also be typed in
+def lookup_select(label, table, key):
+    names = lookups[table].labels(engine)
+    choice = st.selectbox(
+        label,
+        list(names),
+        index=None,
+        format_func=lambda id: f"{names[id]} (#{id})" if id in names else str(id),
+        placeholder="Type a name or ID",
+        accept_new_options=True,
+        key=key,
+    )
+    if isinstance(choice, str) and choice.strip().isdigit():
+        return int(choice)
+    return choice
+
+
+# Checks every referenced id before anything is written or queued
+def known_ids(**ids):
+    for table, id in ids.items():
+        if id is None:
+            st.error(f"Select a {lookups[table].name}.")
+            return False
+        if not isinstance(id, int) or not lookups[table].exists(engine, id):
+            st.error(f"Unknown {lookups[table].name}: {id}")
+            return False
+    return True
+
+
+# One page of a keyset-paginated report with Previous/Next and CSV export
+def show_report_page(session, report, empty_message):
+    cursors = st.session_state.setdefault(f"{report}_cursors", [None])
+    rows, next_cursor = reports.fetch_page(session, report, cursors[-1])
+    if not rows:
+        st.write(empty_message)
+        return
+    st.table(pd.DataFrame(rows, columns=pagination.REPORTS[report]["columns"]))
+
+    previous_col, page_col, next_col, export_col = st.columns(4)
+    page_col.caption(f"Page {len(cursors)}")
+    previous_col.button(
+        "Previous",
+        key=f"{report}_prev",
+        disabled=len(cursors) == 1,
+        on_click=cursors.pop,
+    )
+    next_col.button(
+        "Next",
+        key=f"{report}_next",
+        disabled=next_cursor is None,
+        on_click=cursors.append,
+        args=(next_cursor,),
+    )
+    primary_until = st.session_state.get("primary_until", 0)
+    export_col.download_button(
+        "Export CSV",
+        data=lambda: export_report(report, primary_until),
+        file_name=f"{report}.csv",
+        mime="text/csv",
+        key=f"{report}_export",
+    )
+
+
+# Runs the full report only when Export is clicked. Streamlit holds the
+# finished file in memory to serve it, so very large exports belong on the
+# command line: python -m pagination <report> out.csv
+def export_report(report, primary_until):
+    output = tempfile.TemporaryFile("w+b")
+    reader = router.reader(primary_until)
+    with reader.connect() as connection:
+        text_output = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        pagination.export_csv(connection, report, text_output)
+        text_output.flush()
+        text_output.detach()
+    output.seek(0)
+    return output
+
+
+# Each report is a fragment in its own expander: a collapsed section runs no
+# queries, widgets rerun only their own section, and on a full rerun the open
+# sections run in parallel, each on its own pooled connection
+def report_expander(title, key, expanded=False):
+    return st.expander(
+        title, expanded=expanded, key=f"{key}_section", on_change="rerun"
+    )
+
+
+@st.fragment(parallel=True)
+def membership_section():
+    with report_expander("🏅 Membership Distribution", "membership", True) as section:
+        if not section.open:
+            return
+        with report_session() as session:
+            membership_data = reports.membership_distribution(session)
+
+        if membership_data:
+            df_membership = pd.DataFrame(
+                membership_data, columns=["Membership Type", "Total Users"]
+            )
+            st.bar_chart(df_membership.set_index("Membership Type"))
+            st.table(df_membership)
+        else:
+            st.write("No membership data available.")
 
-    # Trainer Performance Report
-    st.subheader("🏋️ Trainer Performance")
-    trainer_data = session.execute(
-        text(
-            "SELECT T.trainer_name, COUNT(P.plan_id) AS total_plans, COALESCE(AVG(F.rating), 0) AS avg_rating FROM TRAINER T LEFT JOIN PERSONAL_TRAINING_PLAN P ON T.trainer_id = P.trainer_id LEFT JOIN FEEDBACK F ON T.trainer_id = F.trainer_id GROUP BY T.trainer_name ORDER BY avg_rating DESC"
-        )
-    ).fetchall()
 
-    if trainer_data:
-        df_trainers = pd.DataFrame(
-            trainer_data, columns=["Trainer", "Plans Assigned", "Average Rating"]
+@st.fragment(parallel=True)
+def attendance_section():
+    with report_expander("📅 Attendance Trends", "attendance", True) as section:
+        if not section.open:
+            return
+        # Default to the last 14 days
+        attendance_start = st.date_input(
+            "Attendance From", date.today() - timedelta(days=14)
         )
-        st.table(df_trainers)
-    else:
-        st.write("No trainer performance data available.")
-
-    # Select Month & Year for Filtering
-    selected_month = st.selectbox(
-        "Select Month", ["2025-03", "2025-02", "2025-01"], index=0
-    )  # Default to March 2025
-
-    # Workout Equipment Usage Report for the Selected Month
-    st.subheader(f"🏋️‍♂️ Equipment Usage for {selected_month}")
-
-    equipment_data = session.execute(
-        text(
-            "SELECT E.equipment_name, COUNT(A.workout_id) AS usage_count, AVG(A.usage_duration) AS avg_duration "
-            "FROM WORKOUT_EQUIPMENT E "
-            "JOIN WORKOUT_EQUIPMENT_ASSOCIATION A ON E.equipment_id = A.equipment_id "
-            "JOIN WORKOUT_SESSION W ON A.workout_id = W.workout_id "
-            "WHERE DATE_FORMAT(W.workout_time, '%Y-%m') = :selected_month "
-            "GROUP BY E.equipment_name "
-            "ORDER BY usage_count DESC"
-        ),
-        {"selected_month": selected_month},
-    ).fetchall()
-
-    if equipment_data:
-        df_equipment = pd.DataFrame(
-            equipment_data, columns=["Equipment", "Usage Count", "Avg Duration (min)"]
-        )
-        st.table(df_equipment)
-    else:
-        st.write("No equipment usage data available for this month.")
-
-    # Payment & Revenue Report
-    st.subheader("💰 Revenue Trends")
-
-    # Fetch Revenue Data
-    revenue_data = session.execute(
-        text(
-            "SELECT DATE_FORMAT(payment_date, '%Y-%m') AS month, SUM(amount) AS total_revenue "
-            "FROM PAYMENT "
-            "GROUP BY month "
-            "ORDER BY month ASC"
-        )
-    ).fetchall()
+        attendance_end = st.date_input("Attendance To", date.today())
+        with report_session() as session:
+            attendance_data = reports.attendance_trends(
+                session, attendance_start, attendance_end
+            )
 
-    # Convert to Pandas DataFrame
-    df_revenue = pd.DataFrame(revenue_data, columns=["Month", "Total Revenue"])
+        # Convert to Pandas DataFrame
+        df_attendance = pd.DataFrame(attendance_data, columns=["Date", "Total Visits"])
 
-    # Ensure "Total Revenue" is numeric
-    df_revenue["Total Revenue"] = pd.to_numeric(df_revenue["Total Revenue"])
+        if attendance_data:
+            # Display Data Table
+            st.table(df_attendance)
 
-    # Sort months correctly
-    df_revenue = df_revenue.sort_values(by="Month")
+            # Line Chart for Attendance Trends
+            st.line_chart(df_attendance.set_index("Date"))
+        else:
+            st.write("No attendance data available.")
+
+
+@st.fragment(parallel=True)
+def occupancy_section():
+    with report_expander("🏟️ Gym Occupancy", "occupancy", True) as section:
+        if not section.open:
+            return
+        with report_session() as session:
+            bucket, headcount = reports.current_occupancy(session)
+            today_data = reports.daily_occupancy(session, date.today())
+            weekly_data = reports.weekly_occupancy(session)
+
+        st.metric(f"In the gym since {bucket:%H:%M}", headcount)
+        if today_data:
+            df_today = pd.DataFrame(
+                today_data, columns=["Time", "People In Gym", "Check-ins"]
+            )
+            st.line_chart(df_today.set_index("Time"))
+        else:
+            st.write("No check-ins today.")
+
+        # Average people in the gym per weekday and hour, last 8 weeks
+        if weekly_data:
+            df_weekly = pd.DataFrame(weekly_data, columns=["Weekday", "Hour", "People"])
+            heatmap = df_weekly.pivot(index="Weekday", columns="Hour", values="People")
+            heatmap = heatmap.loc[[d for d in reports.WEEKDAYS if d in heatmap.index]]
+            peaks = df_weekly.loc[df_weekly.groupby("Weekday")["People"].idxmax()]
+            st.subheader("Peak Hour by Weekday")
+            st.table(
+                peaks.set_index("Weekday")
+                .reindex(heatmap.index)
+                .rename(columns={"Hour": "Peak Hour", "People": "Avg People"})
+            )
+            st.dataframe(heatmap.fillna(0))
+        else:
+            st.write("No occupancy history for the last 8 weeks.")
 
-    # Display Data Table
-    st.subheader("💰 Monthly Revenue Trends")
-    st.table(df_revenue)
 
-    # Plot Revenue Trends as a Line Chart
-    st.line_chart(df_revenue.set_index("Month"))
+@st.fragment(parallel=True)
+def trainer_section():
+    with report_expander("🏋️ Trainer Performance", "trainers") as section:
+        if not section.open:
+            return
+        with report_session() as session:
+            trainer_data = reports.trainer_performance(session)
 
-    # User Retention & Churn Report
-    st.subheader("🚶‍♂️ User Retention & Churn")
-    churn_data = session.execute(
-        text(
-            "SELECT U.user_name, MAX(A.check_in_time) AS last_visit FROM USER U LEFT JOIN ATTENDANCE_LOG A ON U.user_id = A.user_id GROUP BY U.user_name HAVING last_visit < DATE_SUB(NOW(), INTERVAL 3 MONTH) OR last_visit IS NULL"
-        )
-    ).fetchall()
+        if trainer_data:
+            df_trainers = pd.DataFrame(
+                trainer_data, columns=["Trainer", "Plans Assigned", "Average Rating"]
+            )
+            st.table(df_trainers)
+        else:
+            st.write("No trainer performance data available.")
+
+
+@st.fragment(parallel=True)
+def equipment_section():
+    with report_expander("🏋️‍♂️ Equipment Usage", "equipment") as section:
+        if not section.open:
+            return
+        # Select Month & Year for Filtering
+        selected_month = st.selectbox(
+            "Select Month", reports.recent_months(), index=0, key="equipment_month"
+        )  # Default to the current month
+        with report_session() as session:
+            equipment_data = reports.equipment_usage(session, selected_month)
+
+        if equipment_data:
+            df_equipment = pd.DataFrame(
+                equipment_data,
+                columns=["Equipment", "Usage Count", "Avg Duration (min)"],
+            )
+            st.table(df_equipment)
+        else:
+            st.write("No equipment usage data available for this month.")
+
+
+@st.fragment(parallel=True)
+def maintenance_section():
+    with report_expander("🔧 Maintenance Due", "maintenance") as section:
+        if not section.open:
+            return
+        with report_session() as session:
+            maintenance_data = reports.maintenance_due(session)
+
+        if maintenance_data:
+            df_maintenance = pd.DataFrame(
+                maintenance_data,
+                columns=[
+                    "Equipment",
+                    "Minutes Since Service",
+                    "Sessions Since Service",
+                    "Last Serviced",
+                    "Due",
+                ],
+            )
+            df_maintenance["Due"] = df_maintenance["Due"].map({True: "⚠️", False: ""})
+            st.table(df_maintenance)
+            st.caption(
+                f"Due after {maintenance.MAINTENANCE_DUE_MINUTES} minutes of use "
+                "since the last service."
+            )
+        else:
+            st.write("No equipment usage recorded yet.")
 
-    if churn_data:
-        df_churn = pd.DataFrame(churn_data, columns=["User Name", "Last Visit"])
-        st.table(df_churn)
-    else:
-        st.write("No churn data available.")
 
-    # User Progress Report
-    st.subheader("⚕️ User Progress (Last 6 Months)")
-    progress_data = session.execute(
-        text(
-            "SELECT U.user_name, S.weight, S.height, S.BMI, S.time_measured FROM USER_STATUS S JOIN USER U ON S.user_id = U.user_id WHERE S.time_measured >= DATE_SUB(NOW(), INTERVAL 6 MONTH) ORDER BY S.time_measured DESC"
+@st.fragment(parallel=True)
+def revenue_section():
+    with report_expander("💰 Revenue Trends", "revenue", True) as section:
+        if not section.open:
+            return
+        # 12 months up to the selected month
+        selected_month = st.selectbox(
+            "Up To Month", reports.recent_months(), index=0, key="revenue_month"
         )
-    ).fetchall()
+        with report_session() as session:
+            revenue_data = reports.revenue_trends(session, selected_month)
 
-    if progress_data:
-        df_progress = pd.DataFrame(
-            progress_data,
-            columns=["User Name", "Weight (kg)", "Height (m)", "BMI", "Measured On"],
-        )
-        st.table(df_progress)
-    else:
-        st.write("No health progress data available.")
+        # Convert to Pandas DataFrame
+        df_revenue = pd.DataFrame(revenue_data, columns=["Month", "Total Revenue"])
 
-    # Default Date Range: Today & 30 Days Ago
-    end_date = datetime.today().date()
-    start_date = end_date - timedelta(days=30)
+        # Ensure "Total Revenue" is numeric
+        df_revenue["Total Revenue"] = pd.to_numeric(df_revenue["Total Revenue"])
 
-    # User Selects Date Range
-    st.subheader("🏆 Most Active Users")
-    start_date = st.date_input("Start Date", start_date)
-    end_date = st.date_input("End Date", end_date)
+        # Display Data Table
+        st.subheader("💰 Monthly Revenue Trends")
+        st.table(df_revenue)
 
-    # Ensure start_date is before end_date
-    if start_date > end_date:
-        st.error("Start Date cannot be after End Date. Please select a valid range.")
-    else:
+        # Plot Revenue Trends as a Line Chart
+        st.line_chart(df_revenue.set_index("Month"))
+
+
+@st.fragment(parallel=True)
+def churn_section():
+    with report_expander("🚶‍♂️ User Retention & Churn", "churn") as section:
+        if not section.open:
+            return
+        with report_session() as session:
+            show_report_page(session, "churn", "No churn data available.")
+
+            # Retention cohorts by days since last visit
+            active_30, active_60, active_90, inactive_90 = reports.retention_cohorts(
+                session
+            )
+        cohort_cols = st.columns(4)
+        cohort_cols[0].metric("Visited in 30 days", active_30)
+        cohort_cols[1].metric("Visited in 60 days", active_60)
+        cohort_cols[2].metric("Visited in 90 days", active_90)
+        cohort_cols[3].metric("Inactive 90+ days", inactive_90)
+
+
+@st.fragment(parallel=True)
+def progress_section():
+    with report_expander("⚕️ User Progress (Last 6 Months)", "progress") as section:
+        if not section.open:
+            return
+        with report_session() as session:
+            show_report_page(session, "progress", "No health progress data available.")
+
+        # One member's trend, at most one point per week or month
+        chart_user = lookup_select("Member", "USER", "progress_user")
+        period = st.radio("Average By", ["week", "month"], horizontal=True)
+        if isinstance(chart_user, int):
+            with report_session() as session:
+                points = reports.progress_points(session, chart_user, period)
+            if points:
+                df_points = pd.DataFrame(
+                    points, columns=["Period", "Weight (kg)", "BMI", "Fat %"]
+                )
+                df_points[["Weight (kg)", "BMI", "Fat %"]] = df_points[
+                    ["Weight (kg)", "BMI", "Fat %"]
+                ].apply(pd.to_numeric)
+                st.line_chart(df_points.set_index("Period"))
+            else:
+                st.write("No measurements for this member in the last 6 months.")
+
+
+@st.fragment(parallel=True)
+def most_active_section():
+    with report_expander("🏆 Most Active Users", "most_active") as section:
+        if not section.open:
+            return
+        # Default Date Range: Today & 30 Days Ago
+        end_date = datetime.today().date()
+        start_date = end_date - timedelta(days=30)
+
+        # User Selects Date Range
+        start_date = st.date_input("Start Date", start_date)
+        end_date = st.date_input("End Date", end_date)
+
+        # Ensure start_date is before end_date
+        if start_date > end_date:
+            st.error(
+                "Start Date cannot be after End Date. Please select a valid range."
+            )
+            return
         # Fetch Most Active Users in the Selected Date Range
-        active_users_data = session.execute(
-            text(
-                "SELECT U.user_name, COUNT(A.log_id) AS total_visits "
-                "FROM USER U "
-                "JOIN ATTENDANCE_LOG A ON U.user_id = A.user_id "
-                "WHERE A.check_in_time BETWEEN :start_date AND :end_date "
-                "GROUP BY U.user_name "
-                "ORDER BY total_visits DESC "
-                "LIMIT 10"
-            ),
-            {"start_date": start_date, "end_date": end_date},
-        ).fetchall()
+        with report_session() as session:
+            active_users_data = reports.most_active_users(session, start_date, end_date)
 
         # Display the Data
         if active_users_data:
@@ -219,13 +458,92 @@ if menu == "Reports & Analytics":
         else:
             st.write("No active user data available for the selected period.")
 
+
+# Streamlit UI
+st.title("🏋️‍♂️ Gym Management System")
+
+# Diagnostics is only listed when the page is opened with ?diagnostics=1
+sections = [
+    "User Registration",
+    "Attendance Logging",
+    "Workout Session Entry",
+    "Equipment Usage Recording",
+    "Equipment Maintenance",
+    "Payment Processing",
+    "Personal Training Plan Assignment",
+    "Trainer Feedback Submission",
+    "User Health Metrics Update",
+    "Session Scheduling",
+    "Reports & Analytics",
+]
+if st.query_params.get("diagnostics") == "1":
+    sections.append("Diagnostics")
+
+menu = st.sidebar.selectbox("Choose a Section", sections)
+
+# Background writer health for the forms that go through it
+if menu in (
+    "Attendance Logging",
+    "Workout Session Entry",
+    "Payment Processing",
+    "User Health Metrics Update",
+):
+    writer_stats = write_queue.metrics()
+    st.sidebar.caption(
+        "Write queue: {queue_depth}/{max_pending} pending, "
+        "{committed} committed in {batches} batches, {failed} failed, "
+        "{rejected} rejected; commit p50 {commit_p50_ms:.1f} ms, "
+        "p95 {commit_p95_ms:.1f} ms".format(**writer_stats)
+    )
+
 # ============================
-# EXISTING FORMS (Unchanged)
+# 📊 REPORTS & ANALYTICS SECTION
+# ============================
+if menu == "Reports & Analytics":
+    st.header("📊 Reports & Analytics")
+
+    # Shared refresh first; the report sections below only read
+    with session_scope(engine) as session:
+        if REPORT_BACKEND == "columnar":
+            # Load the snapshot, or append rows committed since the last refresh
+            snapshot.current()
+            snapshot_stats = snapshot.stats()
+            st.sidebar.caption(
+                "Columnar snapshot: {rows} rows, {mib:.1f} MiB".format(
+                    mib=snapshot_stats["bytes"] / 2**20, **snapshot_stats
+                )
+            )
+        else:
+            # Fold new attendance, payments, workouts and feedback into the rollups
+            refresh_rollups(session)
+
+            # Query cache counters, for tuning QUERY_CACHE_TTL / QUERY_CACHE_MAX_MB
+            cache_stats = query_cache.stats()
+            st.sidebar.caption(
+                "Query cache: {hits} hits, {misses} misses, {entries} entries".format(
+                    **cache_stats
+                )
+            )
+
+    # Sections run concurrently, each with its own pooled connection
+    membership_section()
+    attendance_section()
+    occupancy_section()
+    trainer_section()
+    equipment_section()
+    maintenance_section()
+    revenue_section()
+    churn_section()
+    progress_section()
+    most_active_section()
+
+# ============================
+# 📝 DATA ENTRY FORMS
 # ============================
 elif menu == "User Registration":
     st.header("📋 New User Registration")
     with st.form("register_form"):
-        membership_id = st.number_input("Membership ID", min_value=1, step=1)
+        membership_id = lookup_select("Membership", "MEMBERSHIP", "register_membership")
         user_name = st.text_input("User Name")
         user_email = st.text_input("User Email")
         user_phone = st.text_input("User Phone Number")
@@ -233,8 +551,7 @@ elif menu == "User Registration":
         reg_date = datetime.now()
 
         submit = st.form_submit_button("Register User")
-        if submit:
-            session.rollback()
+        if submit and known_ids(MEMBERSHIP=membership_id):
             new_user = User(
                 membership_id=membership_id,
                 user_name=user_name,
@@ -243,107 +560,95 @@ elif menu == "User Registration":
                 date_of_birth=dob,
                 registeration_date=reg_date,
             )
-            session.add(new_user)
-            session.commit()
+            with write_session() as session:
+                session.add(new_user)
             st.success(f"User {user_name} registered successfully!")
 
 # Form 2: Attendance Logging
 elif menu == "Attendance Logging":
     st.header("🛂 Attendance Logging")
     with st.form("attendance_form"):
-        user_id = st.number_input("User ID", min_value=1, step=1)
+        user_id = lookup_select("User", "USER", "attendance_user")
         check_in = st.time_input("Check-In Time", value=datetime.now().time())
         check_out = st.time_input("Check-Out Time")
 
         submit = st.form_submit_button("Log Attendance")
-        if submit:
+        if submit and known_ids(USER=user_id):
 
-            check_in_datetime = datetime.combine(datetime.today(), check_in)
-            check_out_datetime = datetime.combine(datetime.today(), check_out)
-            session.rollback()
-            new_attendance = AttendanceLog(
-                user_id=user_id,
-                check_in_time=check_in_datetime,
-                check_out_time=check_out_datetime,
-            )
-            session.add(new_attendance)
-            session.commit()
-            st.success(f"Attendance recorded for User ID {user_id}")
+            new_attendance = attendance_entry(user_id, check_in, check_out)
+            if queue_write(new_attendance):
+                st.success(f"Attendance recorded for User ID {user_id}")
 
 # Form 3: Workout Session Entry
 elif menu == "Workout Session Entry":
     st.header("🏋️‍♂️ Workout Session Entry")
     with st.form("workout_form"):
-        user_id = st.number_input("User ID", min_value=1, step=1)
+        user_id = lookup_select("User", "USER", "workout_user")
         workout_duration = st.number_input("Workout Duration (minutes)", min_value=1)
         calories_burned = st.number_input("Calories Burned", min_value=0.0)
 
         submit = st.form_submit_button("Save Workout")
-        if submit:
-            new_workout = WorkoutSession(
-                user_id=user_id,
-                workout_duration=workout_duration,
-                calorie_burned=calories_burned,
-            )
-            session.add(new_workout)
-            session.commit()
-            st.success(f"Workout session for User ID {user_id} saved!")
+        if submit and known_ids(USER=user_id):
+            new_workout = workout_entry(user_id, workout_duration, calories_burned)
+            if queue_write(new_workout):
+                st.success(f"Workout session for User ID {user_id} saved!")
 
 # Form 4: Equipment Usage Recording
 elif menu == "Equipment Usage Recording":
     st.header("🛠️ Equipment Usage Recording")
     with st.form("equipment_form"):
-        equipment_id = st.number_input("Equipment ID", min_value=1, step=1)
+        equipment_id = lookup_select(
+            "Equipment", "WORKOUT_EQUIPMENT", "equipment_equipment"
+        )
         workout_id = st.number_input("Workout Session ID", min_value=1, step=1)
         usage_duration = st.number_input("Usage Duration (minutes)", min_value=1)
 
         submit = st.form_submit_button("Record Equipment Usage")
-        if submit:
+        if submit and known_ids(WORKOUT_EQUIPMENT=equipment_id):
             new_usage = WorkoutEquipmentAssociation(
                 equipment_id=equipment_id,
                 workout_id=workout_id,
                 usage_duration=usage_duration,
             )
-            session.rollback()
-            session.add(new_usage)
-            session.commit()
-            st.success(
-                f"Equipment {equipment_id} usage recorded for Workout {workout_id}"
-            )
+            with write_session() as session:
+                # Workout sessions are too many to cache; one primary-key read
+                workout_exists = session.get(WorkoutSession, workout_id) is not None
+                if workout_exists:
+                    session.add(new_usage)
+            if workout_exists:
+                st.success(
+                    f"Equipment {equipment_id} usage recorded for Workout {workout_id}"
+                )
+            else:
+                st.error(f"Unknown workout session: {workout_id}")
 
 # Form 5: Payment Processing
 elif menu == "Payment Processing":
     st.header("💳 Payment Processing")
     with st.form("payment_form"):
-        user_id = st.number_input("User ID", min_value=1, step=1)
+        user_id = lookup_select("User", "USER", "payment_user")
         amount = st.number_input("Payment Amount", min_value=1.0, format="%.2f")
-        payment_method = st.selectbox(
-            "Payment Method", ["Credit Card", "Debit Card", "Cash", "Bank Transfer"]
-        )
+        payment_method = st.selectbox("Payment Method", PAYMENT_METHODS)
 
         submit = st.form_submit_button("Process Payment")
-        if submit:
-            session.rollback()
-            new_payment = Payment(
-                user_id=user_id, amount=amount, payment_method=payment_method
-            )
-            session.add(new_payment)
-            session.commit()
-            st.success(f"Payment of ${amount} received from User ID {user_id}")
+        if submit and known_ids(USER=user_id):
+            new_payment = payment_entry(user_id, amount, payment_method)
+            if queue_write(new_payment):
+                st.success(f"Payment of ${amount} received from User ID {user_id}")
 
 # Form 6: Personal Training Plan Assignment
 elif menu == "Personal Training Plan Assignment":
     st.header("📑 Assign Training Plan")
     with st.form("training_plan_form"):
-        trainer_id = st.number_input("Trainer ID", min_value=1, step=1)
-        user_id = st.number_input("User ID", min_value=1, step=1)
+        trainer_id = lookup_select("Trainer", "TRAINER", "plan_trainer")
+        user_id = lookup_select("User", "USER", "plan_user")
         plan_details = st.text_area("Plan Details")
         plan_start_date = st.date_input("Plan Start Date")
         duration = st.number_input("Duration (days)", min_value=1)
         progress_status = st.selectbox("Progress Status", ["In Progress", "Completed"])
 
         submit = st.form_submit_button("Assign Plan")
-        if submit:
+        if submit and known_ids(TRAINER=trainer_id, USER=user_id):
             new_plan = PersonalTrainingPlan(
                 trainer_id=trainer_id,
                 user_id=user_id,
@@ -352,33 +657,33 @@ elif menu == "Personal Training Plan Assignment":
                 duration=duration,
                 progress_status=progress_status,
             )
-            session.add(new_plan)
-            session.commit()
+            with write_session() as session:
+                session.add(new_plan)
             st.success(f"Training plan assigned to User ID {user_id}")
 
 # Form 7: Trainer Feedback Submission
 elif menu == "Trainer Feedback Submission":
     st.header("📝 Trainer Feedback")
     with st.form("feedback_form"):
-        user_id = st.number_input("User ID", min_value=1, step=1)
-        trainer_id = st.number_input("Trainer ID", min_value=1, step=1)
+        user_id = lookup_select("User", "USER", "feedback_user")
+        trainer_id = lookup_select("Trainer", "TRAINER", "feedback_trainer")
         rating = st.slider("Rating", 1, 5)
         comments = st.text_area("Comments")
 
         submit = st.form_submit_button("Submit Feedback")
-        if submit:
+        if submit and known_ids(USER=user_id, TRAINER=trainer_id):
             new_feedback = Feedback(
                 user_id=user_id, trainer_id=trainer_id, rating=rating, comments=comments
             )
-            session.add(new_feedback)
-            session.commit()
+            with write_session() as session:
+                session.add(new_feedback)
             st.success(f"Feedback for Trainer ID {trainer_id} submitted!")
 
 # Form 8: User Health Metrics Update
 elif menu == "User Health Metrics Update":
     st.header("⚕️ User Health Metrics")
     with st.form("health_metrics_form"):
-        user_id = st.number_input("User ID", min_value=1, step=1)
+        user_id = lookup_select("User", "USER", "health_user")
         weight = st.number_input("Weight (kg)", min_value=0.1, format="%.1f")
         height = st.number_input("Height (m)", min_value=1.5, format="%.1f")
         fat_percentage = st.number_input(
@@ -386,15 +691,173 @@ elif menu == "User Health Metrics Update":
         )
 
         submit = st.form_submit_button("Update Health Metrics")
-        if submit:
-            session.rollback()
+        if submit and known_ids(USER=user_id):
             new_health = UserStatus(
                 user_id=user_id,
                 weight=weight,
                 height=height,
                 fat_percentage=fat_percentage,
-                BMI=weight / ((height) ** 2),
             )
-            session.add(new_health)
-            session.commit()
-            st.success(f"Health metrics for User ID {user_id} updated!")
+            if queue_write(new_health):
+                st.success(f"Health metrics for User ID {user_id} updated!")
+
+# Form 9: Session Scheduling
+elif menu == "Session Scheduling":
+    st.header("📅 Session Scheduling")
+    trainer_id = lookup_select("Trainer", "TRAINER", "schedule_trainer")
+    user_id = lookup_select("User", "USER", "schedule_user")
+    minutes = st.number_input(
+        "Length (minutes)",
+        min_value=SCHEDULE_SLOT_MINUTES,
+        max_value=240,
+        value=60,
+        step=SCHEDULE_SLOT_MINUTES,
+    )
+    # Fills in the date and start time below with the earliest free slot
+    if st.button("Find Next Free Slot") and known_ids(TRAINER=trainer_id, USER=user_id):
+        slot = next_free_slot(engine, trainer_id, minutes, user_id=user_id)
+        if slot is None:
+            st.warning("No free slot in the coming days.")
+        else:
+            st.session_state["schedule_date"], st.session_state["schedule_start"] = (
+                slot[0],
+                slot[1],
+            )
+
+    with st.form("schedule_form"):
+        session_date = st.date_input("Session Date", key="schedule_date")
+        start_time = st.time_input(
+            "Start Time",
+            step=timedelta(minutes=SCHEDULE_SLOT_MINUTES),
+            key="schedule_start",
+        )
+        end_time = (
+            datetime.combine(session_date, start_time) + timedelta(minutes=minutes)
+        ).time()
+
+        submit = st.form_submit_button("Book Session")
+        if submit and known_ids(TRAINER=trainer_id, USER=user_id):
+            # A concurrent booking of the same slot can surface as a deadlock
+            # or lock wait timeout; the day is re-read and the booking tried
+            # once more, which then reports the clash if the slot was taken
+            for attempt in range(2):
+                try:
+                    with write_session() as session:
+                        book_session(
+                            session,
+                            trainer_id,
+                            user_id,
+                            session_date,
+                            start_time,
+                            end_time,
+                        )
+                except ScheduleConflict as error:
+                    st.error(str(error))
+                except DBAPIError:
+                    trainer_schedule.invalidate(trainer_id, session_date)
+                    user_schedule.invalidate(user_id, session_date)
+                    if attempt:
+                        st.error(
+                            "That slot was just taken by another booking. "
+                            "Please pick another time."
+                        )
+                    continue
+                else:
+                    st.success(
+                        f"Session booked for User ID {user_id} with Trainer ID "
+                        f"{trainer_id} on {session_date} at {start_time:%H:%M}"
+                    )
+                break
+
+    if isinstance(trainer_id, int):
+        booked = trainer_schedule.day(engine, trainer_id, session_date).booked()
+        st.caption(
+            f"Trainer bookings on {session_date}: "
+            + (
+                ", ".join(f"{start:%H:%M}-{end:%H:%M}" for start, end in booked)
+                or "none"
+            )
+        )
+
+# Form 10: Equipment Maintenance
+elif menu == "Equipment Maintenance":
+    st.header("🔧 Equipment Maintenance")
+    with st.form("maintenance_form"):
+        equipment_id = lookup_select(
+            "Equipment", "WORKOUT_EQUIPMENT", "maintenance_equipment"
+        )
+        serviced_on = st.date_input("Serviced On", date.today())
+
+        submit = st.form_submit_button("Record Service")
+        if submit and known_ids(WORKOUT_EQUIPMENT=equipment_id):
+            with write_session() as session:
+                maintenance.record_maintenance(session, equipment_id, serviced_on)
+            st.success(
+                f"Service of Equipment {equipment_id} recorded for {serviced_on}"
+            )
+
+# ============================
+# 🩺 DIAGNOSTICS (hidden)
+# ============================
+elif menu == "Diagnostics":
+    st.header("🩺 Query Diagnostics")
+
+    pool = pool_status(engine)
+    pool_cols = st.columns(len(pool) + 1)
+    pool_cols[0].metric("Captured statements", len(recorder.records))
+    for col, (state, value) in zip(pool_cols[1:], pool.items()):
+        col.metric(f"Pool {state.replace('_', ' ')}", value)
+
+    replicas = router.status()
+    if replicas:
+        st.subheader("🔀 Read Replicas")
+        st.table(pd.DataFrame(replicas))
+
+    st.subheader("⏱️ Latency per Report")
+    latency = recorder.report_latency()
+    if latency:
+        st.table(pd.DataFrame(latency))
+    else:
+        st.write("No report queries captured yet.")
+
+    st.subheader("🐢 Slowest Statements")
+    top_n = st.slider("Show top", min_value=5, max_value=50, value=10, step=5)
+    slowest = recorder.slowest(top_n)
+    if slowest:
+        st.table(
+            pd.DataFrame(
+                [
+                    {
+                        "ms": round(record["ms"], 2),
+                        "rows": record["rows"],
+                        "report": record["report"],
+                        "call site": record["site"],
+                        "statement": record["statement"][:120],
+                    }
+                    for record in slowest
+                ]
+            )
+        )
+
+        # EXPLAIN on demand for one of the captured statements
+        choice = st.selectbox(
+            "Statement to explain",
+            range(len(slowest)),
+            format_func=lambda i: f"{slowest[i]['ms']:.1f} ms  "
+            f"{slowest[i]['statement'][:80]}",
+        )
+        if st.button("Run EXPLAIN"):
+            record = slowest[choice]
+            if record["executemany"]:
+                st.warning("Batched statements cannot be explained.")
+            else:
+                try:
+                    with engine.connect() as connection:
+                        columns, plan = explain_sql(
+                            connection, record["statement"], record["parameters"]
+                        )
+                    st.table(pd.DataFrame(plan, columns=columns))
+                except ValueError as error:
+                    st.warning(str(error))
+    else:
+        st.write("No statements captured yet.")
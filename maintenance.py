@@ -0,0 +1,149 @@
+import os
+from datetime import date
+from sqlalchemy import case, delete, func, insert, select, update
+from db import (
+    EquipmentWear,
+    WorkoutEquipment,
+    WorkoutEquipmentAssociation,
+    WorkoutSession,
+)
+from summaries import SummaryTable
+
+# EQUIPMENT_WEAR keeps, per machine, the minutes and sessions of use since
+# its last_maintenance_date plus lifetime totals, updated as usage is
+# recorded. Its index on minutes_since_service is the maintenance priority
+# queue: the most-used machines are the first entries of an index scan, so
+# the "due for maintenance" report reads only the rows it shows.
+
+# Machines with at least this much use since service are flagged as due
+MAINTENANCE_DUE_MINUTES = int(os.getenv("MAINTENANCE_DUE_MINUTES", "6000"))
+
+_table = EquipmentWear.__table__
+_usage = WorkoutEquipmentAssociation
+
+# Wear of every machine (or of one) from the usage history, for rebuilds
+# and for the reset after a service
+_since_service = (WorkoutEquipment.last_maintenance_date.is_(None)) | (
+    WorkoutSession.workout_time >= WorkoutEquipment.last_maintenance_date
+)
+_duration = func.coalesce(_usage.usage_duration, 0)
+_WEAR_FROM_HISTORY = (
+    select(
+        WorkoutEquipment.equipment_id,
+        WorkoutEquipment.last_maintenance_date,
+        func.coalesce(func.sum(case((_since_service, _duration), else_=0)), 0),
+        func.coalesce(func.sum(case((_since_service, 1), else_=0)), 0),
+        func.coalesce(func.sum(_duration), 0),
+        func.count(_usage.workout_id),
+    )
+    .outerjoin(_usage, _usage.equipment_id == WorkoutEquipment.equipment_id)
+    .outerjoin(WorkoutSession, WorkoutSession.workout_id == _usage.workout_id)
+    .group_by(WorkoutEquipment.equipment_id, WorkoutEquipment.last_maintenance_date)
+)
+_WEAR_COLUMNS = [
+    "equipment_id",
+    "serviced_on",
+    "minutes_since_service",
+    "sessions_since_service",
+    "total_minutes",
+    "total_sessions",
+]
+
+
+def _wear(connection, usages):
+    # usages: (equipment_id, workout_id, usage_duration); use during a
+    # workout from before the machine's last service only counts toward the
+    # lifetime totals
+    usages = [usage for usage in usages if None not in usage[:2]]
+    if not usages:
+        return {}
+    equipment_ids = {equipment_id for equipment_id, _, _ in usages}
+    workout_times = dict(
+        connection.execute(
+            select(WorkoutSession.workout_id, WorkoutSession.workout_time).where(
+                WorkoutSession.workout_id.in_({usage[1] for usage in usages})
+            )
+        ).all()
+    )
+
+    # The service date is read under lock: record_maintenance recounts a
+    # machine from scratch, and must not slip in between this read and the
+    # counter update
+    serviced_on = dict(
+        connection.execute(
+            select(_table.c.equipment_id, _table.c.serviced_on)
+            .where(_table.c.equipment_id.in_(equipment_ids))
+            .with_for_update()
+        ).all()
+    )
+    unseen = equipment_ids - set(serviced_on)
+    if unseen:
+        serviced_on.update(
+            connection.execute(
+                select(
+                    WorkoutEquipment.equipment_id,
+                    WorkoutEquipment.last_maintenance_date,
+                ).where(WorkoutEquipment.equipment_id.in_(unseen))
+            ).all()
+        )
+
+    wear = {}
+    for equipment_id, workout_id, duration in usages:
+        minutes = duration or 0
+        serviced = serviced_on.get(equipment_id)
+        workout_time = workout_times.get(workout_id)
+        since = serviced is None or (
+            workout_time is not None and workout_time.date() >= serviced
+        )
+        counters = wear.setdefault(
+            (equipment_id,),
+            dict(dict.fromkeys(_WEAR_COLUMNS[2:], 0), serviced_on=serviced),
+        )
+        counters["minutes_since_service"] += minutes if since else 0
+        counters["sessions_since_service"] += int(since)
+        counters["total_minutes"] += minutes
+        counters["total_sessions"] += 1
+    return wear
+
+
+# Usage entered on the Equipment Usage form is counted as it flushes;
+# bulk_import calls record_wear for each batch. serviced_on is only written
+# when a machine's row is first created.
+_counters = SummaryTable(
+    _table,
+    _usage,
+    ("equipment_id", "workout_id", "usage_duration"),
+    _wear,
+    fold=lambda new: {name: _table.c[name] + new(name) for name in _WEAR_COLUMNS[2:]},
+)
+record_wear = _counters.record
+
+
+def record_maintenance(session, equipment_id, serviced_on=None):
+    # Stamps the service date and recounts the machine's wear from that date
+    serviced_on = serviced_on or date.today()
+    session.execute(
+        update(WorkoutEquipment)
+        .where(WorkoutEquipment.equipment_id == equipment_id)
+        .values(last_maintenance_date=serviced_on)
+    )
+    session.execute(delete(_table).where(_table.c.equipment_id == equipment_id))
+    session.execute(
+        insert(_table).from_select(
+            _WEAR_COLUMNS,
+            _WEAR_FROM_HISTORY.where(WorkoutEquipment.equipment_id == equipment_id),
+        )
+    )
+
+
+def rebuild_wear(connection):
+    connection.execute(delete(_table))
+    connection.execute(insert(_table).from_select(_WEAR_COLUMNS, _WEAR_FROM_HISTORY))
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    with get_engine().begin() as connection:
+        rebuild_wear(connection)
+    print("EQUIPMENT_WEAR rebuilt from WORKOUT_EQUIPMENT_ASSOCIATION")
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from db import AttendanceLog, OccupancyBucket
+from summaries import SummaryTable, rebuild
+
+# OCCUPANCY_BUCKET holds, per quarter hour, the number of visits that
+# overlap it (people in the gym at some point during it) and the check-ins
+# within it. The headcount and the weekday/hour occupancy charts read a
+# bounded range of buckets instead of the attendance log. Buckets are
+# updated as check-ins are inserted; a rebuild only sees rows not yet
+# archived.
+
+BUCKET_MINUTES = 15
+MAX_VISIT_HOURS = 24  # longer visits are treated as bad data, counted once
+
+_table = OccupancyBucket.__table__
+_BUCKET = timedelta(minutes=BUCKET_MINUTES)
+
+
+def bucket_start(moment):
+    return moment.replace(
+        minute=moment.minute - moment.minute % BUCKET_MINUTES,
+        second=0,
+        microsecond=0,
+    )
+
+
+def visit_buckets(check_in, check_out):
+    # Start of every bucket the visit overlaps; an open, reversed or
+    # implausibly long visit only counts in its check-in bucket
+    first = bucket_start(check_in)
+    if (
+        check_out is None
+        or check_out <= check_in
+        or check_out - check_in > timedelta(hours=MAX_VISIT_HOURS)
+    ):
+        return [first]
+    buckets = []
+    while first < check_out:
+        buckets.append(first)
+        first += _BUCKET
+    return buckets
+
+
+def _visit_counts(connection, visits):
+    # visits: (check_in_time, check_out_time) pairs; a visit counts toward
+    # every bucket it overlaps and arrives in the bucket of its check-in
+    counts = {}
+    for check_in, check_out in visits:
+        if check_in is None:
+            continue
+        for bucket in visit_buckets(check_in, check_out):
+            totals = counts.setdefault((bucket,), {"visitors": 0, "arrivals": 0})
+            totals["visitors"] += 1
+        counts[(bucket_start(check_in),)]["arrivals"] += 1
+    return counts
+
+
+# Check-ins from the forms and the write queue are bucketed as they flush;
+# bulk_import calls record_occupancy for each batch it inserts
+_buckets = SummaryTable(
+    _table, AttendanceLog, ("check_in_time", "check_out_time"), _visit_counts
+)
+record_occupancy = _buckets.record
+
+
+def rebuild_occupancy(connection):
+    rebuild(connection, _buckets)
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    with get_engine().begin() as connection:
+        rebuild_occupancy(connection)
+    print("OCCUPANCY_BUCKET rebuilt from ATTENDANCE_LOG")
@@ -0,0 +1,164 @@
+"""Keyset-paginated report pages and streaming CSV export.
+
+    python -m pagination churn churn.csv
+    python -m pagination progress progress.csv
+
+Pages continue from the key of the last row shown ("seek" pagination), so
+each page costs the same no matter how deep the reader goes, and the full
+result is never loaded for display. Exports stream the complete result
+in yield_per chunks straight into the output file.
+"""
+
+import csv
+import sys
+from sqlalchemy import and_, bindparam, or_, select, union_all
+from cache import query_cache
+import queries
+
+PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 1000
+
+_last_visit = queries.UserActivity.last_visit
+_churned_user = queries.UserActivity.user_id
+
+
+def _churn_page(never_visited, lapsed):
+    # Each half stops after a page before the two are merged, so a page
+    # reads at most two pages of last_visit index entries
+    halves = union_all(
+        *(
+            select(
+                *half.order_by(*queries.CHURN_ORDER)
+                .limit(bindparam("limit"))
+                .subquery()
+                .c
+            )
+            for half in (never_visited, lapsed)
+        )
+    )
+    return halves.order_by(
+        halves.selected_columns.last_visit, halves.selected_columns.user_id
+    ).limit(bindparam("limit"))
+
+
+CHURN_PAGE = _churn_page(queries.NEVER_VISITED, queries.LAPSED)
+# Pages after one ending among the users never seen, and after one ending
+# among the lapsed users (past the never seen, so one index range)
+CHURN_AFTER_NEVER_VISITED = _churn_page(
+    queries.NEVER_VISITED.where(_churned_user > bindparam("after_id")),
+    queries.LAPSED,
+)
+CHURN_AFTER_LAPSED = (
+    queries.LAPSED.where(
+        _last_visit >= bindparam("after_time"),
+        or_(
+            _last_visit > bindparam("after_time"),
+            _churned_user > bindparam("after_id"),
+        ),
+    )
+    .order_by(*queries.CHURN_ORDER)
+    .limit(bindparam("limit"))
+)
+
+_measured = queries.ProgressSummary.last_measured
+_progress_user = queries.ProgressSummary.user_id
+
+PROGRESS_PAGE = (
+    queries.USER_PROGRESS.with_only_columns(
+        _progress_user, *queries.USER_PROGRESS.selected_columns
+    )
+    .order_by(None)
+    .order_by(_measured.desc(), _progress_user.desc())
+    .limit(bindparam("limit"))
+)
+PROGRESS_NEXT = PROGRESS_PAGE.where(
+    or_(
+        _measured < bindparam("after_time"),
+        and_(
+            _measured == bindparam("after_time"),
+            _progress_user < bindparam("after_id"),
+        ),
+    )
+)
+
+# report -> first page, the page after a cursor, every page statement, key
+# of a row, displayed columns, full export statement and the parameters
+# both share
+REPORTS = {
+    "churn": {
+        "first": CHURN_PAGE,
+        "next": lambda cursor: (
+            CHURN_AFTER_NEVER_VISITED
+            if cursor["after_time"] is None
+            else CHURN_AFTER_LAPSED
+        ),
+        "pages": (CHURN_PAGE, CHURN_AFTER_NEVER_VISITED, CHURN_AFTER_LAPSED),
+        "key": lambda row: {"after_time": row[2], "after_id": row[0]},
+        "columns": ["User ID", "User Name", "Last Visit"],
+        "display": slice(0, None),
+        "export": queries.USER_CHURN,
+        "params": lambda: {"cutoff": queries.months_ago(3)},
+    },
+    "progress": {
+        "first": PROGRESS_PAGE,
+        "next": lambda cursor: PROGRESS_NEXT,
+        "pages": (PROGRESS_PAGE, PROGRESS_NEXT),
+        "key": lambda row: {"after_time": row[8], "after_id": row[0]},
+        "columns": [
+            "User Name",
+            "Weight (kg)",
+            "Weight Change",
+            "BMI",
+            "BMI Change",
+            "Fat %",
+            "Fat % Change",
+            "Last Measured",
+        ],
+        "display": slice(1, None),
+        "export": queries.USER_PROGRESS,
+        "params": lambda: {"since": queries.months_ago(6)},
+    },
+}
+
+
+def fetch_page(session, report, cursor=None, page_size=PAGE_SIZE):
+    # Returns (rows to display, cursor of the next page or None)
+    spec = REPORTS[report]
+    statement = spec["first"] if cursor is None else spec["next"](cursor)
+    params = dict(spec["params"](), limit=page_size + 1, **(cursor or {}))
+    rows = query_cache.fetch(
+        session,
+        statement,
+        params,
+        queries.DEPENDS_ON[spec["export"]],
+        execution_options={"yield_per": page_size + 1},
+    )
+    next_cursor = spec["key"](rows[page_size - 1]) if len(rows) > page_size else None
+    return [row[spec["display"]] for row in rows[:page_size]], next_cursor
+
+
+def export_csv(connection, report, output):
+    # Streams the whole report into a text file object, one chunk at a time
+    spec = REPORTS[report]
+    result = connection.execution_options(
+        stream_results=True, yield_per=EXPORT_CHUNK_SIZE
+    ).execute(spec["export"], spec["params"]())
+    writer = csv.writer(output)
+    writer.writerow(spec["columns"])
+    written = 0
+    for chunk in result.partitions():
+        writer.writerows(chunk)
+        written += len(chunk)
+    return written
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    if len(sys.argv) != 3 or sys.argv[1] not in REPORTS:
+        sys.exit(f"usage: python -m pagination {{{','.join(REPORTS)}}} OUTPUT.csv")
+    with get_engine().connect() as connection, open(
+        sys.argv[2], "w", newline=""
+    ) as output:
+        rows = export_csv(connection, sys.argv[1], output)
+    print(f"Exported {rows} rows to {sys.argv[2]}")
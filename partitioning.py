@@ -0,0 +1,169 @@
+"""Monthly RANGE partitioning for the append-only tables (MySQL only).
+
+    python -m partitioning ddl        # print the statements, change nothing
+    python -m partitioning apply      # partition tables that are not yet
+    python -m partitioning maintain   # add partitions for the coming months
+
+Each table is partitioned by month on its time column, so a query with a
+time range (this month's check-ins, a month of payments) only opens the
+partitions overlapping it, however much history is kept. MySQL requires the
+partitioning column in every unique key and does not allow foreign keys on
+or to partitioned InnoDB tables, so `apply` widens the primary key to
+(id, time) and drops those foreign keys; the references are then only
+checked by the application. The time column becomes NOT NULL, so rows
+without a time have to be fixed first; `ddl` and `apply` stop on them
+before changing any table. Run `maintain` monthly (e.g. from cron) so a
+partition exists before its month starts; later rows land in pmax.
+"""
+
+import argparse
+import sys
+from datetime import date, datetime
+from sqlalchemy import inspect, text
+from db import get_engine
+from queries import add_months
+
+# Table -> (primary key, time column it is partitioned and archived by)
+PARTITIONED = {
+    "ATTENDANCE_LOG": ("log_id", "check_in_time"),
+    "PAYMENT": ("payment_id", "payment_date"),
+    "WORKOUT_SESSION": ("workout_id", "workout_time"),
+    "USER_STATUS": ("user_status_id", "time_measured"),
+}
+
+PARTITIONS_AHEAD = 3  # months of empty partitions kept ready
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def _partition(month):
+    return (
+        f"PARTITION {partition_name(month)} "
+        f"VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+    )
+
+
+def _months(first, last):
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def _partition_list(months):
+    partitions = [_partition(month) for month in months]
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return "(\n    " + ",\n    ".join(partitions) + "\n)"
+
+
+def existing_partitions(connection, table):
+    if connection.dialect.name != "mysql":
+        return []
+    return (
+        connection.execute(
+            text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                "AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION"
+            ),
+            {"table": table},
+        )
+        .scalars()
+        .all()
+    )
+
+
+def partition_ddl(connection, table, ahead=PARTITIONS_AHEAD, today=None):
+    key, column = PARTITIONED[table]
+    today = today or date.today()
+    # MODIFY ... NOT NULL would fail half way through the statements below
+    missing = connection.execute(
+        text(f"SELECT COUNT(*) FROM `{table}` WHERE `{column}` IS NULL")
+    ).scalar()
+    if missing:
+        raise SystemExit(
+            f"{table}: {missing} rows have no {column}; set or delete them "
+            "before partitioning"
+        )
+    inspector = inspect(connection)
+    statements = [
+        f"ALTER TABLE `{name}` DROP FOREIGN KEY `{fk['name']}`"
+        for name in inspector.get_table_names()
+        for fk in inspector.get_foreign_keys(name)
+        if name == table or fk["referred_table"] == table
+    ]
+    statements.append(
+        f"ALTER TABLE `{table}` MODIFY `{column}` DATETIME NOT NULL, "
+        f"DROP PRIMARY KEY, ADD PRIMARY KEY (`{key}`, `{column}`)"
+    )
+    oldest = connection.execute(text(f"SELECT MIN(`{column}`) FROM `{table}`")).scalar()
+    months = _months(oldest.date() if oldest else today, add_months(today, ahead))
+    statements.append(
+        f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(`{column}`) "
+        + _partition_list(months)
+    )
+    return statements
+
+
+def add_partitions(connection, table, ahead=PARTITIONS_AHEAD, today=None):
+    # Splits the new months off the (normally empty) pmax partition
+    existing = existing_partitions(connection, table)
+    if not existing:
+        return []
+    today = today or date.today()
+    last = max(
+        datetime.strptime(name[1:], "%Y%m").date()
+        for name in existing
+        if name != "pmax"
+    )
+    months = list(_months(add_months(last, 1), add_months(today, ahead)))
+    if months:
+        connection.execute(
+            text(
+                f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO "
+                + _partition_list(months)
+            )
+        )
+    return months
+
+
+def drop_partition(connection, table, month):
+    # Instant removal of an archived month; False when there is no partition
+    if partition_name(month) not in existing_partitions(connection, table):
+        return False
+    connection.execute(
+        text(f"ALTER TABLE `{table}` DROP PARTITION {partition_name(month)}")
+    )
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["ddl", "apply", "maintain"])
+    parser.add_argument("--ahead", type=int, default=PARTITIONS_AHEAD)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if engine.dialect.name != "mysql":
+        sys.exit("Partitioning needs MySQL; archive.py works on any database")
+    with engine.begin() as connection:
+        if args.command == "maintain":
+            for table in PARTITIONED:
+                months = add_partitions(connection, table, args.ahead)
+                print(f"{table}: added {len(months)} partitions")
+        else:
+            # Every table is checked before the first (auto-committing) ALTER
+            pending = {}
+            for table in PARTITIONED:
+                if existing_partitions(connection, table):
+                    print(f"-- {table} is already partitioned")
+                else:
+                    pending[table] = partition_ddl(connection, table, args.ahead)
+            for statements in pending.values():
+                for statement in statements:
+                    if args.command == "apply":
+                        connection.execute(text(statement))
+                    print(statement + ";")
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from db import Session, ProgressBucket, ProgressSummary, UserStatus
+from summaries import SummaryTable, rebuild
+
+# PROGRESS_SUMMARY keeps each user's first and latest measurement, and
+# PROGRESS_BUCKET the weekly and monthly sums and counts of weight, BMI and
+# fat percentage, so the progress report reads one row per user and a chart
+# one row per period instead of every USER_STATUS row. Both are updated as
+# measurements are inserted; a rebuild only sees rows not yet archived.
+
+PERIODS = ("week", "month")
+
+_summary = ProgressSummary.__table__
+_buckets = ProgressBucket.__table__
+_MEASURES = ("weight", "BMI", "fat_percentage")
+_SUMS = tuple(
+    f"{measure}_{total}" for measure in _MEASURES for total in ("count", "sum")
+)
+
+
+def _decimal(value):
+    # Forms send floats, the database Decimals; sums need one type
+    return None if value is None else Decimal(str(value))
+
+
+def bmi(weight, height):
+    if not weight or not height:
+        return None
+    return round(_decimal(weight) / _decimal(height) ** 2, 2)
+
+
+def period_start(period, day):
+    # Monday of the week, or the first of the month
+    day = day.date() if hasattr(day, "date") else day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _state(measured, weight, height, BMI, fat_percentage):
+    return {
+        "first_measured": measured,
+        "last_measured": measured,
+        "measurement_count": 1,
+        "first_weight": weight,
+        "first_BMI": BMI,
+        "first_fat_percentage": fat_percentage,
+        "latest_weight": weight,
+        "latest_height": height,
+        "latest_BMI": BMI,
+        "latest_fat_percentage": fat_percentage,
+    }
+
+
+def _merge(state, other):
+    # Combines two summaries of the same user, whichever order they arrive in
+    merged = dict(
+        state, measurement_count=state["measurement_count"] + other["measurement_count"]
+    )
+    if other["first_measured"] < state["first_measured"]:
+        for name in (
+            "first_measured",
+            "first_weight",
+            "first_BMI",
+            "first_fat_percentage",
+        ):
+            merged[name] = other[name]
+    if other["last_measured"] >= state["last_measured"]:
+        for name in (
+            "last_measured",
+            "latest_weight",
+            "latest_height",
+            "latest_BMI",
+            "latest_fat_percentage",
+        ):
+            merged[name] = other[name]
+    return merged
+
+
+def _measurements(measurements):
+    # (user_id, time_measured, weight, height, BMI, fat_percentage) rows as
+    # Decimals, with the BMI filled in where only weight and height are known
+    for user_id, measured, weight, height, BMI, fat_percentage in measurements:
+        if user_id is None or measured is None:
+            continue
+        weight, height, BMI, fat_percentage = map(
+            _decimal, (weight, height, BMI, fat_percentage)
+        )
+        if BMI is None:
+            BMI = bmi(weight, height)
+        yield user_id, measured, weight, height, BMI, fat_percentage
+
+
+def _summaries(connection, measurements):
+    summaries = {}
+    for user_id, measured, weight, height, BMI, fat_percentage in _measurements(
+        measurements
+    ):
+        state = _state(measured, weight, height, BMI, fat_percentage)
+        key = (user_id,)
+        summaries[key] = _merge(summaries[key], state) if key in summaries else state
+    return summaries
+
+
+def _period_sums(connection, measurements):
+    sums = {}
+    for user_id, measured, weight, _, BMI, fat_percentage in _measurements(
+        measurements
+    ):
+        for period in PERIODS:
+            totals = sums.setdefault(
+                (user_id, period, period_start(period, measured)),
+                dict.fromkeys(_SUMS, 0),
+            )
+            for measure, value in zip(_MEASURES, (weight, BMI, fat_percentage)):
+                if value is not None:
+                    totals[f"{measure}_count"] += 1
+                    totals[f"{measure}_sum"] += value
+    return sums
+
+
+# Measurements from the forms and the write queue are folded into both
+# tables as they flush; the summary merge keeps whichever measurement is
+# earliest and latest, whatever order they arrive in
+_FIELDS = ("user_id", "time_measured", "weight", "height", "BMI", "fat_percentage")
+_summary_table = SummaryTable(_summary, UserStatus, _FIELDS, _summaries, merge=_merge)
+_bucket_table = SummaryTable(_buckets, UserStatus, _FIELDS, _period_sums)
+
+
+def record_measurements(connection, measurements):
+    measurements = list(measurements)
+    _bucket_table.record(connection, measurements)
+    return _summary_table.record(connection, measurements)
+
+
+def rebuild_progress(connection):
+    rebuild(connection, _summary_table, _bucket_table)
+
+
+# Forms leave the BMI to be derived from weight and height before insert
+@event.listens_for(Session, "before_flush")
+def _fill_bmi(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, UserStatus) and obj.BMI is None:
+            obj.BMI = bmi(obj.weight, obj.height)
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    with get_engine().begin() as connection:
+        rebuild_progress(connection)
+    print("PROGRESS_SUMMARY and PROGRESS_BUCKET rebuilt from USER_STATUS")
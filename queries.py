@@ -0,0 +1,371 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import bindparam, func, or_, select, union_all
+from db import (
+    AttendanceLog,
+    DailyEquipmentUsage,
+    DailyRevenue,
+    DailyVisits,
+    EquipmentWear,
+    Membership,
+    OccupancyBucket,
+    ProgressBucket,
+    ProgressSummary,
+    Trainer,
+    TrainerStats,
+    User,
+    UserActivity,
+    WorkoutEquipment,
+)
+from cache import query_cache
+
+# Dashboard queries for the Reports & Analytics page, as Core statements with
+# bound parameters so each is compiled once and reused from the engine's
+# compiled cache. Time filters are half-open [start, end) ranges on the bare
+# column so they can use the time indexes declared in db.py.
+
+MEMBERSHIP_DISTRIBUTION = (
+    select(Membership.membership_type, func.count(User.user_id).label("total_users"))
+    .select_from(User)
+    .join(Membership, User.membership_id == Membership.membership_id)
+    .group_by(Membership.membership_type)
+)
+
+ATTENDANCE_TRENDS = (
+    select(DailyVisits.visit_date, DailyVisits.total_visits)
+    .where(
+        DailyVisits.visit_date >= bindparam("start_date"),
+        DailyVisits.visit_date < bindparam("end_date"),
+    )
+    .order_by(DailyVisits.visit_date)
+)
+
+# Plan count and rating sum/count are kept per trainer in TRAINER_STATS, so
+# this is one row per trainer instead of a plans x feedback join.
+_avg_rating = func.coalesce(
+    TrainerStats.rating_sum / TrainerStats.feedback_count, 0
+).label("avg_rating")
+
+TRAINER_PERFORMANCE = (
+    select(
+        Trainer.trainer_name,
+        func.coalesce(TrainerStats.plan_count, 0).label("total_plans"),
+        _avg_rating,
+    )
+    .outerjoin(TrainerStats, Trainer.trainer_id == TrainerStats.trainer_id)
+    .order_by(_avg_rating.desc())
+)
+
+_usage_count = func.sum(DailyEquipmentUsage.usage_count).label("usage_count")
+
+EQUIPMENT_USAGE = (
+    select(
+        WorkoutEquipment.equipment_name,
+        _usage_count,
+        (
+            func.sum(DailyEquipmentUsage.total_duration)
+            / func.sum(DailyEquipmentUsage.usage_count)
+        ).label("avg_duration"),
+    )
+    .select_from(DailyEquipmentUsage)
+    .join(
+        WorkoutEquipment,
+        WorkoutEquipment.equipment_id == DailyEquipmentUsage.equipment_id,
+    )
+    .where(
+        DailyEquipmentUsage.usage_date >= bindparam("start_date"),
+        DailyEquipmentUsage.usage_date < bindparam("end_date"),
+    )
+    .group_by(WorkoutEquipment.equipment_name)
+    .order_by(_usage_count.desc())
+)
+
+# Machines by use since their last service, read from the top of the
+# EQUIPMENT_WEAR minutes_since_service index (see maintenance.py)
+MAINTENANCE_DUE = (
+    select(
+        WorkoutEquipment.equipment_name,
+        EquipmentWear.minutes_since_service,
+        EquipmentWear.sessions_since_service,
+        EquipmentWear.serviced_on,
+    )
+    .join(WorkoutEquipment, WorkoutEquipment.equipment_id == EquipmentWear.equipment_id)
+    .order_by(EquipmentWear.minutes_since_service.desc())
+    .limit(bindparam("limit"))
+)
+
+# Daily totals are rolled up to months by the caller, so the grouping key
+# stays the indexed column itself.
+REVENUE_TRENDS = (
+    select(
+        DailyRevenue.revenue_date,
+        func.sum(DailyRevenue.total_amount).label("total_revenue"),
+    )
+    .where(
+        DailyRevenue.revenue_date >= bindparam("start_date"),
+        DailyRevenue.revenue_date < bindparam("end_date"),
+    )
+    .group_by(DailyRevenue.revenue_date)
+    .order_by(DailyRevenue.revenue_date)
+)
+
+# USER_ACTIVITY holds one row per user (see activity.py), so churn is read
+# from its last_visit index instead of the attendance history. Churned
+# users come in (last_visit, user_id) order: those never seen first (NULLs
+# sort first), then those last seen before the cutoff, each half a range
+# of the index that also gives the order.
+_CHURN_COLUMNS = select(
+    UserActivity.user_id.label("user_id"),
+    User.user_name,
+    UserActivity.last_visit.label("last_visit"),
+).join(User, User.user_id == UserActivity.user_id)
+NEVER_VISITED = _CHURN_COLUMNS.where(UserActivity.last_visit.is_(None))
+LAPSED = _CHURN_COLUMNS.where(UserActivity.last_visit < bindparam("cutoff"))
+CHURN_ORDER = (UserActivity.last_visit, UserActivity.user_id)
+
+_churned = union_all(NEVER_VISITED, LAPSED)
+USER_CHURN = _churned.order_by(
+    _churned.selected_columns.last_visit, _churned.selected_columns.user_id
+)
+
+
+def _users_active_since(name):
+    return (
+        select(func.count())
+        .select_from(UserActivity)
+        .where(UserActivity.last_visit >= bindparam(name))
+        .scalar_subquery()
+    )
+
+
+RETENTION_COHORTS = select(
+    _users_active_since("since_30").label("active_30"),
+    _users_active_since("since_60").label("active_60"),
+    _users_active_since("since_90").label("active_90"),
+    select(func.count())
+    .select_from(UserActivity)
+    .where(
+        or_(
+            UserActivity.last_visit < bindparam("since_90"),
+            UserActivity.last_visit.is_(None),
+        )
+    )
+    .scalar_subquery()
+    .label("inactive_90"),
+)
+
+# One row per measured user from PROGRESS_SUMMARY, changes since the first
+# measurement included
+USER_PROGRESS = (
+    select(
+        User.user_name,
+        ProgressSummary.latest_weight,
+        (ProgressSummary.latest_weight - ProgressSummary.first_weight).label(
+            "weight_change"
+        ),
+        ProgressSummary.latest_BMI,
+        (ProgressSummary.latest_BMI - ProgressSummary.first_BMI).label("BMI_change"),
+        ProgressSummary.latest_fat_percentage,
+        (
+            ProgressSummary.latest_fat_percentage - ProgressSummary.first_fat_percentage
+        ).label("fat_percentage_change"),
+        ProgressSummary.last_measured,
+    )
+    .select_from(ProgressSummary)
+    .join(User, ProgressSummary.user_id == User.user_id)
+    .where(ProgressSummary.last_measured >= bindparam("since"))
+    .order_by(ProgressSummary.last_measured.desc())
+)
+
+# Weekly or monthly (sum, count) pairs for one user's progress chart; at
+# most one row per period however often the user is measured
+PROGRESS_POINTS = (
+    select(
+        ProgressBucket.period_start,
+        ProgressBucket.weight_sum,
+        ProgressBucket.weight_count,
+        ProgressBucket.BMI_sum,
+        ProgressBucket.BMI_count,
+        ProgressBucket.fat_percentage_sum,
+        ProgressBucket.fat_percentage_count,
+    )
+    .where(
+        ProgressBucket.user_id == bindparam("user_id"),
+        ProgressBucket.period == bindparam("period"),
+        ProgressBucket.period_start >= bindparam("since"),
+    )
+    .order_by(ProgressBucket.period_start)
+)
+
+# Quarter-hour occupancy counters (see occupancy.py); a day is 96 rows
+OCCUPANCY = (
+    select(
+        OccupancyBucket.bucket_start,
+        OccupancyBucket.visitors,
+        OccupancyBucket.arrivals,
+    )
+    .where(
+        OccupancyBucket.bucket_start >= bindparam("start_date"),
+        OccupancyBucket.bucket_start < bindparam("end_date"),
+    )
+    .order_by(OccupancyBucket.bucket_start)
+)
+
+_in_range = (
+    AttendanceLog.check_in_time >= bindparam("start_date"),
+    AttendanceLog.check_in_time < bindparam("end_date"),
+)
+_total_visits = func.count(AttendanceLog.log_id).label("total_visits")
+
+MOST_ACTIVE_USERS = (
+    select(User.user_name, _total_visits)
+    .select_from(AttendanceLog)
+    .join(User, User.user_id == AttendanceLog.user_id)
+    .where(*_in_range)
+    .group_by(User.user_name)
+    .order_by(_total_visits.desc())
+    .limit(10)
+)
+
+# Unlimited per-user counts, merged with archived months by archive.py when
+# a Most Active Users range reaches back past the live tables
+VISITS_BY_USER = (
+    select(AttendanceLog.user_id, _total_visits)
+    .where(*_in_range)
+    .group_by(AttendanceLog.user_id)
+)
+
+USER_NAMES = select(User.user_id, User.user_name)
+
+
+# Tables each query reads, directly or through the rollup it is built from.
+# A committed write to any of them invalidates the cached result.
+DEPENDS_ON = {
+    MEMBERSHIP_DISTRIBUTION: {"USER", "MEMBERSHIP"},
+    ATTENDANCE_TRENDS: {"DAILY_VISITS", "ATTENDANCE_LOG"},
+    TRAINER_PERFORMANCE: {
+        "TRAINER",
+        "PERSONAL_TRAINING_PLAN",
+        "TRAINER_STATS",
+        "FEEDBACK",
+    },
+    EQUIPMENT_USAGE: {
+        "DAILY_EQUIPMENT_USAGE",
+        "WORKOUT_EQUIPMENT",
+        "WORKOUT_SESSION",
+        "WORKOUT_EQUIPMENT_ASSOCIATION",
+    },
+    MAINTENANCE_DUE: {
+        "EQUIPMENT_WEAR",
+        "WORKOUT_EQUIPMENT",
+        "WORKOUT_EQUIPMENT_ASSOCIATION",
+    },
+    REVENUE_TRENDS: {"DAILY_REVENUE", "PAYMENT"},
+    USER_CHURN: {"USER", "USER_ACTIVITY", "ATTENDANCE_LOG"},
+    RETENTION_COHORTS: {"USER", "USER_ACTIVITY", "ATTENDANCE_LOG"},
+    USER_PROGRESS: {"USER_STATUS", "PROGRESS_SUMMARY", "USER"},
+    PROGRESS_POINTS: {"USER_STATUS", "PROGRESS_BUCKET"},
+    OCCUPANCY: {"ATTENDANCE_LOG", "OCCUPANCY_BUCKET"},
+    MOST_ACTIVE_USERS: {"ATTENDANCE_LOG", "USER"},
+    VISITS_BY_USER: {"ATTENDANCE_LOG"},
+    USER_NAMES: {"USER"},
+}
+
+
+def run(session, statement, params=None):
+    # Cached execution of a dashboard query; returns a list of row tuples
+    return query_cache.fetch(session, statement, params, DEPENDS_ON[statement])
+
+
+def add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_range(month):
+    # "2025-03" -> (2025-03-01, 2025-04-01)
+    start = datetime.strptime(month, "%Y-%m").date()
+    return start, add_months(start, 1)
+
+
+def day_range(start_date, end_date):
+    # Inclusive calendar days -> half-open datetime range
+    return (
+        datetime.combine(start_date, datetime.min.time()),
+        datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+    )
+
+
+def retention_params(today=None):
+    today = today or date.today()
+    return {
+        f"since_{days}": datetime.combine(
+            today - timedelta(days=days), datetime.min.time()
+        )
+        for days in (30, 60, 90)
+    }
+
+
+def months_ago(months, today=None):
+    # Midnight of the same day N months back, so the bound (and the cache
+    # key built from it) only changes once a day
+    today = today or date.today()
+    first = add_months(today, -months)
+    # Keep the day of month, clamped to the length of the target month
+    last_day = (add_months(first, 1) - timedelta(days=1)).day
+    day = first.replace(day=min(today.day, last_day))
+    return datetime.combine(day, datetime.min.time())
+
+
+# Name -> (statement, sample parameters, tables that must be read through an
+# index range rather than a full scan). Used by explain_check.py.
+def dashboard_queries(selected_month="2025-03"):
+    month_start, month_end = month_range(selected_month)
+    active_start, active_end = day_range(
+        datetime.today().date() - timedelta(days=30), datetime.today().date()
+    )
+    return {
+        "membership_distribution": (MEMBERSHIP_DISTRIBUTION, {}, []),
+        "attendance_trends": (
+            ATTENDANCE_TRENDS,
+            {"start_date": month_start, "end_date": month_start + timedelta(days=15)},
+            ["DAILY_VISITS"],
+        ),
+        "trainer_performance": (TRAINER_PERFORMANCE, {}, []),
+        "equipment_usage": (
+            EQUIPMENT_USAGE,
+            {"start_date": month_start, "end_date": month_end},
+            ["DAILY_EQUIPMENT_USAGE"],
+        ),
+        "maintenance_due": (MAINTENANCE_DUE, {"limit": 10}, []),
+        "revenue_trends": (
+            REVENUE_TRENDS,
+            {"start_date": add_months(month_start, -11), "end_date": month_end},
+            ["DAILY_REVENUE"],
+        ),
+        "user_churn": (USER_CHURN, {"cutoff": months_ago(3)}, ["USER_ACTIVITY"]),
+        "retention_cohorts": (
+            RETENTION_COHORTS,
+            retention_params(),
+            ["USER_ACTIVITY"],
+        ),
+        "user_progress": (
+            USER_PROGRESS,
+            {"since": months_ago(6)},
+            ["PROGRESS_SUMMARY"],
+        ),
+        "progress_points": (
+            PROGRESS_POINTS,
+            {"user_id": 1, "period": "week", "since": months_ago(6)},
+            ["PROGRESS_BUCKET"],
+        ),
+        "occupancy": (
+            OCCUPANCY,
+            {"start_date": month_start, "end_date": month_start + timedelta(weeks=8)},
+            ["OCCUPANCY_BUCKET"],
+        ),
+        "most_active_users": (
+            MOST_ACTIVE_USERS,
+            {"start_date": active_start, "end_date": active_end},
+            ["ATTENDANCE_LOG"],
+        ),
+    }
@@ -0,0 +1,323 @@
+"""Dashboard reports as plain functions, runnable outside Streamlit.
+
+    python -m reports attendance --start-date 2025-03-01 --end-date 2025-03-15
+    python -m reports revenue --month 2025-03 --output revenue.csv
+    python -m reports most-active --start-date 2025-03-01 --end-date 2025-03-31 --repeat 20
+
+Each function takes a session plus the report's own arguments and returns
+its rows, answered from SQL (rollups and query cache) or from the columnar
+snapshot depending on REPORT_BACKEND. The statements are the bound Core
+constructs in queries.py, compiled once per engine. --output writes CSV for
+scheduled runs; --repeat times the report with the result cache cleared.
+"""
+
+import argparse
+import csv
+import inspect
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from analytics import REPORT_BACKEND
+import maintenance
+import occupancy
+import progress
+import queries
+
+if REPORT_BACKEND == "columnar":
+    from analytics import run, fetch_page, most_active_users as _most_active_users
+else:
+    from queries import run
+    from pagination import fetch_page
+    from archive import most_active_users as _most_active_users
+
+
+def recent_months(count: int = 12, today: date | None = None) -> list[str]:
+    # "YYYY-MM" for this month and the count - 1 before it, newest first
+    this_month = (today or date.today()).replace(day=1)
+    return [f"{queries.add_months(this_month, -n):%Y-%m}" for n in range(count)]
+
+
+def membership_distribution(session) -> list[tuple[str, int]]:
+    return run(session, queries.MEMBERSHIP_DISTRIBUTION)
+
+
+def attendance_trends(
+    session, start_date: date, end_date: date
+) -> list[tuple[date, int]]:
+    # Visits per day from start_date to end_date inclusive
+    return run(
+        session,
+        queries.ATTENDANCE_TRENDS,
+        {"start_date": start_date, "end_date": end_date + timedelta(days=1)},
+    )
+
+
+def trainer_performance(session) -> list[tuple[str, int, Decimal]]:
+    return run(session, queries.TRAINER_PERFORMANCE)
+
+
+def equipment_usage(session, month: str) -> list[tuple[str, int, Decimal]]:
+    month_start, month_end = queries.month_range(month)
+    return run(
+        session,
+        queries.EQUIPMENT_USAGE,
+        {"start_date": month_start, "end_date": month_end},
+    )
+
+
+def maintenance_due(
+    session, limit: int = 10
+) -> list[tuple[str, int, int, date | None, bool]]:
+    # Most-used machines since their last service, flagged once due
+    return [
+        (*row, row[1] >= maintenance.MAINTENANCE_DUE_MINUTES)
+        for row in run(session, queries.MAINTENANCE_DUE, {"limit": limit})
+    ]
+
+
+def revenue_trends(session, month: str, months: int = 12) -> list[tuple[str, Decimal]]:
+    # Revenue per "YYYY-MM" for the `months` months ending with `month`
+    month_start, month_end = queries.month_range(month)
+    rows = run(
+        session,
+        queries.REVENUE_TRENDS,
+        {
+            "start_date": queries.add_months(month_start, 1 - months),
+            "end_date": month_end,
+        },
+    )
+    totals = {}
+    for day, amount in rows:
+        totals[f"{day:%Y-%m}"] = totals.get(f"{day:%Y-%m}", 0) + amount
+    return sorted(totals.items())
+
+
+def user_churn(
+    session, inactive_months: int = 3
+) -> list[tuple[int, str, datetime | None]]:
+    return run(
+        session, queries.USER_CHURN, {"cutoff": queries.months_ago(inactive_months)}
+    )
+
+
+def retention_cohorts(session, today: date | None = None) -> tuple[int, int, int, int]:
+    # Users seen in the last 30 / 60 / 90 days, and those not seen in 90
+    return tuple(
+        run(session, queries.RETENTION_COHORTS, queries.retention_params(today))[0]
+    )
+
+
+def user_progress(
+    session, months: int = 6
+) -> list[tuple[str, Decimal, Decimal, Decimal, Decimal, Decimal, Decimal, datetime]]:
+    # Latest weight, BMI and fat % with their change since the first
+    # measurement, for users measured in the last `months` months
+    return run(session, queries.USER_PROGRESS, {"since": queries.months_ago(months)})
+
+
+def progress_points(
+    session, user_id: int, period: str = "week", months: int = 6
+) -> list[tuple[date, Decimal, Decimal, Decimal]]:
+    # Average weight, BMI and fat % per week or month for one user's chart
+    since = progress.period_start(period, queries.months_ago(months))
+    rows = run(
+        session,
+        queries.PROGRESS_POINTS,
+        {"user_id": user_id, "period": period, "since": since},
+    )
+    # Each average over the measurements that recorded it, like SQL AVG
+    return [
+        (
+            start,
+            *(
+                round(Decimal(total) / count, 2) if count else None
+                for total, count in zip(sums[::2], sums[1::2])
+            ),
+        )
+        for start, *sums in rows
+    ]
+
+
+def current_occupancy(session, now: datetime | None = None) -> tuple[datetime, int]:
+    # People in the gym during the current quarter hour, with its start
+    bucket = occupancy.bucket_start(now or datetime.now())
+    rows = run(
+        session,
+        queries.OCCUPANCY,
+        {
+            "start_date": bucket,
+            "end_date": bucket + timedelta(minutes=occupancy.BUCKET_MINUTES),
+        },
+    )
+    return bucket, rows[0][1] if rows else 0
+
+
+def daily_occupancy(session, day: date) -> list[tuple[datetime, int, int]]:
+    # People in the gym and check-ins per quarter hour of one day
+    start, end = queries.day_range(day, day)
+    return run(session, queries.OCCUPANCY, {"start_date": start, "end_date": end})
+
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def weekly_occupancy(
+    session, weeks: int = 8, today: date | None = None
+) -> list[tuple[str, int, float]]:
+    # Average people in the gym per weekday and hour over the last `weeks`
+    # whole weeks before today (quiet hours included as zero)
+    today = today or date.today()
+    start, end = queries.day_range(today - timedelta(weeks=weeks), today - timedelta(1))
+    totals = {}
+    for bucket, visitors, _ in run(
+        session, queries.OCCUPANCY, {"start_date": start, "end_date": end}
+    ):
+        key = (bucket.weekday(), bucket.hour)
+        totals[key] = totals.get(key, 0) + visitors
+    buckets_per_hour = 60 // occupancy.BUCKET_MINUTES
+    return [
+        (WEEKDAYS[weekday], hour, round(total / (weeks * buckets_per_hour), 1))
+        for (weekday, hour), total in sorted(totals.items())
+    ]
+
+
+def most_active_users(
+    session, start_date: date, end_date: date
+) -> list[tuple[str, int]]:
+    # Ten users with the most check-ins, start_date to end_date inclusive
+    range_start, range_end = queries.day_range(start_date, end_date)
+    return _most_active_users(session, range_start, range_end)
+
+
+# CLI name -> (report, argument parsers, CSV header)
+REPORTS = {
+    "membership": (membership_distribution, {}, ["membership_type", "total_users"]),
+    "attendance": (
+        attendance_trends,
+        {"start_date": date.fromisoformat, "end_date": date.fromisoformat},
+        ["visit_date", "total_visits"],
+    ),
+    "trainers": (
+        trainer_performance,
+        {},
+        ["trainer_name", "total_plans", "avg_rating"],
+    ),
+    "equipment": (
+        equipment_usage,
+        {"month": str},
+        ["equipment_name", "usage_count", "avg_duration"],
+    ),
+    "maintenance": (
+        maintenance_due,
+        {"limit": int},
+        [
+            "equipment_name",
+            "minutes_since_service",
+            "sessions_since_service",
+            "last_serviced",
+            "due",
+        ],
+    ),
+    "revenue": (
+        revenue_trends,
+        {"month": str, "months": int},
+        ["month", "total_revenue"],
+    ),
+    "churn": (
+        user_churn,
+        {"inactive_months": int},
+        ["user_id", "user_name", "last_visit"],
+    ),
+    "retention": (
+        retention_cohorts,
+        {},
+        ["active_30", "active_60", "active_90", "inactive_90"],
+    ),
+    "progress": (
+        user_progress,
+        {"months": int},
+        [
+            "user_name",
+            "weight",
+            "weight_change",
+            "BMI",
+            "BMI_change",
+            "fat_percentage",
+            "fat_percentage_change",
+            "last_measured",
+        ],
+    ),
+    "progress-points": (
+        progress_points,
+        {"user_id": int, "period": str, "months": int},
+        ["period_start", "weight", "BMI", "fat_percentage"],
+    ),
+    "occupancy-now": (current_occupancy, {}, ["bucket_start", "visitors"]),
+    "occupancy": (
+        daily_occupancy,
+        {"day": date.fromisoformat},
+        ["bucket_start", "visitors", "arrivals"],
+    ),
+    "occupancy-weekly": (
+        weekly_occupancy,
+        {"weeks": int},
+        ["weekday", "hour", "average_visitors"],
+    ),
+    "most-active": (
+        most_active_users,
+        {"start_date": date.fromisoformat, "end_date": date.fromisoformat},
+        ["user_name", "total_visits"],
+    ),
+}
+
+
+if __name__ == "__main__":
+    from db import session_scope
+    from cache import query_cache
+    from rollup import refresh_rollups
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="report", required=True)
+    for name, (report, arguments, _) in REPORTS.items():
+        subparser = subparsers.add_parser(name)
+        signature = inspect.signature(report)
+        for argument, kind in arguments.items():
+            default = signature.parameters[argument].default
+            required = default is inspect.Parameter.empty
+            subparser.add_argument(
+                "--" + argument.replace("_", "-"),
+                type=kind,
+                required=required,
+                default=None if required else default,
+            )
+        subparser.add_argument("--output", help="CSV file (default: stdout)")
+        subparser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    report, arguments, header = REPORTS[args.report]
+    kwargs = {argument: getattr(args, argument) for argument in arguments}
+    timings = []
+    with session_scope() as session:
+        if REPORT_BACKEND == "sql":
+            refresh_rollups(session)
+        for _ in range(args.repeat):
+            query_cache.clear()
+            started = time.perf_counter()
+            rows = report(session, **kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    rows = [rows] if isinstance(rows, tuple) else rows
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(header)
+    writer.writerows(rows)
+    if args.output:
+        output.close()
+    if args.repeat > 1:
+        print(
+            f"{args.report}: {len(rows)} rows, p50 {statistics.median(timings):.2f} ms, "
+            f"max {max(timings):.2f} ms over {args.repeat} runs",
+            file=sys.stderr,
+        )
@@ -0,0 +1,346 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import Date, delete, func, insert, or_, select
+from db import (
+    session_scope,
+    AttendanceLog,
+    Payment,
+    WorkoutSession,
+    WorkoutEquipmentAssociation,
+    Feedback,
+    PersonalTrainingPlan,
+    DailyVisits,
+    DailyRevenue,
+    DailyEquipmentUsage,
+    TrainerStats,
+    RollupWatermark,
+    RollupGap,
+)
+from summaries import SummaryTable
+
+# Rollup Settings
+# Seconds an id below the watermark may stay missing before it is taken for
+# a rolled-back insert and no longer looked for
+ROLLUP_GAP_SECONDS = int(os.getenv("ROLLUP_GAP_SECONDS", "3600"))
+
+# Each rollup is advanced from the last fact id it has already folded in,
+# so a refresh only aggregates rows inserted since the previous refresh.
+WATERMARKS = {
+    "ATTENDANCE_LOG": AttendanceLog.log_id,
+    "PAYMENT": Payment.payment_id,
+    "WORKOUT_SESSION": WorkoutSession.workout_id,
+    "FEEDBACK": Feedback.feedback_id,
+    "PERSONAL_TRAINING_PLAN": PersonalTrainingPlan.plan_id,
+}
+
+
+def _lock_watermark(session, source_table):
+    # FOR UPDATE serializes concurrent refreshes of the same rollup
+    watermark = session.execute(
+        select(RollupWatermark)
+        .where(RollupWatermark.source_table == source_table)
+        .with_for_update()
+    ).scalar_one_or_none()
+    if watermark is None:
+        watermark = RollupWatermark(source_table=source_table, last_id=0)
+        session.add(watermark)
+        session.flush()
+    return watermark
+
+
+def _missing(session, column, first, last):
+    # Runs of ids in [first, last] with no row, from one ordered index scan
+    previous = func.lag(column, 1, first - 1).over(order_by=column)
+    ids = (
+        select(column.label("id"), previous.label("previous"))
+        .where(column.between(first, last))
+        .subquery()
+    )
+    gaps = [
+        (previous + 1, id - 1)
+        for id, previous in session.execute(
+            select(ids.c.id, ids.c.previous).where(ids.c.id > ids.c.previous + 1)
+        )
+    ]
+    highest = session.execute(
+        select(func.max(column)).where(column.between(first, last))
+    ).scalar()
+    if highest is None:
+        return [(first, last)]
+    if highest < last:
+        gaps.append((highest + 1, last))
+    return gaps
+
+
+def _advance(session, source_table):
+    # Returns the inclusive id ranges still to fold in, or [] if up to date:
+    # ids above the watermark, and the gaps below it that earlier refreshes
+    # left behind. Ids are handed out before commit, so a row can become
+    # visible after a higher id has already been folded in; missing ids are
+    # kept in ROLLUP_GAP and looked for again until ROLLUP_GAP_SECONDS pass.
+    watermark = _lock_watermark(session, source_table)
+    column = WATERMARKS[source_table]
+    ranges = session.execute(
+        select(RollupGap.first_id, RollupGap.last_id, RollupGap.seen_at).where(
+            RollupGap.source_table == source_table
+        )
+    ).all()
+    high = session.execute(select(func.max(column))).scalar()
+    now = datetime.now()
+    if high is not None and high > watermark.last_id:
+        ranges.append((watermark.last_id + 1, high, now))
+        watermark.last_id = high
+    if not ranges:
+        return []
+
+    session.execute(delete(RollupGap).where(RollupGap.source_table == source_table))
+    expired = now - timedelta(seconds=ROLLUP_GAP_SECONDS)
+    gaps = [
+        {
+            "source_table": source_table,
+            "first_id": missing_first,
+            "last_id": missing_last,
+            "seen_at": seen_at,
+        }
+        for first, last, seen_at in ranges
+        if seen_at > expired
+        for missing_first, missing_last in _missing(session, column, first, last)
+    ]
+    if gaps:
+        session.execute(insert(RollupGap), gaps)
+    return [(first, last) for first, last, _ in ranges]
+
+
+def _in_ranges(column, ranges):
+    return or_(*(column.between(first, last) for first, last in ranges))
+
+
+def _folded(connection, source_table, fact_ids):
+    # The ids a refresh has already counted; locks the watermark so a
+    # concurrent refresh cannot count them as well
+    last_id = connection.execute(
+        select(RollupWatermark.last_id)
+        .where(RollupWatermark.source_table == source_table)
+        .with_for_update()
+    ).scalar()
+    if last_id is None:
+        return set()
+    gaps = connection.execute(
+        select(RollupGap.first_id, RollupGap.last_id).where(
+            RollupGap.source_table == source_table
+        )
+    ).all()
+    return {
+        fact_id
+        for fact_id in fact_ids
+        if fact_id <= last_id
+        and not any(first <= fact_id <= last for first, last in gaps)
+    }
+
+
+def _upsert(session, model, key, **deltas):
+    row = session.get(model, key)
+    if row is None:
+        session.add(model(**key, **deltas))
+    else:
+        for column, delta in deltas.items():
+            setattr(row, column, getattr(row, column) + delta)
+
+
+def refresh_daily_visits(session):
+    ranges = _advance(session, "ATTENDANCE_LOG")
+    if not ranges:
+        return 0
+    visit_date = func.date(AttendanceLog.check_in_time, type_=Date)
+    rows = session.execute(
+        select(visit_date, func.count())
+        .where(_in_ranges(AttendanceLog.log_id, ranges))
+        .where(AttendanceLog.check_in_time.is_not(None))
+        .group_by(visit_date)
+    ).all()
+    for day, visits in rows:
+        _upsert(session, DailyVisits, {"visit_date": day}, total_visits=visits)
+    return len(rows)
+
+
+def refresh_daily_revenue(session):
+    ranges = _advance(session, "PAYMENT")
+    if not ranges:
+        return 0
+    revenue_date = func.date(Payment.payment_date, type_=Date)
+    method = func.coalesce(Payment.payment_method, "Unknown")
+    rows = session.execute(
+        select(
+            revenue_date,
+            method,
+            func.coalesce(func.sum(Payment.amount), 0),
+            func.count(),
+        )
+        .where(_in_ranges(Payment.payment_id, ranges))
+        .where(Payment.payment_date.is_not(None))
+        .group_by(revenue_date, method)
+    ).all()
+    for day, payment_method, amount, payments in rows:
+        _upsert(
+            session,
+            DailyRevenue,
+            {"revenue_date": day, "payment_method": payment_method},
+            total_amount=amount,
+            payment_count=payments,
+        )
+    return len(rows)
+
+
+def refresh_daily_equipment_usage(session):
+    ranges = _advance(session, "WORKOUT_SESSION")
+    if not ranges:
+        return 0
+    usage_date = func.date(WorkoutSession.workout_time, type_=Date)
+    rows = session.execute(
+        select(
+            usage_date,
+            WorkoutEquipmentAssociation.equipment_id,
+            func.count(),
+            func.coalesce(func.sum(WorkoutEquipmentAssociation.usage_duration), 0),
+        )
+        .join(
+            WorkoutSession,
+            WorkoutEquipmentAssociation.workout_id == WorkoutSession.workout_id,
+        )
+        .where(_in_ranges(WorkoutEquipmentAssociation.workout_id, ranges))
+        .where(WorkoutSession.workout_time.is_not(None))
+        .group_by(usage_date, WorkoutEquipmentAssociation.equipment_id)
+    ).all()
+    for day, equipment_id, usages, duration in rows:
+        _upsert(
+            session,
+            DailyEquipmentUsage,
+            {"usage_date": day, "equipment_id": equipment_id},
+            usage_count=usages,
+            total_duration=duration,
+        )
+    return len(rows)
+
+
+def refresh_trainer_stats(session):
+    # Plans and feedback are aggregated per trainer separately, so the report
+    # never joins the two fact tables against each other
+    return _refresh_trainer_plans(session) + _refresh_trainer_feedback(session)
+
+
+def _refresh_trainer_plans(session):
+    ranges = _advance(session, "PERSONAL_TRAINING_PLAN")
+    if not ranges:
+        return 0
+    rows = session.execute(
+        select(PersonalTrainingPlan.trainer_id, func.count())
+        .where(_in_ranges(PersonalTrainingPlan.plan_id, ranges))
+        .where(PersonalTrainingPlan.trainer_id.is_not(None))
+        .group_by(PersonalTrainingPlan.trainer_id)
+    ).all()
+    for trainer_id, plans in rows:
+        _upsert(
+            session,
+            TrainerStats,
+            {"trainer_id": trainer_id},
+            plan_count=plans,
+            feedback_count=0,
+            rating_sum=0,
+        )
+    return len(rows)
+
+
+def _refresh_trainer_feedback(session):
+    ranges = _advance(session, "FEEDBACK")
+    if not ranges:
+        return 0
+    rows = session.execute(
+        select(
+            Feedback.trainer_id,
+            func.count(Feedback.rating),
+            func.coalesce(func.sum(Feedback.rating), 0),
+        )
+        .where(_in_ranges(Feedback.feedback_id, ranges))
+        .where(Feedback.trainer_id.is_not(None))
+        .group_by(Feedback.trainer_id)
+    ).all()
+    for trainer_id, ratings, rating_sum in rows:
+        _upsert(
+            session,
+            TrainerStats,
+            {"trainer_id": trainer_id},
+            plan_count=0,
+            feedback_count=ratings,
+            rating_sum=rating_sum,
+        )
+    return len(rows)
+
+
+def refresh_rollups(session):
+    refresh_daily_visits(session)
+    refresh_daily_revenue(session)
+    refresh_daily_equipment_usage(session)
+    refresh_trainer_stats(session)
+    session.commit()
+
+
+def _late_usage(connection, usages):
+    # usages: (equipment_id, workout_id, usage_duration). Equipment usage is
+    # folded in with its workout, so usage added to a workout that is
+    # already rolled up has to be applied on its own.
+    folded = _folded(
+        connection,
+        "WORKOUT_SESSION",
+        {workout_id for _, workout_id, _ in usages if workout_id is not None},
+    )
+    if not folded:
+        return {}
+    workout_days = {
+        workout_id: workout_time.date()
+        for workout_id, workout_time in connection.execute(
+            select(WorkoutSession.workout_id, WorkoutSession.workout_time).where(
+                WorkoutSession.workout_id.in_(folded)
+            )
+        )
+        if workout_time is not None
+    }
+    deltas = {}
+    for equipment_id, workout_id, duration in usages:
+        if workout_id in workout_days and equipment_id is not None:
+            totals = deltas.setdefault(
+                (workout_days[workout_id], equipment_id),
+                {"usage_count": 0, "total_duration": 0},
+            )
+            totals["usage_count"] += 1
+            totals["total_duration"] += duration or 0
+    return deltas
+
+
+# Usage entered on the Equipment Usage form is applied as it flushes;
+# bulk_import calls record_equipment_usage for each batch it inserts
+_late_equipment_usage = SummaryTable(
+    DailyEquipmentUsage.__table__,
+    WorkoutEquipmentAssociation,
+    ("equipment_id", "workout_id", "usage_duration"),
+    _late_usage,
+)
+record_equipment_usage = _late_equipment_usage.record
+
+
+def rebuild_rollups(session):
+    for model in (DailyVisits, DailyRevenue, DailyEquipmentUsage, TrainerStats):
+        session.execute(delete(model))
+    session.execute(delete(RollupWatermark))
+    session.execute(delete(RollupGap))
+    session.flush()
+    refresh_rollups(session)
+
+
+if __name__ == "__main__":
+    import sys
+
+    with session_scope() as session:
+        if "--rebuild" in sys.argv:
+            rebuild_rollups(session)
+        else:
+            refresh_rollups(session)
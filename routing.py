@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from db import create_db_engine, session_scope
+
+# Replica Settings
+DB_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()
+]
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "0"))  # 0 = off
+# Reports read from the primary this long after the same browser session wrote
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+
+def _replica_problem(engine):
+    # None when the replica answers (and is within REPLICA_MAX_LAG_SECONDS of
+    # its source on MySQL), otherwise why it is skipped
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            if REPLICA_MAX_LAG_SECONDS and engine.dialect.name == "mysql":
+                status = connection.execute(text("SHOW REPLICA STATUS")).mappings()
+                lag = (status.first() or {}).get("Seconds_Behind_Source")
+                if lag is None:
+                    return "replication is not running"
+                if lag > REPLICA_MAX_LAG_SECONDS:
+                    return f"{lag} s behind the primary"
+    except DBAPIError as error:
+        return f"{error.__class__.__name__}: {error.orig}"
+    return None
+
+
+class ReplicaRouter:
+    # Hands out the engine for report reads: the replicas in turn, skipping
+    # any that failed their last health check, and the primary when none is
+    # usable, none is configured, or the reader just wrote. Health is
+    # re-checked at most every check_seconds per replica, on demand.
+    def __init__(self, primary, replicas=(), check_seconds=REPLICA_CHECK_SECONDS):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.check_seconds = check_seconds
+        self._checked_at = [None] * len(self.replicas)
+        self._problems = [None] * len(self.replicas)
+        self._turn = 0
+        self._lock = threading.Lock()
+        # How far behind the primary a replica in rotation may be
+        self.max_lag = REPLICA_MAX_LAG_SECONDS or READ_YOUR_WRITES_SECONDS
+
+    def reader(self, primary_until=0):
+        if time.time() < primary_until:
+            return self.primary
+        for _ in self.replicas:
+            with self._lock:
+                index = self._turn % len(self.replicas)
+                self._turn += 1
+            if self._healthy(index):
+                return self.replicas[index]
+        return self.primary
+
+    def _healthy(self, index):
+        checked_at = self._checked_at[index]
+        if checked_at is None or time.monotonic() - checked_at >= self.check_seconds:
+            self._problems[index] = _replica_problem(self.replicas[index])
+            self._checked_at[index] = time.monotonic()
+        return self._problems[index] is None
+
+    def mark_failed(self, engine, error):
+        # Takes a replica out of rotation until its next health check
+        if engine in self.replicas:
+            index = self.replicas.index(engine)
+            self._problems[index] = f"{error.__class__.__name__}: {error}"
+            self._checked_at[index] = time.monotonic()
+
+    @contextmanager
+    def read_session(self, primary_until=0):
+        engine = self.reader(primary_until)
+        try:
+            with session_scope(engine) as session:
+                if engine is not self.primary:
+                    session.info["replica_lag"] = self.max_lag
+                yield session
+        except DBAPIError as error:
+            self.mark_failed(engine, error)
+            raise
+
+    def status(self):
+        return [
+            {
+                "replica": engine.url.render_as_string(hide_password=True),
+                "healthy": self._problems[index] is None,
+                "problem": self._problems[index] or "",
+                "checked_seconds_ago": (
+                    None
+                    if self._checked_at[index] is None
+                    else round(time.monotonic() - self._checked_at[index], 1)
+                ),
+            }
+            for index, engine in enumerate(self.replicas)
+        ]
+
+
+def create_router(primary, urls=DB_REPLICA_URLS, **engine_options):
+    return ReplicaRouter(
+        primary, [create_db_engine(url, **engine_options) for url in urls]
+    )
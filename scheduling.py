@@ -0,0 +1,294 @@
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta, time as time_of_day
+from itertools import accumulate, chain
+from sqlalchemy import bindparam, event, inspect, select
+from db import Session, SessionSchedule
+
+# Scheduling Settings
+SCHEDULE_DAY_START = time_of_day.fromisoformat(os.getenv("SCHEDULE_DAY_START", "06:00"))
+SCHEDULE_DAY_END = time_of_day.fromisoformat(os.getenv("SCHEDULE_DAY_END", "22:00"))
+SCHEDULE_SLOT_MINUTES = int(os.getenv("SCHEDULE_SLOT_MINUTES", "15"))
+SCHEDULE_SEARCH_DAYS = int(os.getenv("SCHEDULE_SEARCH_DAYS", "14"))
+SCHEDULE_CACHE_TTL = float(os.getenv("SCHEDULE_CACHE_TTL", "300"))  # seconds
+SCHEDULE_CACHE_MAX_DAYS = int(os.getenv("SCHEDULE_CACHE_MAX_DAYS", "10000"))
+
+
+class ScheduleConflict(Exception):
+    # Raised by book_session when the trainer or the user is already booked
+    pass
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _time(seconds):
+    return time_of_day(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class DaySchedule:
+    # One trainer's or user's bookings on one day as (start, end, session_id)
+    # second offsets sorted by start, with the running maximum end, so an
+    # overlap check is one bisect even if older rows overlap each other.
+    # Never modified in place; with_booking returns a new copy.
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals)
+        self._starts = [start for start, _, _ in self.intervals]
+        self._max_ends = list(accumulate((end for _, end, _ in self.intervals), max))
+
+    def conflict(self, start, end):
+        # The first booked interval overlapping [start, end), or None
+        index = bisect_left(self._starts, end)
+        if index == 0 or self._max_ends[index - 1] <= start:
+            return None
+        return next(
+            interval for interval in self.intervals[:index] if interval[1] > start
+        )
+
+    def booked(self):
+        return [(_time(start), _time(end)) for start, end, _ in self.intervals]
+
+    def with_booking(self, start, end, session_id):
+        intervals = list(self.intervals)
+        insort(intervals, (start, end, session_id))
+        return DaySchedule(intervals)
+
+
+class ScheduleIndex:
+    # Per-day interval index over SESSION_SCHEDULE for one owner column
+    # (trainer or user). Days are loaded on demand through the
+    # (owner, session_date, start_time) index, kept for the TTL and LRU
+    # bounded; bookings committed in this process are added in place.
+    def __init__(self, owner, ttl=SCHEDULE_CACHE_TTL, max_days=SCHEDULE_CACHE_MAX_DAYS):
+        self.owner = owner
+        self.name = owner.name.removesuffix("_id")
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days = OrderedDict()  # (owner_id, day) -> (expires_at, DaySchedule)
+        self._lock = threading.Lock()
+        self._load = select(
+            SessionSchedule.session_date,
+            SessionSchedule.start_time,
+            SessionSchedule.end_time,
+            SessionSchedule.session_id,
+        ).where(
+            owner == bindparam("owner_id"),
+            SessionSchedule.session_date.between(
+                bindparam("first_day"), bindparam("last_day")
+            ),
+        )
+        # First booking of the owner overlapping a new one on its day
+        self.clash = (
+            select(
+                SessionSchedule.start_time,
+                SessionSchedule.end_time,
+                SessionSchedule.session_id,
+            )
+            .where(
+                owner == bindparam("owner_id"),
+                SessionSchedule.session_date == bindparam("day"),
+                SessionSchedule.start_time < bindparam("end_time"),
+                SessionSchedule.end_time > bindparam("start_time"),
+            )
+            .limit(1)
+        )
+
+    def days(self, engine, owner_id, first_day, last_day):
+        # {day: DaySchedule} for every day in the range, one query for the misses
+        wanted = [
+            first_day + timedelta(days=offset)
+            for offset in range((last_day - first_day).days + 1)
+        ]
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for day in wanted:
+                entry = self._days.get((owner_id, day))
+                if entry is not None and entry[0] >= now:
+                    self._days.move_to_end((owner_id, day))
+                    found[day] = entry[1]
+        missing = [day for day in wanted if day not in found]
+        if not missing:
+            return found
+
+        intervals = {day: [] for day in missing}
+        with engine.connect() as connection:
+            rows = connection.execute(
+                self._load,
+                {
+                    "owner_id": owner_id,
+                    "first_day": missing[0],
+                    "last_day": missing[-1],
+                },
+            )
+            for day, start, end, session_id in rows:
+                if day in intervals and start is not None and end is not None:
+                    intervals[day].append((_seconds(start), _seconds(end), session_id))
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for day in missing:
+                found[day] = DaySchedule(intervals[day])
+                self._days[owner_id, day] = (expires_at, found[day])
+                self._days.move_to_end((owner_id, day))
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return found
+
+    def day(self, engine, owner_id, day):
+        return self.days(engine, owner_id, day, day)[day]
+
+    def add(self, owner_id, day, start, end, session_id):
+        # Only days already loaded are updated; others load fresh when asked for
+        with self._lock:
+            entry = self._days.get((owner_id, day))
+            if entry is not None:
+                self._days[owner_id, day] = (
+                    entry[0],
+                    entry[1].with_booking(start, end, session_id),
+                )
+
+    def invalidate(self, owner_id, day):
+        with self._lock:
+            self._days.pop((owner_id, day), None)
+
+
+trainer_schedule = ScheduleIndex(SessionSchedule.trainer_id)
+user_schedule = ScheduleIndex(SessionSchedule.user_id)
+
+
+def _describe(index, owner_id, day, interval):
+    start, end, _ = interval
+    return (
+        f"{index.name.capitalize()} {owner_id} is already booked "
+        f"{_time(start):%H:%M}-{_time(end):%H:%M} on {day}."
+    )
+
+
+def find_conflict(engine, trainer_id, user_id, day, start_time, end_time):
+    # Message describing the first clash from the in-memory index, or None
+    start, end = _seconds(start_time), _seconds(end_time)
+    for index, owner_id in ((trainer_schedule, trainer_id), (user_schedule, user_id)):
+        interval = index.day(engine, owner_id, day).conflict(start, end)
+        if interval is not None:
+            return _describe(index, owner_id, day, interval)
+    return None
+
+
+def book_session(session, trainer_id, user_id, day, start_time, end_time):
+    if end_time <= start_time:
+        raise ScheduleConflict("A session must end after it starts.")
+    problem = find_conflict(
+        session.get_bind(), trainer_id, user_id, day, start_time, end_time
+    )
+    if problem:
+        raise ScheduleConflict(problem)
+
+    # Re-checked inside the transaction through the same index; on MySQL the
+    # locking read also holds the range so a concurrent booking waits
+    for index, owner_id in ((trainer_schedule, trainer_id), (user_schedule, user_id)):
+        clash = session.execute(
+            index.clash.with_for_update(),
+            {
+                "owner_id": owner_id,
+                "day": day,
+                "start_time": start_time,
+                "end_time": end_time,
+            },
+        ).first()
+        if clash is not None:
+            index.invalidate(owner_id, day)
+            interval = (_seconds(clash[0]), _seconds(clash[1]), clash[2])
+            raise ScheduleConflict(_describe(index, owner_id, day, interval))
+
+    booking = SessionSchedule(
+        trainer_id=trainer_id,
+        user_id=user_id,
+        session_date=day,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    session.add(booking)
+    session.flush()
+    return booking
+
+
+def next_free_slot(
+    engine, trainer_id, minutes, after=None, user_id=None, days=SCHEDULE_SEARCH_DAYS
+):
+    # Earliest (day, start_time, end_time) within opening hours, on the
+    # SCHEDULE_SLOT_MINUTES grid, when the trainer (and the user, if given)
+    # is free for `minutes`; None if nothing is free in the next `days` days
+    after = after or datetime.now()
+    length = minutes * 60
+    step = SCHEDULE_SLOT_MINUTES * 60
+    opens, closes = _seconds(SCHEDULE_DAY_START), _seconds(SCHEDULE_DAY_END)
+    first_day = after.date()
+    last_day = first_day + timedelta(days=days - 1)
+    schedules = [trainer_schedule.days(engine, trainer_id, first_day, last_day)]
+    if user_id is not None:
+        schedules.append(user_schedule.days(engine, user_id, first_day, last_day))
+
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        start = opens
+        if offset == 0:
+            start = max(start, -(-_seconds(after.time()) // step) * step)
+        booked = sorted(
+            chain.from_iterable(schedule[day].intervals for schedule in schedules)
+        )
+        for booked_start, booked_end, _ in booked:
+            if booked_start >= start + length:
+                break
+            if booked_end > start:
+                start = -(-booked_end // step) * step
+        if start + length <= closes:
+            return day, _time(start), _time(start + length)
+    return None
+
+
+# Keep the indexes current with bookings committed by this process
+@event.listens_for(Session, "after_flush")
+def _collect_bookings(session, flush_context):
+    booked = session.info.setdefault("booked_sessions", [])
+    changed = session.info.setdefault("rescheduled_days", set())
+    for obj in session.new:
+        if isinstance(obj, SessionSchedule) and obj.start_time and obj.end_time:
+            booked.append(
+                (
+                    obj.trainer_id,
+                    obj.user_id,
+                    obj.session_date,
+                    _seconds(obj.start_time),
+                    _seconds(obj.end_time),
+                    obj.session_id,
+                )
+            )
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, SessionSchedule):
+            # Both the old and the new owner/day of a moved session
+            state = inspect(obj)
+            days = {obj.session_date, *state.attrs.session_date.history.deleted}
+            for index in (trainer_schedule, user_schedule):
+                history = state.attrs[index.owner.key].history
+                for owner_id in {getattr(obj, index.owner.key), *history.deleted}:
+                    changed.update((index, owner_id, day) for day in days)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_bookings(session):
+    booked = session.info.pop("booked_sessions", ())
+    for trainer_id, user_id, day, start, end, session_id in booked:
+        trainer_schedule.add(trainer_id, day, start, end, session_id)
+        user_schedule.add(user_id, day, start, end, session_id)
+    for index, owner_id, day in session.info.pop("rescheduled_days", ()):
+        index.invalidate(owner_id, day)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_bookings(session):
+    session.info.pop("booked_sessions", None)
+    session.info.pop("rescheduled_days", None)
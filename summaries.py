@@ -0,0 +1,120 @@
+from sqlalchemy import and_, bindparam, delete, event, insert, select, tuple_, update
+from db import Session
+
+REBUILD_CHUNK_SIZE = 10000
+
+
+class SummaryTable:
+    # A table of per-key totals derived from the rows of one fact table and
+    # updated in place as those rows are inserted.
+    #
+    # deltas(connection, rows) turns fact rows (tuples of the source model's
+    # `fields`) into {key tuple: {column: value}} over the table's primary
+    # key. A stored key takes the delta through the SET expressions of
+    # fold(new), where new(column) stands for the delta's value (every
+    # column summed by default), or through merge(stored, delta) in Python;
+    # a new key is inserted as is. ORM inserts of the source are recorded
+    # when they flush; Core writers call record() in their own transaction.
+    def __init__(self, table, source, fields, deltas, fold=None, merge=None):
+        self.table = table
+        self.source = source
+        self.fields = fields
+        self.deltas = deltas
+        self.merge = merge
+        self._key = list(table.primary_key.columns)
+        self._key_names = [column.name for column in self._key]
+        statement = update(table).where(
+            and_(*(column == bindparam(f"key_{column.name}") for column in self._key))
+        )
+        self._folded = []
+        if merge is None:
+            statement = statement.values((fold or self._sums)(self._new))
+        # With merge, SET columns come from the keys of each parameter dict
+        self._update = statement
+        event.listen(Session, "after_flush", self._track)
+
+    def _new(self, name):
+        self._folded.append(name)
+        return bindparam(f"new_{name}")
+
+    def _sums(self, new):
+        return {
+            column.name: column + new(column.name)
+            for column in self.table.columns
+            if not column.primary_key
+        }
+
+    def _keys_in(self, keys):
+        if len(self._key) == 1:
+            return self._key[0].in_([key[0] for key in keys])
+        return tuple_(*self._key).in_(list(keys))
+
+    def record(self, connection, rows):
+        deltas = self.deltas(connection, rows)
+        if not deltas:
+            return 0
+
+        # Locks the stored keys, so concurrent writers fold in one at a time
+        columns = self.table.columns if self.merge is not None else self._key
+        stored = {
+            tuple(row._mapping[name] for name in self._key_names): row._mapping
+            for row in connection.execute(
+                select(*columns).where(self._keys_in(deltas)).with_for_update()
+            )
+        }
+        updates = []
+        inserts = []
+        for key, values in deltas.items():
+            if key not in stored:
+                inserts.append(dict(values, **dict(zip(self._key_names, key))))
+                continue
+            if self.merge is not None:
+                merged = self.merge(dict(stored[key]), values)
+                params = {
+                    name: value
+                    for name, value in merged.items()
+                    if name not in self._key_names
+                }
+            else:
+                params = {f"new_{name}": values[name] for name in self._folded}
+            for name, value in zip(self._key_names, key):
+                params[f"key_{name}"] = value
+            updates.append(params)
+        if updates:
+            connection.execute(self._update, updates)
+        if inserts:
+            connection.execute(insert(self.table), inserts)
+        return len(deltas)
+
+    def _track(self, session, flush_context):
+        rows = [
+            tuple(getattr(obj, field) for field in self.fields)
+            for obj in session.new
+            if isinstance(obj, self.source)
+        ]
+        if rows:
+            self.record(session.connection(), rows)
+
+
+def rebuild(connection, *summaries):
+    # Empties the summaries and records every row of the fact table they
+    # share, in primary key chunks so other writes can run between the reads
+    source = summaries[0].source
+    primary_key = source.__mapper__.primary_key[0]
+    fields = list(dict.fromkeys(f for s in summaries for f in s.fields))
+    for summary in summaries:
+        connection.execute(delete(summary.table))
+    statement = (
+        select(primary_key, *(getattr(source, field) for field in fields))
+        .where(primary_key > bindparam("after_id"))
+        .order_by(primary_key)
+        .limit(REBUILD_CHUNK_SIZE)
+    )
+    after_id = 0
+    while rows := connection.execute(statement, {"after_id": after_id}).all():
+        for summary in summaries:
+            positions = [1 + fields.index(field) for field in summary.fields]
+            summary.record(
+                connection, [tuple(row[i] for i in positions) for row in rows]
+            )
+        after_id = rows[-1][0]
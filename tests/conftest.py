@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# The modules live at the repository root and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import create_db_engine, init_schema
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'gym.db'}")
+    init_schema(engine)
+    yield engine
+    engine.dispose()
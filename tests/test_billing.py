@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import insert, select
+from db import Billing, Membership, Payment, User
+import billing
+
+AS_OF = datetime(2025, 3, 31, 12)
+
+
+def _members(engine, valid_period, ran_out=1):
+    # User 1 ran out `ran_out` days ago, user 2 is still covered, user 3
+    # lapsed before the grace window
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Membership),
+            [
+                {
+                    "membership_id": 1,
+                    "membership_type": "VIP",
+                    "price": 100,
+                    "valid_period": valid_period,
+                    "discount_amount": 10,
+                }
+            ],
+        )
+        connection.execute(
+            insert(User), [{"user_id": i, "membership_id": 1} for i in (1, 2, 3)]
+        )
+        ended = {1: ran_out, 2: -1, 3: billing.BILLING_GRACE_DAYS + 1}
+        connection.execute(
+            insert(Payment),
+            [
+                {
+                    "user_id": user_id,
+                    "amount": 90,
+                    "payment_date": AS_OF - timedelta(days=valid_period + days),
+                }
+                for user_id, days in ended.items()
+            ],
+        )
+
+
+def _payments(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(Payment.user_id, Payment.amount, Payment.payment_date).where(
+                Payment.payment_method == billing.BILLING_PAYMENT_METHOD
+            )
+        ).all()
+
+
+def test_bills_the_expired_membership_once(engine):
+    _members(engine, valid_period=30)
+    due, stats = billing.run_billing(engine, AS_OF)
+    assert stats["billed"] == 1
+    assert _payments(engine) == [(1, Decimal("90.00"), AS_OF - timedelta(days=1))]
+    assert billing.run_billing(engine, AS_OF)[1]["billed"] == 0
+    assert len(_payments(engine)) == 1
+
+
+def test_membership_shorter_than_the_grace_window_is_not_billed_again(engine):
+    # The renewal it bills has run out by AS_OF as well, but belongs to the
+    # next cycle
+    _members(engine, valid_period=2, ran_out=4)
+    assert billing.run_billing(engine, AS_OF)[1]["billed"] == 1
+    assert billing.run_billing(engine, AS_OF)[1]["billed"] == 0
+    assert len(_payments(engine)) == 1
+
+
+def test_dry_run_writes_nothing(engine):
+    _members(engine, valid_period=30)
+    due, stats = billing.run_billing(engine, AS_OF, dry_run=True)
+    assert (stats["due"], stats["billed"]) == (1, 0)
+    assert _payments(engine) == []
+
+
+def test_period_recorded_by_another_run_gets_no_payment(engine, monkeypatch):
+    _members(engine, valid_period=30)
+    with engine.connect() as connection:
+        due = billing.due_renewals(connection, AS_OF)
+    # A concurrent run committed the same period after this one read it
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Billing),
+            [{"user_id": 1, "period_start": AS_OF - timedelta(days=1), "amount": 90}],
+        )
+    monkeypatch.setattr(billing, "due_renewals", lambda connection, as_of: due)
+    assert billing.run_billing(engine, AS_OF)[1]["billed"] == 0
+    assert _payments(engine) == []
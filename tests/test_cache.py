@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import bindparam, insert, select
+import cache
+from cache import QueryCache, query_cache
+from db import Payment, Session, User
+
+USER_NAME = select(User.user_name).where(User.user_id == bindparam("user_id"))
+
+
+@pytest.fixture
+def users(engine):
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"user_id": 1, "user_name": "Ann"}])
+    query_cache.clear()
+    yield engine
+    query_cache.clear()
+
+
+def _name(engine, cache=query_cache, tables=("USER",)):
+    with Session(bind=engine) as session:
+        return cache.fetch(session, USER_NAME, {"user_id": 1}, tables)
+
+
+def _rename(session, name):
+    session.get(User, 1).user_name = name
+    session.flush()
+
+
+def test_committed_write_drops_dependent_entries(users):
+    assert _name(users) == [("Ann",)]
+    with Session(bind=users) as session:
+        _rename(session, "Bea")
+        assert _name(users) == [("Ann",)]  # not committed yet
+        session.commit()
+    assert _name(users) == [("Bea",)]
+
+
+def test_write_to_another_table_keeps_the_entry(users):
+    _name(users)
+    with Session(bind=users) as session:
+        session.add(Payment(user_id=1, amount=10))
+        session.commit()
+    hits = query_cache.hits
+    _name(users)
+    assert query_cache.hits == hits + 1
+
+
+def test_rolled_back_write_invalidates_nothing(users):
+    _name(users)
+    with Session(bind=users) as session:
+        _rename(session, "Bea")
+        session.rollback()
+        session.add(Payment(user_id=1, amount=10))
+        session.commit()
+    hits = query_cache.hits
+    assert _name(users) == [("Ann",)]
+    assert query_cache.hits == hits + 1
+
+
+def test_published_version_reaches_other_processes(users, monkeypatch):
+    # Another process's cache only learns of the write from CACHE_VERSION
+    monkeypatch.setattr(cache, "QUERY_CACHE_POLL_SECONDS", 1e-9)
+    other = QueryCache()
+    assert _name(users, other) == [("Ann",)]
+    with users.begin() as connection:
+        connection.execute(User.__table__.update().values(user_name="Bea"))
+    assert _name(users, other) == [("Ann",)]
+    with users.begin() as connection:
+        query_cache.publish(connection, "USER")
+    assert _name(users, other) == [("Bea",)]
+    assert other.invalidations == 1
+
+
+def test_lru_eviction_keeps_the_size_bound():
+    small = QueryCache(max_bytes=2000)
+    for i in range(50):
+        small.put(("statement", i), [(i, "x" * 10)], frozenset())
+    assert small.size <= 2000
+    assert small.evictions > 0
+    assert small.get(("statement", 49)) is not None
+    assert small.get(("statement", 0)) is None
@@ -0,0 +1,97 @@
+import io
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from cache import query_cache
+from db import ProgressSummary, Session, User, UserActivity
+import pagination
+
+OLD = datetime(2020, 1, 1)
+MEASURED = datetime.now() - timedelta(days=7)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    # Results are cached by statement and parameters, not by database
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
+def _pages(engine, report, page_size):
+    pages = []
+    cursor = None
+    with Session(bind=engine) as session:
+        while True:
+            rows, cursor = pagination.fetch_page(session, report, cursor, page_size)
+            pages.append(rows)
+            if cursor is None:
+                return pages
+
+
+def _churn(engine, never_visited, lapsed, active):
+    # Lapsed users share last_visit two by two, so pages end inside ties
+    users = range(1, never_visited + lapsed + active + 1)
+    last_visits = (
+        [None] * never_visited
+        + [OLD + timedelta(days=i // 2) for i in range(lapsed)]
+        + [datetime.now()] * active
+    )
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User), [{"user_id": i, "user_name": f"user {i}"} for i in users]
+        )
+        connection.execute(
+            insert(UserActivity),
+            [
+                {"user_id": i, "last_visit": last_visit, "visit_count": 1}
+                for i, last_visit in zip(users, last_visits)
+            ],
+        )
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 4, 5, 9, 10])
+def test_churn_pages_cover_the_report_once_in_order(engine, page_size):
+    _churn(engine, never_visited=4, lapsed=5, active=3)
+    pages = _pages(engine, "churn", page_size)
+    rows = [row for page in pages for row in page]
+    assert [row[0] for row in rows] == list(range(1, 10))
+    assert all(len(page) == page_size for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= page_size
+
+
+def test_churn_export_matches_the_pages(engine):
+    _churn(engine, never_visited=2, lapsed=3, active=1)
+    output = io.StringIO()
+    with engine.connect() as connection:
+        assert pagination.export_csv(connection, "churn", output) == 5
+    exported = output.getvalue().splitlines()[1:]
+    assert [line.split(",")[0] for line in exported] == ["1", "2", "3", "4", "5"]
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 6])
+def test_progress_pages_break_ties_on_user_id(engine, page_size):
+    # Users 1-3 and 4-6 were measured at the same time; newest first
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [{"user_id": i, "user_name": f"user {i}"} for i in range(1, 7)],
+        )
+        connection.execute(
+            insert(ProgressSummary),
+            [
+                {
+                    "user_id": i,
+                    "last_measured": MEASURED - timedelta(hours=i > 3),
+                    "measurement_count": 1,
+                }
+                for i in range(1, 7)
+            ],
+        )
+    pages = _pages(engine, "progress", page_size)
+    names = [row[0] for page in pages for row in page]
+    assert names == [f"user {i}" for i in (3, 2, 1, 6, 5, 4)]
+
+
+def test_empty_report_is_one_empty_page(engine):
+    assert _pages(engine, "churn", 3) == [[]]
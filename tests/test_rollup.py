@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, select, update
+from db import AttendanceLog, DailyVisits, RollupGap, Session
+import rollup
+
+
+def _check_in(engine, *log_ids):
+    with engine.begin() as connection:
+        connection.execute(
+            insert(AttendanceLog),
+            [
+                {
+                    "log_id": log_id,
+                    "user_id": 1,
+                    "check_in_time": datetime(2025, 3, 3, 9),
+                }
+                for log_id in log_ids
+            ],
+        )
+
+
+def _refresh(engine):
+    with Session(bind=engine) as session:
+        rollup.refresh_daily_visits(session)
+        session.commit()
+        visits = session.get(DailyVisits, date(2025, 3, 3))
+        gaps = session.execute(select(RollupGap.first_id, RollupGap.last_id)).all()
+        return visits.total_visits if visits else 0, gaps
+
+
+def test_late_id_below_the_watermark_is_folded_in(engine):
+    # 3 and 4 are committed after 5, as a slow transaction would
+    _check_in(engine, 1, 2, 5)
+    assert _refresh(engine) == (3, [(3, 4)])
+    _check_in(engine, 4)
+    assert _refresh(engine) == (4, [(3, 3)])
+    _check_in(engine, 3, 6)
+    assert _refresh(engine) == (6, [])
+    assert _refresh(engine) == (6, [])
+
+
+def test_gap_is_dropped_after_rollup_gap_seconds(engine):
+    _check_in(engine, 1, 3)
+    assert _refresh(engine) == (2, [(2, 2)])
+    expired = datetime.now() - timedelta(seconds=rollup.ROLLUP_GAP_SECONDS + 1)
+    with engine.begin() as connection:
+        connection.execute(update(RollupGap).values(seen_at=expired))
+    assert _refresh(engine) == (2, [])
+    # A row that finally shows up for an abandoned id is not counted
+    _check_in(engine, 2)
+    assert _refresh(engine) == (2, [])
@@ -0,0 +1,51 @@
+from datetime import date, time
+import pytest
+from db import Session
+from scheduling import DaySchedule, ScheduleConflict, book_session
+
+
+def _at(hour, minute=0):
+    return hour * 3600 + minute * 60
+
+
+def test_touching_bookings_do_not_conflict():
+    day = DaySchedule([(_at(9), _at(10), 1), (_at(11), _at(12), 2)])
+    assert day.conflict(_at(10), _at(11)) is None
+    assert day.conflict(_at(8), _at(9)) is None
+    assert day.conflict(_at(12), _at(13)) is None
+
+
+def test_overlap_returns_the_first_clashing_booking():
+    day = DaySchedule([(_at(11), _at(12), 2), (_at(9), _at(10), 1)])
+    assert day.conflict(_at(9, 30), _at(11, 30)) == (_at(9), _at(10), 1)
+    assert day.conflict(_at(11, 45), _at(13)) == (_at(11), _at(12), 2)
+    assert day.conflict(_at(8), _at(14)) == (_at(9), _at(10), 1)
+
+
+def test_long_booking_is_found_past_shorter_later_ones():
+    # The 8-17 booking ends after the ones starting later, so the check
+    # cannot look at the last booking before the new one only
+    day = DaySchedule([(_at(8), _at(17), 1), (_at(9), _at(10), 2)])
+    assert day.conflict(_at(15), _at(16)) == (_at(8), _at(17), 1)
+
+
+def test_with_booking_returns_a_new_schedule():
+    day = DaySchedule([(_at(9), _at(10), 1)])
+    booked = day.with_booking(_at(10), _at(11), 2)
+    assert day.conflict(_at(10), _at(11)) is None
+    assert booked.conflict(_at(10, 30), _at(12)) == (_at(10), _at(11), 2)
+    assert booked.booked() == [(time(9), time(10)), (time(10), time(11))]
+
+
+def test_book_session_rejects_an_overlap(engine):
+    day = date(2031, 1, 6)
+    with Session(bind=engine) as session:
+        book_session(session, 1, 1, day, time(9), time(10))
+        session.commit()
+    with Session(bind=engine) as session:
+        with pytest.raises(ScheduleConflict, match="Trainer 1"):
+            book_session(session, 1, 2, day, time(9, 30), time(10, 30))
+        with pytest.raises(ScheduleConflict, match="User 1"):
+            book_session(session, 2, 1, day, time(9, 45), time(11))
+        book_session(session, 1, 2, day, time(10), time(11))
+        session.commit()
@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select
+from db import ProgressBucket, ProgressSummary, Session, UserStatus
+import progress
+
+
+def _bucket(connection, user_id, period, start):
+    return connection.execute(
+        select(ProgressBucket).where(
+            ProgressBucket.user_id == user_id,
+            ProgressBucket.period == period,
+            ProgressBucket.period_start == start,
+        )
+    ).one()
+
+
+def test_sums_fold_into_the_stored_row(engine):
+    with engine.begin() as connection:
+        progress.record_measurements(
+            connection, [(1, datetime(2025, 3, 3, 9), 80, 1.8, None, 20)]
+        )
+        progress.record_measurements(
+            connection, [(1, datetime(2025, 3, 5, 9), 82, 1.8, None, None)]
+        )
+        week = _bucket(connection, 1, "week", date(2025, 3, 3))
+    assert week.weight_count == 2
+    assert week.weight_sum == Decimal("162")
+    assert week.BMI_count == 2
+    assert week.fat_percentage_count == 1
+    assert week.fat_percentage_sum == Decimal("20")
+
+
+def test_merge_keeps_first_and_latest_whatever_the_order(engine):
+    with engine.begin() as connection:
+        progress.record_measurements(
+            connection, [(1, datetime(2025, 3, 10), 78, 1.8, None, 18)]
+        )
+        progress.record_measurements(
+            connection,
+            [
+                (1, datetime(2025, 3, 1), 82, 1.8, None, 22),
+                (1, datetime(2025, 3, 5), 80, 1.8, None, 20),
+            ],
+        )
+        summary = connection.execute(
+            select(ProgressSummary).where(ProgressSummary.user_id == 1)
+        ).one()
+    assert summary.measurement_count == 3
+    assert summary.first_measured == datetime(2025, 3, 1)
+    assert summary.first_weight == Decimal("82")
+    assert summary.last_measured == datetime(2025, 3, 10)
+    assert summary.latest_weight == Decimal("78")
+
+
+def test_flush_and_rebuild_agree(engine):
+    with Session(bind=engine) as session:
+        session.add_all(
+            [
+                UserStatus(user_id=1, time_measured=datetime(2025, 3, 3), weight=80),
+                UserStatus(user_id=1, time_measured=datetime(2025, 3, 20), weight=79),
+                UserStatus(user_id=2, time_measured=datetime(2025, 3, 4), weight=60),
+            ]
+        )
+        session.commit()
+    tables = (ProgressSummary.__table__, ProgressBucket.__table__)
+    with engine.connect() as connection:
+        flushed = [connection.execute(select(t)).all() for t in tables]
+    with engine.begin() as connection:
+        progress.rebuild_progress(connection)
+        rebuilt = [connection.execute(select(t)).all() for t in tables]
+    assert [sorted(rows) for rows in flushed] == [sorted(rows) for rows in rebuilt]
+    assert len(flushed[1]) == 5  # user 1 in two weeks, user 2 in one, a month each
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from sqlalchemy import inspect
+from db import get_engine, session_scope
+from instrumentation import percentile
+
+# Write Queue Settings
+WRITE_QUEUE_MAX_PENDING = int(os.getenv("WRITE_QUEUE_MAX_PENDING", "1000"))
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "50"))
+WRITE_QUEUE_MAX_DELAY_MS = float(os.getenv("WRITE_QUEUE_MAX_DELAY_MS", "20"))
+
+
+class WriteQueueFull(Exception):
+    # Raised to the caller when the queue cannot accept more work (backpressure)
+    pass
+
+
+class WriteQueue:
+    # Background writer that group-commits ORM objects submitted by the forms.
+    # submit() returns a Future that resolves to the new row's primary key
+    # only after the transaction holding it has committed.
+    def __init__(
+        self,
+        engine=None,
+        max_pending=WRITE_QUEUE_MAX_PENDING,
+        batch_size=WRITE_QUEUE_BATCH_SIZE,
+        max_delay=WRITE_QUEUE_MAX_DELAY_MS / 1000,
+    ):
+        self.engine = engine if engine is not None else get_engine()
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._commit_latency = deque(maxlen=1000)  # seconds per group commit
+        self._counters = {
+            "submitted": 0,
+            "committed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "batches": 0,
+        }
+        self._thread = threading.Thread(
+            target=self._run, name="write-queue", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, obj, timeout=0.5):
+        future = Future()
+        try:
+            self._queue.put((obj, future), timeout=timeout)
+        except queue.Full:
+            self._count("rejected")
+            raise WriteQueueFull(
+                f"Write queue is full ({self._queue.maxsize} pending), try again"
+            )
+        self._count("submitted")
+        return future
+
+    def close(self, timeout=5):
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def metrics(self):
+        with self._lock:
+            latencies = list(self._commit_latency)
+            counters = dict(self._counters)
+        batches = counters["batches"]
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_pending": self._queue.maxsize,
+            **counters,
+            "avg_batch_size": counters["committed"] / batches if batches else 0.0,
+            "commit_p50_ms": percentile(latencies, 50) * 1000,
+            "commit_p95_ms": percentile(latencies, 95) * 1000,
+        }
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _next_batch(self):
+        # Wait for the first item, then gather more until size or time trigger
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        with session_scope(self.engine) as session:
+            session.add_all(obj for obj, _ in batch)
+            session.flush()
+            keys = [inspect(obj).identity for obj, _ in batch]
+        with self._lock:
+            self._commit_latency.append(time.perf_counter() - started)
+            self._counters["batches"] += 1
+            self._counters["committed"] += len(batch)
+        for (_, future), key in zip(batch, keys):
+            future.set_result(key)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._commit(batch)
+            except Exception:
+                # One bad row must not fail its neighbours: retry one by one
+                for item in batch:
+                    try:
+                        self._commit([item])
+                    except Exception as error:
+                        self._count("failed")
+                        item[1].set_exception(error)